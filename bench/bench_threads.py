@@ -0,0 +1,138 @@
+"""
+Measures how throughput scales when 1 to N threads each run JS in
+their own runtime. Pydermonkey releases the GIL while JS code runs, so
+compute-bound JS should scale with the number of cores, while
+workloads that keep calling back into Python are limited by the GIL.
+
+For each workload and thread count, the table shows the total number
+of runs per second and the speedup over a single thread, e.g.:
+
+  python bench/bench_threads.py --max-threads 8
+"""
+
+import sys
+import time
+import optparse
+import threading
+
+import pydermonkey
+
+try:
+    import multiprocessing
+    CORES = multiprocessing.cpu_count()
+except (ImportError, NotImplementedError):
+    CORES = None
+
+DEFAULT_MAX_THREADS = CORES or 4
+
+DEFAULT_RUNS = 20
+
+WORKLOADS = {}
+
+def workload(name):
+    """
+    Registers a workload. The decorated function is given a context and
+    global object, and returns a callable that does one run.
+    """
+
+    def decorator(setup):
+        WORKLOADS[name] = setup
+        return setup
+    return decorator
+
+@workload('compute')
+def compute(cx, obj):
+    script = cx.compile_script(
+        'var total = 0;'
+        'for (var i = 0; i < 200000; i++) total += i % 7;'
+        'total',
+        '<bench>', 1)
+    return lambda: cx.execute_script(obj, script)
+
+@workload('property_access')
+def property_access(cx, obj):
+    script = cx.compile_script(
+        'var o = {a: 1, b: 2};'
+        'for (var i = 0; i < 100000; i++) { o.a = o.b + i; o.b = o.a; }'
+        'o.a',
+        '<bench>', 1)
+    return lambda: cx.execute_script(obj, script)
+
+@workload('callback')
+def callback(cx, obj):
+    def func(cx, this, args):
+        return args[0]
+    cx.define_property(obj, 'func', cx.new_function(func, 'func'))
+    script = cx.compile_script(
+        'var total = 0;'
+        'for (var i = 0; i < 10000; i++) total += func(i);'
+        'total',
+        '<bench>', 1)
+    return lambda: cx.execute_script(obj, script)
+
+def worker(setup, runs, ready, start):
+    # Runtimes can only be used from the thread that created them.
+    op = None
+    try:
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_global()
+        op = setup(cx, obj)
+        op()
+    finally:
+        # Don't keep the other threads waiting if setup failed.
+        ready.release()
+    start.wait()
+    if op is not None:
+        for i in xrange(runs):
+            op()
+
+def measure(setup, thread_count, runs):
+    """
+    Runs the workload in the given number of threads at once, and
+    returns the total number of runs per second.
+    """
+
+    ready = threading.Semaphore(0)
+    start = threading.Event()
+    threads = [threading.Thread(target=worker,
+                                args=(setup, runs, ready, start))
+               for i in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        ready.acquire()
+
+    start_time = time.time()
+    start.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start_time
+
+    return thread_count * runs / elapsed
+
+def main(argv):
+    parser = optparse.OptionParser(usage="%prog [options] [workload ...]")
+    parser.add_option("-t", "--max-threads", type="int",
+                      default=DEFAULT_MAX_THREADS,
+                      help="largest number of threads to run")
+    parser.add_option("-r", "--runs", type="int", default=DEFAULT_RUNS,
+                      help="number of runs per thread")
+    options, names = parser.parse_args(argv)
+
+    if CORES:
+        print "%d cores" % CORES
+    print "%-16s %8s %12s %8s" % ("workload", "threads", "runs/s",
+                                  "speedup")
+    for name in sorted(WORKLOADS):
+        if names and name not in names:
+            continue
+        base = None
+        for thread_count in range(1, options.max_threads + 1):
+            throughput = measure(WORKLOADS[name], thread_count, options.runs)
+            if base is None:
+                base = throughput
+            print "%-16s %8d %12.1f %7.2fx" % (name, thread_count,
+                                               throughput, throughput / base)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,116 @@
+"""
+Measures the cost of keeping many Python wrappers of JS objects alive:
+how long it takes to create and destroy them, and how long garbage
+collections take while they exist.
+
+Results can be written as JSON and compared against a run of another
+build, so that before and after numbers for a change are recorded
+side by side, e.g.:
+
+  python bench/bench_wrappers.py --output before.json 1000000
+  (apply the change and rebuild)
+  python bench/bench_wrappers.py --baseline before.json 1000000
+"""
+
+import sys
+import time
+import json
+import optparse
+
+import pydermonkey
+
+DEFAULT_COUNT = 1000000
+
+RESULTS = [
+    ('create', 'create, ns/wrapper'),
+    ('destroy', 'destroy, ns/wrapper'),
+    ('empty_gc_pause', 'GC pause, no wrappers, ms'),
+    ('full_gc_pause', 'GC pause, all wrappers, ms'),
+    ]
+
+def timed(func, *args):
+    start = time.time()
+    result = func(*args)
+    return time.time() - start, result
+
+def create_wrappers(cx, count):
+    return [cx.new_object() for i in xrange(count)]
+
+def destroy_wrappers(wrappers):
+    del wrappers[:]
+
+def gc_pause(cx, runs=5):
+    pauses = []
+    for i in range(runs):
+        cx.gc()
+        pauses.append(cx.get_runtime().get_gc_stats()['last_pause'])
+    return min(pauses)
+
+def run(count):
+    """
+    Returns a dictionary of results for the given number of wrappers,
+    keyed by the names in RESULTS.
+    """
+
+    rt = pydermonkey.Runtime()
+    # The default 8 MB heap isn't nearly big enough.
+    rt.set_memory_limits(0, 1024 * 1024 * 1024)
+    cx = rt.new_context()
+
+    empty_pause = gc_pause(cx)
+    create_time, wrappers = timed(create_wrappers, cx, count)
+    full_pause = gc_pause(cx)
+    destroy_time, result = timed(destroy_wrappers, wrappers)
+
+    return {'create': create_time * 1e9 / count,
+            'destroy': destroy_time * 1e9 / count,
+            'empty_gc_pause': empty_pause * 1000,
+            'full_gc_pause': full_pause * 1000}
+
+def report(results, baseline=None):
+    if baseline is None:
+        for name, description in RESULTS:
+            print "%-30s %12.3f" % (description, results[name])
+        return
+
+    print "%-30s %12s %12s %8s" % ("", "baseline", "current", "change")
+    for name, description in RESULTS:
+        change = (results[name] - baseline[name]) * 100.0 / baseline[name]
+        print "%-30s %12.3f %12.3f %+7.1f%%" % (description, baseline[name],
+                                                results[name], change)
+
+def main(argv):
+    parser = optparse.OptionParser(usage="%prog [options] [count]")
+    parser.add_option("-o", "--output",
+                      help="write results as JSON to this file")
+    parser.add_option("-b", "--baseline",
+                      help="compare results to this JSON file")
+    options, args = parser.parse_args(argv)
+
+    count = DEFAULT_COUNT
+    if args:
+        count = int(args[0])
+
+    results = run(count)
+    print "wrappers: %d" % count
+
+    baseline = None
+    if options.baseline:
+        baseline = json.load(open(options.baseline))
+        if baseline['count'] != count:
+            parser.error("baseline was run with %d wrappers" %
+                         baseline['count'])
+        baseline = baseline['results']
+    report(results, baseline)
+
+    if options.output:
+        output = open(options.output, 'w')
+        json.dump({'python': sys.version.split()[0],
+                   'count': count,
+                   'results': results}, output, indent=2, sort_keys=True)
+        output.close()
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,216 @@
+"""
+Microbenchmarks for the boundary between Python and JavaScript: how
+long it takes to evaluate code, call functions, access properties,
+convert strings, wrap objects and dispatch JS calls to Python.
+
+Each benchmark is timed for a number of repetitions, and the fastest
+time per operation is reported. Results can be written as JSON and
+compared against a previous run, e.g.:
+
+  python bench/microbench.py --output baseline.json
+  (make some changes and rebuild)
+  python bench/microbench.py --baseline baseline.json
+
+Run "python setup.py bench" to do the same against the build directory.
+"""
+
+import sys
+import time
+import json
+import optparse
+
+import pydermonkey
+
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 10.0
+
+BENCHMARKS = []
+
+def benchmark(name, loops):
+    """
+    Registers a benchmark. The decorated function is given a context
+    and returns a callable that performs one operation.
+    """
+
+    def decorator(setup):
+        BENCHMARKS.append((name, loops, setup))
+        return setup
+    return decorator
+
+def new_context():
+    cx = pydermonkey.Runtime().new_context()
+    obj = cx.new_global()
+    return cx, obj
+
+@benchmark('evaluate_script', 10000)
+def bench_evaluate_script(cx, obj):
+    return lambda: cx.evaluate_script(obj, '1 + 1', '<bench>', 1)
+
+@benchmark('compile_script', 10000)
+def bench_compile_script(cx, obj):
+    return lambda: cx.compile_script('1 + 1', '<bench>', 1)
+
+@benchmark('execute_script', 10000)
+def bench_execute_script(cx, obj):
+    script = cx.compile_script('1 + 1', '<bench>', 1)
+    return lambda: cx.execute_script(obj, script)
+
+def make_call_benchmark(nargs):
+    @benchmark('call_function_%d_args' % nargs, 10000)
+    def bench_call_function(cx, obj):
+        names = ['a%d' % i for i in range(nargs)]
+        func = cx.compile_function(None, names, 'return 1;', '<bench>', 1)
+        args = tuple(range(nargs))
+        return lambda: cx.call_function(obj, func, args)
+
+for nargs in [0, 3, 10]:
+    make_call_benchmark(nargs)
+
+@benchmark('get_property', 100000)
+def bench_get_property(cx, obj):
+    cx.define_property(obj, 'foo', 1)
+    return lambda: cx.get_property(obj, 'foo')
+
+@benchmark('set_property', 100000)
+def bench_set_property(cx, obj):
+    return lambda: cx.set_property(obj, 'foo', 1)
+
+@benchmark('define_property', 100000)
+def bench_define_property(cx, obj):
+    return lambda: cx.define_property(obj, 'foo', 1)
+
+def make_enumerate_benchmark(size):
+    @benchmark('enumerate_%d_properties' % size, 100000 // size)
+    def bench_enumerate(cx, obj):
+        target = cx.new_object()
+        for i in range(size):
+            cx.define_property(target, 'prop%d' % i, i)
+        return lambda: cx.enumerate(target)
+
+for size in [10, 100, 1000]:
+    make_enumerate_benchmark(size)
+
+def make_string_benchmarks(size):
+    @benchmark('string_to_js_%d_chars' % size, 1000000 // size)
+    def bench_string_to_js(cx, obj):
+        string = u'x' * size
+        return lambda: cx.set_property(obj, 'foo', string)
+
+    @benchmark('string_from_js_%d_chars' % size, 1000000 // size)
+    def bench_string_from_js(cx, obj):
+        cx.evaluate_script(obj, 'var foo = Array(%d).join("x");' % (size + 1),
+                           '<bench>', 1)
+        return lambda: cx.get_property(obj, 'foo')
+
+for size in [10, 1000, 100000]:
+    make_string_benchmarks(size)
+
+@benchmark('new_object', 100000)
+def bench_new_object(cx, obj):
+    return cx.new_object
+
+@benchmark('wrap_new_object', 10000)
+def bench_wrap_new_object(cx, obj):
+    script = cx.compile_script('({})', '<bench>', 1)
+    return lambda: cx.execute_script(obj, script)
+
+@benchmark('identity_lookup', 100000)
+def bench_identity_lookup(cx, obj):
+    target = cx.new_object()
+    cx.define_property(obj, 'foo', target)
+    return lambda: cx.get_property(obj, 'foo')
+
+@benchmark('callback_dispatch', 10000)
+def bench_callback_dispatch(cx, obj):
+    def callback(cx, this, args):
+        return None
+    cx.define_property(obj, 'callback', cx.new_function(callback,
+                                                        'callback'))
+    script = cx.compile_script('callback()', '<bench>', 1)
+    return lambda: cx.execute_script(obj, script)
+
+def time_benchmark(setup, loops, repeat):
+    cx, obj = new_context()
+    op = setup(cx, obj)
+    ranges = range(loops)
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        for j in ranges:
+            op()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best * 1e9 / loops
+
+def run(names=None, repeat=DEFAULT_REPEAT):
+    """
+    Runs the given benchmarks, or all of them, and returns a
+    dictionary mapping their names to nanoseconds per operation.
+    """
+
+    results = {}
+    for name, loops, setup in BENCHMARKS:
+        if names and name not in names:
+            continue
+        results[name] = time_benchmark(setup, loops, repeat)
+        print "%-30s %12.0f ns" % (name, results[name])
+    return results
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Prints the change of each result relative to the baseline, and
+    returns the names of the benchmarks that got slower by more than
+    the threshold percentage.
+    """
+
+    regressions = []
+    print
+    print "%-30s %12s %12s %8s" % ("benchmark", "baseline", "current",
+                                   "change")
+    for name, loops, setup in BENCHMARKS:
+        if name not in results or name not in baseline:
+            continue
+        change = (results[name] - baseline[name]) * 100.0 / baseline[name]
+        flag = ''
+        if change > threshold:
+            flag = ' slower'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = ' faster'
+        print "%-30s %12.0f %12.0f %+7.1f%%%s" % (name, baseline[name],
+                                                  results[name], change,
+                                                  flag)
+    return regressions
+
+def main(argv):
+    parser = optparse.OptionParser(usage="%prog [options] [benchmark ...]")
+    parser.add_option("-o", "--output",
+                      help="write results as JSON to this file")
+    parser.add_option("-b", "--baseline",
+                      help="compare results to this JSON file")
+    parser.add_option("-r", "--repeat", type="int", default=DEFAULT_REPEAT,
+                      help="number of times to run each benchmark")
+    parser.add_option("-t", "--threshold", type="float",
+                      default=DEFAULT_THRESHOLD,
+                      help="percentage change to flag as significant")
+    options, names = parser.parse_args(argv)
+
+    results = run(names, options.repeat)
+
+    if options.output:
+        output = open(options.output, 'w')
+        json.dump({'python': sys.version.split()[0],
+                   'results': results}, output, indent=2, sort_keys=True)
+        output.close()
+
+    if options.baseline:
+        baseline = json.load(open(options.baseline))['results']
+        regressions = compare(results, baseline, options.threshold)
+        if regressions:
+            return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -46,7 +46,17 @@ SOURCE_FILES = ['pydermonkey.cpp',
                 'script.cpp',
                 'undefined.cpp',
                 'context.cpp',
-                'runtime.cpp']
+                'runtime.cpp',
+                'profiler.cpp',
+                'tracer.cpp',
+                'funcstats.cpp',
+                'coverage.cpp',
+                'scripterror.cpp',
+                'hostobject.cpp',
+                'bufferview.cpp',
+                'snapshot.cpp',
+                'stackframe.cpp',
+                'watchdog.cpp']
 
 SPIDERMONKEY_TAG = "1.8.1pre"
 
@@ -109,6 +119,9 @@ if sys.platform == 'win32':
         ]
 else:
     ext_options['libraries'] = ['js_static']
+    if sys.platform.startswith('linux'):
+        # Needed for clock_gettime() on older versions of glibc.
+        ext_options['libraries'].append('rt')
 
 setup_options['ext_modules'] = [
     distutils.core.Extension('pydermonkey',
@@ -273,12 +286,7 @@ def get_lib_dir():
             for name in os.listdir(BUILD_DIR)
             if name.startswith("lib.")][0]
 
-@task
-def test(options):
-    """Test the Pydermonkey Python C extension."""
-
-    print "Running test suite."
-
+def get_build_env():
     new_env = {}
     new_env.update(os.environ)
 
@@ -296,6 +304,16 @@ def test(options):
         # can be loaded.
         append_path('PATH', SPIDERMONKEY_OBJDIR)
 
+    return new_env
+
+@task
+def test(options):
+    """Test the Pydermonkey Python C extension."""
+
+    print "Running test suite."
+
+    new_env = get_build_env()
+
     result = subprocess.call(
         [sys.executable,
          os.path.join("test", "test_pydermonkey.py")],
@@ -322,3 +340,30 @@ def test(options):
 
     if retval:
         sys.exit(retval)
+
+@task
+@cmdopts([("output=", "o", "Write benchmark results as JSON to this file"),
+          ("baseline=", "b", "Compare benchmark results to this JSON file")])
+def bench(options):
+    """Run the Python/JS boundary microbenchmarks."""
+
+    cmdline = [sys.executable, os.path.join("bench", "microbench.py")]
+    if options.bench.get("output"):
+        cmdline.extend(["--output", options.bench.output])
+    if options.bench.get("baseline"):
+        cmdline.extend(["--baseline", options.bench.baseline])
+
+    retval = subprocess.call(cmdline, env = get_build_env())
+    if retval:
+        sys.exit(retval)
+
+@task
+def soak(options):
+    """Run the long-running memory soak tests."""
+
+    retval = subprocess.call(
+        [sys.executable, os.path.join("test", "soak_pydermonkey.py")],
+        env = get_build_env()
+        )
+    if retval:
+        sys.exit(retval)
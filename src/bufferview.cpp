@@ -0,0 +1,329 @@
+/* ***** BEGIN LICENSE BLOCK *****
+ * Version: MPL 1.1/GPL 2.0/LGPL 2.1
+ *
+ * The contents of this file are subject to the Mozilla Public License Version
+ * 1.1 (the "License"); you may not use this file except in compliance with
+ * the License. You may obtain a copy of the License at
+ * http://www.mozilla.org/MPL/
+ *
+ * Software distributed under the License is distributed on an "AS IS" basis,
+ * WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+ * for the specific language governing rights and limitations under the
+ * License.
+ *
+ * The Original Code is Pydermonkey.
+ *
+ * The Initial Developer of the Original Code is Mozilla.
+ * Portions created by the Initial Developer are Copyright (C) 2007
+ * the Initial Developer. All Rights Reserved.
+ *
+ * Contributor(s):
+ *   Atul Varma <atul@mozilla.com>
+ *
+ * Alternatively, the contents of this file may be used under the terms of
+ * either the GNU General Public License Version 2 or later (the "GPL"), or
+ * the GNU Lesser General Public License Version 2.1 or later (the "LGPL"),
+ * in which case the provisions of the GPL or the LGPL are applicable instead
+ * of those above. If you wish to allow use of your version of this file only
+ * under the terms of either the GPL or the LGPL, and not to allow others to
+ * use your version of this file under the terms of the MPL, indicate your
+ * decision by deleting the provisions above and replace them with the notice
+ * and other provisions required by the GPL or the LGPL. If you do not delete
+ * the provisions above, a recipient may use your version of this file under
+ * the terms of any one of the MPL, the GPL or the LGPL.
+ *
+ * ***** END LICENSE BLOCK ***** */
+
+#include "bufferview.h"
+#include "runtime.h"
+#include "utils.h"
+
+#include "jsobj.h"
+
+static PYM_JSRuntimeObject *
+PYM_getRuntimeObject(JSContext *cx)
+{
+  return (PYM_JSRuntimeObject *) JS_GetRuntimePrivate(JS_GetRuntime(cx));
+}
+
+// Gets the current memory of the buffer view. Pinned buffers don't
+// need the GIL; otherwise, it's taken to ask the object for its
+// buffer. Returns JS_FALSE and reports a JS error on failure.
+static JSBool
+PYM_getBufferMemory(JSContext *cx, PYM_BufferView *bufferView,
+                    unsigned char **buffer, Py_ssize_t *length)
+{
+  if (bufferView->hasView) {
+    *buffer = (unsigned char *) bufferView->view.buf;
+    *length = bufferView->view.len;
+    return JS_TRUE;
+  }
+
+  PYM_PyAutoEnsureGIL gil;
+  int result;
+  if (bufferView->readonly)
+    result = PyObject_AsReadBuffer(bufferView->object,
+                                   (const void **) buffer, length);
+  else
+    result = PyObject_AsWriteBuffer(bufferView->object, (void **) buffer,
+                                    length);
+  if (result == -1) {
+    PyErr_Clear();
+    JS_ReportError(cx, "Buffer is no longer available");
+    return JS_FALSE;
+  }
+  return JS_TRUE;
+}
+
+static PYM_BufferView *
+PYM_getBufferView(JSContext *cx, JSObject *obj)
+{
+  return (PYM_BufferView *) JS_GetInstancePrivate(cx, obj,
+                                                  &PYM_JS_BufferViewClass,
+                                                  NULL);
+}
+
+static JSBool
+PYM_getBufferViewLength(JSContext *cx, JSObject *obj, jsval id, jsval *vp)
+{
+  PYM_BufferView *bufferView = PYM_getBufferView(cx, obj);
+  if (bufferView == NULL)
+    return JS_TRUE;
+
+  unsigned char *buffer;
+  Py_ssize_t length;
+  if (!PYM_getBufferMemory(cx, bufferView, &buffer, &length))
+    return JS_FALSE;
+
+  return JS_NewNumberValue(cx, (jsdouble) length, vp);
+}
+
+// Indices are handled by the buffer view's object ops, before the
+// object's scope is consulted, so that reading or writing an index
+// never adds a property to it. Everything else is passed on to the
+// default ops.
+static JSBool
+PYM_getBufferViewProperty(JSContext *cx, JSObject *obj, jsid id, jsval *vp)
+{
+  PYM_BufferView *bufferView = PYM_getBufferView(cx, obj);
+  if (bufferView == NULL || !JSVAL_IS_INT((jsval) id) ||
+      JSVAL_TO_INT((jsval) id) < 0)
+    return js_ObjectOps.getProperty(cx, obj, id, vp);
+
+  unsigned char *buffer;
+  Py_ssize_t length;
+  if (!PYM_getBufferMemory(cx, bufferView, &buffer, &length))
+    return JS_FALSE;
+
+  jsint index = JSVAL_TO_INT((jsval) id);
+  if (index < length)
+    *vp = INT_TO_JSVAL(buffer[index]);
+  else
+    *vp = JSVAL_VOID;
+  return JS_TRUE;
+}
+
+// Like a Uint8Array, values are stored modulo 256, and stores outside
+// of the buffer are ignored.
+static JSBool
+PYM_setBufferViewProperty(JSContext *cx, JSObject *obj, jsid id, jsval *vp)
+{
+  PYM_BufferView *bufferView = PYM_getBufferView(cx, obj);
+  if (bufferView == NULL || !JSVAL_IS_INT((jsval) id) ||
+      JSVAL_TO_INT((jsval) id) < 0)
+    return js_ObjectOps.setProperty(cx, obj, id, vp);
+
+  if (bufferView->readonly) {
+    JS_ReportError(cx, "Buffer view is read-only");
+    return JS_FALSE;
+  }
+
+  uint32 value;
+  if (!JS_ValueToECMAUint32(cx, *vp, &value))
+    return JS_FALSE;
+
+  unsigned char *buffer;
+  Py_ssize_t length;
+  if (!PYM_getBufferMemory(cx, bufferView, &buffer, &length))
+    return JS_FALSE;
+
+  jsint index = JSVAL_TO_INT((jsval) id);
+  if (index < length)
+    buffer[index] = (unsigned char) value;
+  return JS_TRUE;
+}
+
+// The state of an enumeration of a buffer view: its indices are
+// listed first, followed by whatever the default ops list.
+typedef struct {
+  jsint index;
+  jsint length;
+  jsval defaultState;
+} PYM_BufferViewEnumState;
+
+static JSBool
+PYM_enumerateBufferView(JSContext *cx, JSObject *obj, JSIterateOp enum_op,
+                        jsval *statep, jsid *idp)
+{
+  PYM_BufferViewEnumState *state;
+
+  switch (enum_op) {
+  case JSENUMERATE_INIT: {
+    PYM_BufferView *bufferView = PYM_getBufferView(cx, obj);
+    jsint length = 0;
+    if (bufferView) {
+      unsigned char *buffer;
+      Py_ssize_t bufferLength;
+      if (!PYM_getBufferMemory(cx, bufferView, &buffer, &bufferLength))
+        return JS_FALSE;
+      length = (jsint) (bufferLength > JSVAL_INT_MAX ? JSVAL_INT_MAX :
+                        bufferLength);
+    }
+
+    state = (PYM_BufferViewEnumState *)
+      JS_malloc(cx, sizeof(PYM_BufferViewEnumState));
+    if (state == NULL)
+      return JS_FALSE;
+    state->index = 0;
+    state->length = length;
+    if (!js_ObjectOps.enumerate(cx, obj, JSENUMERATE_INIT,
+                                &state->defaultState, idp)) {
+      JS_free(cx, state);
+      return JS_FALSE;
+    }
+    if (idp && JSVAL_TO_INT((jsval) *idp) != 0)
+      *idp = INT_TO_JSID(JSVAL_TO_INT((jsval) *idp) + length);
+    *statep = PRIVATE_TO_JSVAL(state);
+    return JS_TRUE;
+  }
+
+  case JSENUMERATE_NEXT:
+    state = (PYM_BufferViewEnumState *) JSVAL_TO_PRIVATE(*statep);
+    if (state->index < state->length) {
+      *idp = INT_TO_JSID(state->index++);
+      return JS_TRUE;
+    }
+    if (!js_ObjectOps.enumerate(cx, obj, JSENUMERATE_NEXT,
+                                &state->defaultState, idp))
+      return JS_FALSE;
+    if (state->defaultState == JSVAL_NULL) {
+      JS_free(cx, state);
+      *statep = JSVAL_NULL;
+    }
+    return JS_TRUE;
+
+  case JSENUMERATE_DESTROY:
+    state = (PYM_BufferViewEnumState *) JSVAL_TO_PRIVATE(*statep);
+    if (state->defaultState != JSVAL_NULL)
+      js_ObjectOps.enumerate(cx, obj, JSENUMERATE_DESTROY,
+                             &state->defaultState, NULL);
+    JS_free(cx, state);
+    *statep = JSVAL_NULL;
+    return JS_TRUE;
+  }
+
+  return JS_TRUE;
+}
+
+static JSObjectOps PYM_bufferViewOps;
+
+// The default object ops are copied rather than reimplemented, so
+// that buffer views stay native objects and only indexing differs.
+static JSObjectOps *
+PYM_getBufferViewObjectOps(JSContext *cx, JSClass *clasp)
+{
+  if (PYM_bufferViewOps.getProperty == NULL) {
+    PYM_bufferViewOps = js_ObjectOps;
+    PYM_bufferViewOps.getProperty = PYM_getBufferViewProperty;
+    PYM_bufferViewOps.setProperty = PYM_setBufferViewProperty;
+    PYM_bufferViewOps.enumerate = PYM_enumerateBufferView;
+  }
+  return &PYM_bufferViewOps;
+}
+
+static void
+PYM_finalizeBufferView(JSContext *cx, JSObject *obj)
+{
+  PYM_BufferView *bufferView = (PYM_BufferView *) JS_GetPrivate(cx, obj);
+  if (bufferView == NULL)
+    return;
+
+  PYM_PyAutoEnsureGIL gil;
+  if (bufferView->hasView)
+    PyBuffer_Release(&bufferView->view);
+  Py_DECREF(bufferView->object);
+  PyMem_Free(bufferView);
+
+  PYM_JSRuntimeObject *runtime = PYM_getRuntimeObject(cx);
+  if (runtime)
+    runtime->privateHolderCount--;
+}
+
+JSClass PYM_JS_BufferViewClass = {
+  "PydermonkeyBufferView",
+  JSCLASS_HAS_PRIVATE,
+  JS_PropertyStub, JS_PropertyStub, JS_PropertyStub, JS_PropertyStub,
+  JS_EnumerateStub, JS_ResolveStub, JS_ConvertStub, PYM_finalizeBufferView,
+  PYM_getBufferViewObjectOps, NULL, NULL, NULL, NULL, NULL, NULL, 0
+};
+
+JSObject *
+PYM_newBufferView(PYM_JSContextObject *context, PyObject *object,
+                  int readonly)
+{
+  PYM_BufferView *bufferView = PyMem_New(PYM_BufferView, 1);
+  if (bufferView == NULL) {
+    PyErr_NoMemory();
+    return NULL;
+  }
+
+  bufferView->readonly = readonly;
+  bufferView->hasView = 0;
+
+  if (PyObject_CheckBuffer(object)) {
+    int flags = readonly ? PyBUF_SIMPLE : PyBUF_WRITABLE;
+    if (PyObject_GetBuffer(object, &bufferView->view, flags) == -1) {
+      PyMem_Free(bufferView);
+      return NULL;
+    }
+    bufferView->hasView = 1;
+  } else {
+    // Make sure that the object supports the old buffer protocol.
+    int supported = readonly ? PyObject_CheckReadBuffer(object) :
+      (object->ob_type->tp_as_buffer &&
+       object->ob_type->tp_as_buffer->bf_getwritebuffer);
+    if (!supported) {
+      PyMem_Free(bufferView);
+      PyErr_SetString(PyExc_TypeError,
+                      readonly ? "Object must support the buffer interface." :
+                      "Object must support the writable buffer interface.");
+      return NULL;
+    }
+  }
+
+  Py_INCREF(object);
+  bufferView->object = object;
+
+  JSObject *obj = JS_NewObject(context->cx, &PYM_JS_BufferViewClass, NULL,
+                               NULL);
+  if (obj == NULL || !JS_SetPrivate(context->cx, obj, bufferView)) {
+    if (bufferView->hasView)
+      PyBuffer_Release(&bufferView->view);
+    Py_DECREF(object);
+    PyMem_Free(bufferView);
+    PyErr_SetString(PYM_error, "Creating buffer view failed");
+    return NULL;
+  }
+
+  context->runtime->privateHolderCount++;
+
+  if (!JS_DefineProperty(context->cx, obj, "length", JSVAL_VOID,
+                         PYM_getBufferViewLength, NULL,
+                         JSPROP_READONLY | JSPROP_PERMANENT |
+                         JSPROP_SHARED)) {
+    PYM_jsExceptionToPython(context);
+    return NULL;
+  }
+
+  return obj;
+}
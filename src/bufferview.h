@@ -0,0 +1,64 @@
+/* ***** BEGIN LICENSE BLOCK *****
+ * Version: MPL 1.1/GPL 2.0/LGPL 2.1
+ *
+ * The contents of this file are subject to the Mozilla Public License Version
+ * 1.1 (the "License"); you may not use this file except in compliance with
+ * the License. You may obtain a copy of the License at
+ * http://www.mozilla.org/MPL/
+ *
+ * Software distributed under the License is distributed on an "AS IS" basis,
+ * WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+ * for the specific language governing rights and limitations under the
+ * License.
+ *
+ * The Original Code is Pydermonkey.
+ *
+ * The Initial Developer of the Original Code is Mozilla.
+ * Portions created by the Initial Developer are Copyright (C) 2007
+ * the Initial Developer. All Rights Reserved.
+ *
+ * Contributor(s):
+ *   Atul Varma <atul@mozilla.com>
+ *
+ * Alternatively, the contents of this file may be used under the terms of
+ * either the GNU General Public License Version 2 or later (the "GPL"), or
+ * the GNU Lesser General Public License Version 2.1 or later (the "LGPL"),
+ * in which case the provisions of the GPL or the LGPL are applicable instead
+ * of those above. If you wish to allow use of your version of this file only
+ * under the terms of either the GPL or the LGPL, and not to allow others to
+ * use your version of this file under the terms of the MPL, indicate your
+ * decision by deleting the provisions above and replace them with the notice
+ * and other provisions required by the GPL or the LGPL. If you do not delete
+ * the provisions above, a recipient may use your version of this file under
+ * the terms of any one of the MPL, the GPL or the LGPL.
+ *
+ * ***** END LICENSE BLOCK ***** */
+
+#ifndef PYM_BUFFERVIEW_H
+#define PYM_BUFFERVIEW_H
+
+#include "context.h"
+
+#include <jsapi.h>
+#include <Python.h>
+
+// The private data of a buffer view. Objects that support the new
+// buffer protocol have their buffer pinned in view for the lifetime of
+// the JS object; for objects that only support the old one, the
+// buffer is looked up again on each access, since it may have moved.
+typedef struct {
+  PyObject *object;
+  Py_buffer view;
+  char hasView;
+  char readonly;
+} PYM_BufferView;
+
+extern JSClass PYM_JS_BufferViewClass;
+
+// Creates a JS object that indexes into the memory of the given Python
+// buffer object. Returns NULL and sets a Python exception on failure.
+extern JSObject *
+PYM_newBufferView(PYM_JSContextObject *context, PyObject *object,
+                  int readonly);
+
+#endif
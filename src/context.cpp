@@ -38,24 +38,142 @@
 #include "object.h"
 #include "function.h"
 #include "script.h"
+#include "profiler.h"
+#include "stackframe.h"
+#include "funcstats.h"
+#include "tracer.h"
+#include "coverage.h"
+#include "hostobject.h"
+#include "bufferview.h"
+#include "snapshot.h"
+#include "watchdog.h"
 #include "utils.h"
 
 #include "jsdbgapi.h"
 #include "jsscript.h"
+#include "jscntxt.h"
 
 // Default GC zeal level for new JS contexts.
 static uint8 PYM_defaultGCZeal;
 
+// Returns the name used to match the given exception against a throw
+// hook's class name filter: the "name" property of Error objects, the
+// class name of other objects, or the type name of primitive values.
+static const char *
+PYM_getExceptionClassName(JSContext *cx, jsval exception)
+{
+  if (JSVAL_IS_OBJECT(exception) && !JSVAL_IS_NULL(exception)) {
+    JSObject *obj = JSVAL_TO_OBJECT(exception);
+    jsval name;
+    if (JS_LookupProperty(cx, obj, "name", &name) && JSVAL_IS_STRING(name))
+      return JS_GetStringBytes(JSVAL_TO_STRING(name));
+    return JS_GET_CLASS(cx, obj)->name;
+  }
+  return JS_GetTypeName(cx, JS_TypeOfValue(cx, exception));
+}
+
+// Returns whether the exception currently being thrown will be caught
+// by a catch block of any scripted frame on the context's stack.
+static bool
+PYM_isExceptionCaught(JSContext *cx)
+{
+  JSStackFrame *iteratorp = NULL;
+  JSStackFrame *frame;
+
+  while ((frame = JS_FrameIterator(cx, &iteratorp)) != NULL) {
+    JSScript *script = JS_GetFrameScript(cx, frame);
+    jsbytecode *pc = JS_GetFramePC(cx, frame);
+    if (script == NULL || pc == NULL || script->trynotesOffset == 0)
+      continue;
+
+    uint32 offset = (uint32) (pc - script->main);
+    JSTryNoteArray *tryNotes = JS_SCRIPT_TRYNOTES(script);
+    for (uint32 i = 0; i < tryNotes->length; i++) {
+      JSTryNote *tryNote = &tryNotes->vector[i];
+      if (tryNote->kind == JSTRY_CATCH &&
+          offset - tryNote->start < tryNote->length)
+        return true;
+    }
+  }
+
+  return false;
+}
+
+// Frees the filter's copies of the class names and filename prefix it
+// was given.
+static void
+PYM_clearThrowHookFilter(PYM_ThrowHookFilter *filter)
+{
+  for (Py_ssize_t i = 0; i < filter->classNameCount; i++)
+    PyMem_Free(filter->classNames[i]);
+  PyMem_Free(filter->classNames);
+  filter->classNames = NULL;
+  filter->classNameCount = 0;
+  PyMem_Free(filter->filenamePrefix);
+  filter->filenamePrefix = NULL;
+}
+
+// Returns whether the given throw should be passed on to the context's
+// Python throw hook. This doesn't touch the Python interpreter, so it
+// can be called without the GIL.
+static bool
+PYM_shouldCallThrowHook(PYM_JSContextObject *context, JSScript *script)
+{
+  PYM_ThrowHookFilter *filter = &context->throwHookFilter;
+  JSContext *cx = context->cx;
+
+  if (filter->filenamePrefix) {
+    const char *filename = script ? JS_GetScriptFilename(cx, script) : NULL;
+    if (filename == NULL ||
+        strncmp(filename, filter->filenamePrefix,
+                strlen(filter->filenamePrefix)) != 0)
+      return false;
+  }
+
+  if (filter->classNames) {
+    jsval exception;
+    if (!JS_GetPendingException(cx, &exception))
+      return false;
+    const char *className = PYM_getExceptionClassName(cx, exception);
+    bool found = false;
+    for (Py_ssize_t i = 0; i < filter->classNameCount; i++)
+      if (strcmp(filter->classNames[i], className) == 0) {
+        found = true;
+        break;
+      }
+    if (!found)
+      return false;
+  }
+
+  if (filter->uncaughtOnly && PYM_isExceptionCaught(cx))
+    return false;
+
+  if (filter->sampleRate < 1.0) {
+    filter->sampleCredit += filter->sampleRate;
+    if (filter->sampleCredit < 1.0)
+      return false;
+    filter->sampleCredit -= 1.0;
+  }
+
+  return true;
+}
+
 // This is the default throw hook for pydermonkey-owned JS contexts,
 // when they've defined one in Python.
 static JSTrapStatus
 PYM_throwHook(JSContext *cx, JSScript *script, jsbytecode *pc, jsval *rval,
               void *closure)
 {
-  PYM_PyAutoEnsureGIL gil;
   PYM_JSContextObject *context = (PYM_JSContextObject *)
     JS_GetContextPrivate(cx);
 
+  if (!PYM_shouldCallThrowHook(context, script)) {
+    context->throwHookFilter.suppressed++;
+    return JSTRAP_CONTINUE;
+  }
+  context->throwHookFilter.calls++;
+
+  PYM_PyAutoEnsureGIL gil;
   PyObject *callable = context->throwHook;
   PyObject *args = PyTuple_Pack(1, (PyObject *) context);
   if (args == NULL) {
@@ -73,8 +191,37 @@ PYM_throwHook(JSContext *cx, JSScript *script, jsbytecode *pc, jsval *rval,
   return JSTRAP_CONTINUE;
 }
 
-// This is the default JSOperationCallback for pydermonkey-owned JS
-// contexts, when they've defined one in Python.
+int
+PYM_checkUsageBudget(PYM_JSContextObject *context)
+{
+  PYM_UsageCounter *usage = &context->jsUsage;
+
+  if (context->wallTimeBudget > 0.0) {
+    double wallTime = usage->wallTime;
+    if (usage->depth)
+      wallTime += PYM_getWallTime() - usage->startWallTime;
+    if (wallTime >= context->wallTimeBudget) {
+      PyErr_SetString(PYM_budgetExceededError, "Wall time budget exceeded");
+      return -1;
+    }
+  }
+
+  if (context->cpuTimeBudget > 0.0) {
+    double cpuTime = usage->cpuTime;
+    if (usage->depth)
+      cpuTime += PYM_getThreadCPUTime() - usage->startCPUTime;
+    if (cpuTime >= context->cpuTimeBudget) {
+      PyErr_SetString(PYM_budgetExceededError, "CPU time budget exceeded");
+      return -1;
+    }
+  }
+
+  return 0;
+}
+
+// This is the JSOperationCallback for pydermonkey-owned JS contexts.
+// It enforces the context's usage budget and then calls any callback
+// that's been defined in Python.
 static JSBool
 PYM_operationCallback(JSContext *cx)
 {
@@ -82,7 +229,22 @@ PYM_operationCallback(JSContext *cx)
   PYM_JSContextObject *context = (PYM_JSContextObject *)
     JS_GetContextPrivate(cx);
 
+  context->operationCallbackTicks++;
+  PYM_enforceMemoryLimits(context->runtime, cx);
+  PYM_deliverGCEvents(context->runtime);
+
+  if (context->profiler)
+    PYM_sampleProfiler(context->profiler);
+
+  // Note that we don't set a pending JS exception here, so that the
+  // script can't catch the error.
+  if (PYM_checkUsageBudget(context) == -1)
+    return JS_FALSE;
+
   PyObject *callable = context->opCallback;
+  if (callable == NULL)
+    return JS_TRUE;
+
   PyObject *args = PyTuple_Pack(1, (PyObject *) context);
   if (args == NULL) {
     JS_ReportOutOfMemory(cx);
@@ -113,7 +275,17 @@ PYM_reportError(JSContext *cx, const char *message, JSErrorReport *report)
     else
       PyErr_Warn(NULL, message);
   } else {
-    PyErr_SetString(PYM_error, message);
+    // Other out-of-memory errors, such as the ones we report when a
+    // Python allocation fails, stay MemoryErrors.
+    PYM_JSRuntimeObject *runtime = (PYM_JSRuntimeObject *)
+      JS_GetRuntimePrivate(JS_GetRuntime(cx));
+    if (report->errorNumber == JSMSG_OUT_OF_MEMORY &&
+        runtime && PYM_hitHardMemoryLimit(runtime))
+      PyErr_SetString(PYM_memoryLimitError, message);
+    else if (report->errorNumber == JSMSG_OUT_OF_MEMORY)
+      PyErr_SetString(PyExc_MemoryError, message);
+    else
+      PyErr_SetString(PYM_error, message);
     if (JS_IsExceptionPending(cx))
       JS_ClearPendingException(cx);
   }
@@ -134,13 +306,48 @@ PYM_clear(PYM_JSContextObject *self)
   // Dropping our owned reference to the runtime means that it
   // could disappear, so we're going to have to destroy our own
   // context before we do that.
+  if (self->watchdog) {
+    PYM_stopWatchdog(self->watchdog);
+    self->watchdog = NULL;
+  }
+
+  if (self->profiler) {
+    PyObject *stacks = PYM_stopProfiler(self->profiler);
+    if (stacks == NULL)
+      PyErr_Clear();
+    Py_XDECREF(stacks);
+    self->profiler = NULL;
+  }
+
+  if (self->functionStats)
+    PYM_disableFunctionStats(self);
+
+  if (self->coverage) {
+    PyObject *files = PYM_stopCoverage(self, self->coverage);
+    if (files == NULL)
+      PyErr_Clear();
+    Py_XDECREF(files);
+    self->coverage = NULL;
+  }
+
   if (self->cx) {
+    if (self->prevContext)
+      self->prevContext->nextContext = self->nextContext;
+    else
+      self->runtime->firstContext = self->nextContext;
+    if (self->nextContext)
+      self->nextContext->prevContext = self->prevContext;
+    self->prevContext = NULL;
+    self->nextContext = NULL;
+
     JS_DestroyContext(self->cx);
     self->cx = NULL;
+    self->runtime->contextCount--;
   }
 
   Py_CLEAR(self->opCallback);
   Py_CLEAR(self->throwHook);
+  PYM_clearThrowHookFilter(&self->throwHookFilter);
   Py_CLEAR(self->runtime);
   return 0;
 }
@@ -282,6 +489,44 @@ PYM_getStack(PYM_JSContextObject *self, PyObject *args)
   Py_RETURN_NONE;
 }
 
+static PyObject *
+PYM_getStackCompact(PYM_JSContextObject *self, PyObject *args,
+                    PyObject *kwargs)
+{
+  PYM_SANITY_CHECK(self->runtime);
+  static const char *kwlist[] = {"max_depth", "resolve", NULL};
+  unsigned int maxDepth = 64;
+  int resolve = 0;
+
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|Ii", (char **) kwlist,
+                                   &maxDepth, &resolve))
+    return NULL;
+
+  PyObject *frames = PyList_New(0);
+  if (frames == NULL)
+    return NULL;
+
+  JSStackFrame *iteratorp = NULL;
+  JSStackFrame *frame;
+  unsigned int depth = 0;
+
+  while (depth < maxDepth &&
+         (frame = JS_FrameIterator(self->cx, &iteratorp)) != NULL) {
+    PyObject *info = PYM_newStackFrame(self, frame, resolve != 0);
+    if (info == NULL || PyList_Append(frames, info) == -1) {
+      Py_XDECREF(info);
+      Py_DECREF(frames);
+      return NULL;
+    }
+    Py_DECREF(info);
+    depth++;
+  }
+
+  PyObject *result = PyList_AsTuple(frames);
+  Py_DECREF(frames);
+  return result;
+}
+
 static int
 PYM_maybeGetFunctionHolder(PYM_JSContextObject *context,
                            PYM_JSObject *object,
@@ -397,6 +642,17 @@ PYM_getObjectPrivate(PYM_JSContextObject *self, PyObject *args)
     return NULL;
 
   JSClass *klass = JS_GET_CLASS(self->cx, obj);
+  if (klass == &PYM_JS_BufferViewClass) {
+    PYM_BufferView *bufferView = (PYM_BufferView *)
+      JS_GetPrivate(self->cx, obj);
+    Py_INCREF(bufferView->object);
+    return bufferView->object;
+  }
+  if (klass == &PYM_JS_HostObjectClass) {
+    PYM_HostObject *host = (PYM_HostObject *) JS_GetPrivate(self->cx, obj);
+    Py_INCREF(host->backing);
+    return host->backing;
+  }
   if (klass != &PYM_JS_ObjectClass)
     Py_RETURN_NONE;
 
@@ -485,6 +741,234 @@ PYM_newObject(PYM_JSContextObject *self, PyObject *args)
   return (PyObject *) PYM_newJSObject(self, obj, NULL);
 }
 
+static JSBool
+PYM_enumerateGlobal(JSContext *cx, JSObject *obj)
+{
+  return JS_EnumerateStandardClasses(cx, obj);
+}
+
+static JSBool
+PYM_resolveGlobal(JSContext *cx, JSObject *obj, jsval id, uintN flags,
+                  JSObject **objp)
+{
+  if ((flags & JSRESOLVE_ASSIGNING) == 0) {
+    JSBool resolved;
+    if (!JS_ResolveStandardClass(cx, obj, id, &resolved))
+      return JS_FALSE;
+    if (resolved) {
+      *objp = obj;
+      return JS_TRUE;
+    }
+  }
+
+  *objp = NULL;
+  return JS_TRUE;
+}
+
+// This JSClass is used for global objects created by new_global().
+// Standard classes are defined on them the first time they're looked
+// up, or all at once when the global is enumerated.
+static JSClass PYM_JS_GlobalClass = {
+  "PydermonkeyGlobal", JSCLASS_GLOBAL_FLAGS | JSCLASS_NEW_RESOLVE,
+  JS_PropertyStub, JS_PropertyStub, JS_PropertyStub, JS_PropertyStub,
+  PYM_enumerateGlobal, (JSResolveOp) PYM_resolveGlobal, JS_ConvertStub,
+  JS_FinalizeStub, JSCLASS_NO_OPTIONAL_MEMBERS
+};
+
+static PyObject *
+PYM_newGlobal(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+  PyObject *lazy = Py_True;
+
+  if (!PyArg_ParseTuple(args, "|O", &lazy))
+    return NULL;
+
+  int isLazy = PyObject_IsTrue(lazy);
+  if (isLazy == -1)
+    return NULL;
+
+  JSObject *obj = JS_NewObject(self->cx, &PYM_JS_GlobalClass, NULL, NULL);
+  if (obj == NULL) {
+    PyErr_SetString(PYM_error, "JS_NewObject() failed");
+    return NULL;
+  }
+
+  // Wrapping the global right away roots it while the standard
+  // classes are defined.
+  PyObject *global = (PyObject *) PYM_newJSObject(self, obj, NULL);
+  if (global == NULL)
+    return NULL;
+
+  if (!isLazy && !JS_EnumerateStandardClasses(self->cx, obj)) {
+    Py_DECREF(global);
+    PYM_jsExceptionToPython(self);
+    return NULL;
+  }
+
+  if (JS_GetGlobalObject(self->cx) == NULL)
+    JS_SetGlobalObject(self->cx, obj);
+
+  return global;
+}
+
+// Sets callable to NULL if it's None; otherwise, makes sure that it's
+// callable. Returns 0 on success; otherwise, returns -1 and sets a
+// Python exception.
+static int
+PYM_checkOptionalCallable(PyObject **callable)
+{
+  if (*callable == Py_None)
+    *callable = NULL;
+  else if (*callable && !PyCallable_Check(*callable)) {
+    PyErr_SetString(PyExc_TypeError, "Hooks must be callable or None.");
+    return -1;
+  }
+  return 0;
+}
+
+static PyObject *
+PYM_newHostObjectMethod(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+  PyObject *backing;
+  PyObject *getter = NULL;
+  PyObject *setter = NULL;
+  PyObject *enumerator = NULL;
+  PyObject *resolver = NULL;
+
+  if (!PyArg_ParseTuple(args, "O|OOOO", &backing, &getter, &setter,
+                        &enumerator, &resolver))
+    return NULL;
+
+  if (PYM_checkOptionalCallable(&getter) == -1 ||
+      PYM_checkOptionalCallable(&setter) == -1 ||
+      PYM_checkOptionalCallable(&enumerator) == -1 ||
+      PYM_checkOptionalCallable(&resolver) == -1)
+    return NULL;
+
+  JSObject *obj = PYM_newHostObject(self, backing, getter, setter,
+                                    enumerator, resolver);
+  if (obj == NULL)
+    return NULL;
+
+  return (PyObject *) PYM_newJSObject(self, obj, NULL);
+}
+
+static PyObject *
+PYM_newBufferViewMethod(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+  PyObject *object;
+  PyObject *readonly = Py_True;
+
+  if (!PyArg_ParseTuple(args, "O|O", &object, &readonly))
+    return NULL;
+
+  int isReadonly = PyObject_IsTrue(readonly);
+  if (isReadonly == -1)
+    return NULL;
+
+  JSObject *obj = PYM_newBufferView(self, object, isReadonly);
+  if (obj == NULL)
+    return NULL;
+
+  return (PyObject *) PYM_newJSObject(self, obj, NULL);
+}
+
+static PyObject *
+PYM_snapshotGlobalMethod(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+  PYM_JSObject *object;
+
+  if (!PyArg_ParseTuple(args, "O!", &PYM_JSObjectType, &object))
+    return NULL;
+
+  PYM_ENSURE_RUNTIME_MATCH(self->runtime, object->runtime);
+
+  JSObject *snapshot = PYM_snapshotGlobal(self, object->obj);
+  if (snapshot == NULL)
+    return NULL;
+
+  return (PyObject *) PYM_newJSObject(self, snapshot, NULL);
+}
+
+static PyObject *
+PYM_resetGlobalMethod(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+  PYM_JSObject *object;
+  PYM_JSObject *snapshot;
+
+  if (!PyArg_ParseTuple(args, "O!O!", &PYM_JSObjectType, &object,
+                        &PYM_JSObjectType, &snapshot))
+    return NULL;
+
+  PYM_ENSURE_RUNTIME_MATCH(self->runtime, object->runtime);
+  PYM_ENSURE_RUNTIME_MATCH(self->runtime, snapshot->runtime);
+
+  if (JS_GET_CLASS(self->cx, snapshot->obj) != &PYM_JS_GlobalSnapshotClass) {
+    PyErr_SetString(PyExc_TypeError, "Object is not a global snapshot.");
+    return NULL;
+  }
+
+  if (PYM_resetGlobal(self, object->obj, snapshot->obj) == -1)
+    return NULL;
+
+  Py_RETURN_NONE;
+}
+
+static PyObject *
+PYM_freezePrelude(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+  PYM_JSObject *object;
+
+  if (!PyArg_ParseTuple(args, "O!", &PYM_JSObjectType, &object))
+    return NULL;
+
+  PYM_ENSURE_RUNTIME_MATCH(self->runtime, object->runtime);
+
+  if (self->runtime->prelude) {
+    PyErr_SetString(PYM_error, "Runtime already has a prelude.");
+    return NULL;
+  }
+
+  // This seals everything reachable from the prelude, after defining
+  // any properties that are resolved lazily, since they can't be added
+  // afterwards.
+  if (!JS_SealObject(self->cx, object->obj, JS_TRUE)) {
+    PYM_jsExceptionToPython(self);
+    return NULL;
+  }
+
+  self->runtime->prelude = object->obj;
+  Py_RETURN_NONE;
+}
+
+static PyObject *
+PYM_newPreludeGlobal(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+
+  if (self->runtime->prelude == NULL) {
+    PyErr_SetString(PYM_error, "Runtime has no prelude.");
+    return NULL;
+  }
+
+  // The new global is a plain object rather than one with a global
+  // class, so that SpiderMonkey finds the standard classes by looking
+  // them up through the prelude instead of initializing new ones on it.
+  JSObject *obj = JS_NewObject(self->cx, NULL, self->runtime->prelude, NULL);
+  if (obj == NULL) {
+    PyErr_SetString(PYM_error, "JS_NewObject() failed");
+    return NULL;
+  }
+
+  return (PyObject *) PYM_newJSObject(self, obj, NULL);
+}
+
 static PyObject *
 PYM_hasProperty(PYM_JSContextObject *self, PyObject *args)
 {
@@ -502,6 +986,9 @@ PYM_hasProperty(PYM_JSContextObject *self, PyObject *args)
   if (PYM_pyObjectToPropertyJsval(self, property, &propertyVal) == -1)
     return NULL;
 
+  PYM_AutoTraceEvent traceEvent(self->runtime, "api", "has_property");
+  traceEvent.setPropertyDetail(propertyVal);
+
   JSBool hasProperty;
   JSBool result;
   if (JSVAL_IS_INT(propertyVal)) {
@@ -543,6 +1030,9 @@ PYM_getProperty(PYM_JSContextObject *self, PyObject *args)
   if (PYM_pyObjectToPropertyJsval(self, property, &propertyVal) == -1)
     return NULL;
 
+  PYM_AutoTraceEvent traceEvent(self->runtime, "api", "get_property");
+  traceEvent.setPropertyDetail(propertyVal);
+
   jsval val;
   JSBool result;
 
@@ -584,6 +1074,9 @@ PYM_lookupProperty(PYM_JSContextObject *self, PyObject *args)
   if (PYM_pyObjectToPropertyJsval(self, property, &propertyVal) == -1)
     return NULL;
 
+  PYM_AutoTraceEvent traceEvent(self->runtime, "api", "lookup_property");
+  traceEvent.setPropertyDetail(propertyVal);
+
   jsval val;
   JSBool result;
 
@@ -613,6 +1106,16 @@ PYM_gc(PYM_JSContextObject *self, PyObject *args)
 {
   PYM_SANITY_CHECK(self->runtime);
   JS_GC(self->cx);
+  PYM_deliverGCEvents(self->runtime);
+  Py_RETURN_NONE;
+}
+
+static PyObject *
+PYM_maybeGC(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+  JS_MaybeGC(self->cx);
+  PYM_deliverGCEvents(self->runtime);
   Py_RETURN_NONE;
 }
 
@@ -658,6 +1161,13 @@ PYM_compileScript(PYM_JSContextObject *self, PyObject *args)
 
   PYM_UTF16String str(source, sourceLen);
 
+  PYM_RuntimeStats *stats = &self->runtime->stats;
+  PYM_AutoAPITimer apiTimer(&stats->api[PYM_API_COMPILE_SCRIPT]);
+  PYM_AutoTraceEvent traceEvent(self->runtime, "api", "compile_script");
+  traceEvent.setDetail(filename);
+  stats->scriptsCompiled++;
+  stats->sourceBytesCompiled += str.jslen * sizeof(jschar);
+
   JSScript *script;
   script = JS_CompileUCScript(self->cx, NULL, str.jsbuffer,
                               str.jslen, filename, lineNo);
@@ -672,6 +1182,85 @@ PYM_compileScript(PYM_JSContextObject *self, PyObject *args)
   return (PyObject *) PYM_newJSScript(self, script);
 }
 
+static PyObject *
+PYM_compileFunction(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+  const char *name;
+  PyObject *argNames;
+  char *source = NULL;
+  int sourceLen;
+  const char *filename;
+  int lineNo;
+  PYM_JSObject *scope = NULL;
+
+  if (!PyArg_ParseTuple(args, "zOes#si|O!", &name, &argNames,
+                        "utf-16", &source, &sourceLen, &filename, &lineNo,
+                        &PYM_JSObjectType, &scope))
+    return NULL;
+
+  PYM_UTF16String str(source, sourceLen);
+
+  PYM_RuntimeStats *stats = &self->runtime->stats;
+  PYM_AutoAPITimer apiTimer(&stats->api[PYM_API_COMPILE_FUNCTION]);
+  PYM_AutoTraceEvent traceEvent(self->runtime, "api", "compile_function");
+  traceEvent.setDetail(name ? name : filename);
+
+  JSObject *scopeObj;
+  if (scope) {
+    PYM_ENSURE_RUNTIME_MATCH(self->runtime, scope->runtime);
+    scopeObj = scope->obj;
+  } else {
+    scopeObj = JS_GetGlobalObject(self->cx);
+    if (scopeObj == NULL) {
+      PyErr_SetString(PYM_error,
+                      "Context has no global object; a scope is required.");
+      return NULL;
+    }
+  }
+
+  PyObject *names = PySequence_Fast(argNames,
+                                    "Argument names must be a sequence.");
+  if (names == NULL)
+    return NULL;
+
+  Py_ssize_t nargs = PySequence_Fast_GET_SIZE(names);
+  const char **argv = PyMem_New(const char *, nargs ? nargs : 1);
+  if (argv == NULL) {
+    Py_DECREF(names);
+    return PyErr_NoMemory();
+  }
+
+  for (Py_ssize_t i = 0; i < nargs; i++) {
+    PyObject *argName = PySequence_Fast_GET_ITEM(names, i);
+    if (!PyString_Check(argName)) {
+      PyMem_Free(argv);
+      Py_DECREF(names);
+      PyErr_SetString(PyExc_TypeError, "Argument names must be strings.");
+      return NULL;
+    }
+    argv[i] = PyString_AS_STRING(argName);
+  }
+
+  stats->functionsCompiled++;
+  stats->sourceBytesCompiled += str.jslen * sizeof(jschar);
+
+  JSFunction *fun = JS_CompileUCFunction(self->cx, scopeObj, name, nargs,
+                                         argv, str.jsbuffer, str.jslen,
+                                         filename, lineNo);
+  PyMem_Free(argv);
+  Py_DECREF(names);
+
+  if (fun == NULL) {
+    PYM_jsExceptionToPython(self);
+    return NULL;
+  }
+
+  // The new function object is only protected from GC as the context's
+  // newborn object, so it needs to be wrapped right away.
+  return (PyObject *) PYM_newJSObject(self, JS_GetFunctionObject(fun), NULL);
+}
+
 static PyObject *
 PYM_executeScript(PYM_JSContextObject *self, PyObject *args)
 {
@@ -686,11 +1275,24 @@ PYM_executeScript(PYM_JSContextObject *self, PyObject *args)
   PYM_ENSURE_RUNTIME_MATCH(self->runtime, object->runtime);
   PYM_ENSURE_RUNTIME_MATCH(self->runtime, script->base.runtime);
 
+  if (PYM_checkUsageBudget(self) == -1)
+    return NULL;
+
+  PYM_RuntimeStats *stats = &self->runtime->stats;
+  PYM_AutoAPITimer apiTimer(&stats->api[PYM_API_EXECUTE_SCRIPT]);
+  PYM_AutoTraceEvent traceEvent(self->runtime, "api", "execute_script");
+  traceEvent.setDetail(JS_GetScriptFilename(self->cx, script->script));
+  stats->executions++;
+
   jsval rval;
   JSBool result;
-  Py_BEGIN_ALLOW_THREADS;
-  result = JS_ExecuteScript(self->cx, object->obj, script->script, &rval);
-  Py_END_ALLOW_THREADS;
+  {
+    PYM_AutoUsageTimer timer(&self->jsUsage);
+    Py_BEGIN_ALLOW_THREADS;
+    result = JS_ExecuteScript(self->cx, object->obj, script->script, &rval);
+    Py_END_ALLOW_THREADS;
+  }
+  PYM_deliverGCEvents(self->runtime);
 
   if (!result) {
     PYM_jsExceptionToPython(self);
@@ -719,6 +1321,17 @@ PYM_evaluateScript(PYM_JSContextObject *self, PyObject *args)
 
   PYM_ENSURE_RUNTIME_MATCH(self->runtime, object->runtime);
 
+  if (PYM_checkUsageBudget(self) == -1)
+    return NULL;
+
+  PYM_RuntimeStats *stats = &self->runtime->stats;
+  PYM_AutoAPITimer apiTimer(&stats->api[PYM_API_EVALUATE_SCRIPT]);
+  PYM_AutoTraceEvent traceEvent(self->runtime, "api", "evaluate_script");
+  traceEvent.setDetail(filename);
+  stats->scriptsCompiled++;
+  stats->sourceBytesCompiled += str.jslen * sizeof(jschar);
+  stats->executions++;
+
   // Instead of calling JS_EvaluateUCScript(), we're going to first
   // compile the script and then execute it. This is because the
   // former function calls JS_DestroyScript() on the script it's
@@ -745,9 +1358,13 @@ PYM_evaluateScript(PYM_JSContextObject *self, PyObject *args)
 
   jsval rval;
   JSBool result;
-  Py_BEGIN_ALLOW_THREADS;
-  result = JS_ExecuteScript(self->cx, object->obj, pyScript->script, &rval);
-  Py_END_ALLOW_THREADS;
+  {
+    PYM_AutoUsageTimer timer(&self->jsUsage);
+    Py_BEGIN_ALLOW_THREADS;
+    result = JS_ExecuteScript(self->cx, object->obj, pyScript->script, &rval);
+    Py_END_ALLOW_THREADS;
+  }
+  PYM_deliverGCEvents(self->runtime);
 
   Py_DECREF((PyObject *) pyScript);
   if (!result) {
@@ -775,6 +1392,40 @@ PYM_isArrayObject(PYM_JSContextObject *self, PyObject *args)
   Py_RETURN_FALSE;
 }
 
+static PyObject *
+PYM_setIdentityPreserving(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+  PyObject *flag;
+
+  if (!PyArg_ParseTuple(args, "O", &flag))
+    return NULL;
+
+  int preserveIdentity = PyObject_IsTrue(flag);
+  if (preserveIdentity == -1)
+    return NULL;
+
+  PyObject *previous = self->preserveIdentity ? Py_True : Py_False;
+  self->preserveIdentity = preserveIdentity;
+
+  Py_INCREF(previous);
+  return previous;
+}
+
+static PyObject *
+PYM_promoteObject(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+  PYM_JSObject *object;
+
+  if (!PyArg_ParseTuple(args, "O!", &PYM_JSObjectType, &object))
+    return NULL;
+
+  PYM_ENSURE_RUNTIME_MATCH(self->runtime, object->runtime);
+
+  return (PyObject *) PYM_promoteJSObject(self, object);
+}
+
 static PyObject *
 PYM_enumerate(PYM_JSContextObject *self, PyObject *args)
 {
@@ -786,6 +1437,8 @@ PYM_enumerate(PYM_JSContextObject *self, PyObject *args)
 
   PYM_ENSURE_RUNTIME_MATCH(self->runtime, object->runtime);
 
+  PYM_AutoTraceEvent traceEvent(self->runtime, "api", "enumerate");
+
   JSIdArray *idArray = JS_Enumerate(self->cx, object->obj);
   if (idArray == NULL) {
     PYM_jsExceptionToPython(self);
@@ -843,6 +1496,9 @@ PYM_setProperty(PYM_JSContextObject *self, PyObject *args)
   if (PYM_pyObjectToPropertyJsval(self, property, &propertyVal) == -1)
     return NULL;
 
+  PYM_AutoTraceEvent traceEvent(self->runtime, "api", "set_property");
+  traceEvent.setPropertyDetail(propertyVal);
+
   jsval jsValue;
   if (PYM_pyObjectToJsval(self, value, &jsValue) == -1)
     return NULL;
@@ -885,6 +1541,9 @@ PYM_deleteProperty(PYM_JSContextObject *self, PyObject *args)
   if (PYM_pyObjectToPropertyJsval(self, property, &propertyVal) == -1)
     return NULL;
 
+  PYM_AutoTraceEvent traceEvent(self->runtime, "api", "delete_property");
+  traceEvent.setPropertyDetail(propertyVal);
+
   jsval jsValue;
   JSBool result;
   if (JSVAL_IS_INT(propertyVal)) {
@@ -927,6 +1586,9 @@ PYM_defineProperty(PYM_JSContextObject *self, PyObject *args)
   if (PYM_pyObjectToPropertyJsval(self, property, &propertyVal) == -1)
     return NULL;
 
+  PYM_AutoTraceEvent traceEvent(self->runtime, "api", "define_property");
+  traceEvent.setPropertyDetail(propertyVal);
+
   jsval jsValue;
   if (PYM_pyObjectToJsval(self, value, &jsValue) == -1)
     return NULL;
@@ -969,6 +1631,12 @@ PYM_callFunction(PYM_JSContextObject *self, PyObject *args)
   PYM_ENSURE_RUNTIME_MATCH(self->runtime, obj->runtime);
   PYM_ENSURE_RUNTIME_MATCH(self->runtime, fun->base.runtime);
 
+  PYM_RuntimeStats *stats = &self->runtime->stats;
+  PYM_AutoAPITimer apiTimer(&stats->api[PYM_API_CALL_FUNCTION]);
+  PYM_AutoTraceEvent traceEvent(self->runtime, "api", "call_function");
+  traceEvent.setFunctionDetail(fun->fun);
+  stats->pythonToJsCalls++;
+
   uintN argc = PyTuple_Size(funcArgs);
 
   jsval *argv = (jsval *) PyMem_Malloc(sizeof(jsval) * argc);
@@ -987,13 +1655,22 @@ PYM_callFunction(PYM_JSContextObject *self, PyObject *args)
     currArg++;
   }
 
+  if (PYM_checkUsageBudget(self) == -1) {
+    PyMem_Free(argv);
+    return NULL;
+  }
+
   jsval rval;
   JSBool result;
-  Py_BEGIN_ALLOW_THREADS;
-  result = JS_CallFunctionValue(self->cx, obj->obj,
-                                OBJECT_TO_JSVAL(fun->base.obj),
-                                argc, argv, &rval);
-  Py_END_ALLOW_THREADS;
+  {
+    PYM_AutoUsageTimer timer(&self->jsUsage);
+    Py_BEGIN_ALLOW_THREADS;
+    result = JS_CallFunctionValue(self->cx, obj->obj,
+                                  OBJECT_TO_JSVAL(fun->base.obj),
+                                  argc, argv, &rval);
+    Py_END_ALLOW_THREADS;
+  }
+  PYM_deliverGCEvents(self->runtime);
 
   PyMem_Free(argv);
 
@@ -1018,13 +1695,103 @@ PYM_newFunction(PYM_JSContextObject *self, PyObject *args)
   return (PyObject *) PYM_newJSFunctionFromCallable(self, callable, name);
 }
 
+// Returns a copy of the given Python string that's allocated with
+// PyMem_Malloc(). Returns NULL and sets a Python exception on failure.
+static char *
+PYM_copyString(PyObject *string)
+{
+  char *copy = (char *) PyMem_Malloc(PyString_GET_SIZE(string) + 1);
+  if (copy == NULL) {
+    PyErr_NoMemory();
+    return NULL;
+  }
+  memcpy(copy, PyString_AS_STRING(string), PyString_GET_SIZE(string) + 1);
+  return copy;
+}
+
+// Fills in the given throw hook filter from a dictionary of filters
+// passed to set_throw_hook(). Returns 0 on success; otherwise, returns
+// -1 and sets a Python exception.
+static int
+PYM_parseThrowHookFilter(PyObject *filters, PYM_ThrowHookFilter *filter)
+{
+  Py_ssize_t pos = 0;
+  PyObject *key;
+  PyObject *value;
+
+  while (PyDict_Next(filters, &pos, &key, &value)) {
+    if (!PyString_Check(key)) {
+      PyErr_SetString(PyExc_TypeError, "Filter names must be strings.");
+      return -1;
+    }
+
+    const char *name = PyString_AS_STRING(key);
+
+    if (strcmp(name, "class_names") == 0) {
+      PyObject *classNames = PySequence_Tuple(value);
+      if (classNames == NULL)
+        return -1;
+      Py_ssize_t count = PyTuple_GET_SIZE(classNames);
+      filter->classNames = PyMem_New(char *, count ? count : 1);
+      if (filter->classNames == NULL) {
+        Py_DECREF(classNames);
+        PyErr_NoMemory();
+        return -1;
+      }
+      for (Py_ssize_t i = 0; i < count; i++) {
+        PyObject *className = PyTuple_GET_ITEM(classNames, i);
+        if (!PyString_Check(className)) {
+          Py_DECREF(classNames);
+          PyErr_SetString(PyExc_TypeError, "Class names must be strings.");
+          return -1;
+        }
+        filter->classNames[i] = PYM_copyString(className);
+        if (filter->classNames[i] == NULL) {
+          Py_DECREF(classNames);
+          return -1;
+        }
+        filter->classNameCount++;
+      }
+      Py_DECREF(classNames);
+    } else if (strcmp(name, "filename_prefix") == 0) {
+      if (!PyString_Check(value)) {
+        PyErr_SetString(PyExc_TypeError,
+                        "Filename prefix must be a string.");
+        return -1;
+      }
+      filter->filenamePrefix = PYM_copyString(value);
+      if (filter->filenamePrefix == NULL)
+        return -1;
+    } else if (strcmp(name, "sample_rate") == 0) {
+      filter->sampleRate = PyFloat_AsDouble(value);
+      if (PyErr_Occurred())
+        return -1;
+      if (filter->sampleRate < 0.0 || filter->sampleRate > 1.0) {
+        PyErr_SetString(PyExc_ValueError,
+                        "Sample rate must be between 0 and 1.");
+        return -1;
+      }
+    } else if (strcmp(name, "uncaught_only") == 0) {
+      filter->uncaughtOnly = PyObject_IsTrue(value);
+      if (filter->uncaughtOnly == -1)
+        return -1;
+    } else {
+      PyErr_Format(PyExc_ValueError, "Unknown throw hook filter: %s", name);
+      return -1;
+    }
+  }
+
+  return 0;
+}
+
 static PyObject *
 PYM_setThrowHook(PYM_JSContextObject *self, PyObject *args)
 {
   PYM_SANITY_CHECK(self->runtime);
   PyObject *callable;
+  PyObject *filters = NULL;
 
-  if (!PyArg_ParseTuple(args, "O", &callable))
+  if (!PyArg_ParseTuple(args, "O|O!", &callable, &PyDict_Type, &filters))
     return NULL;
 
   if (!PyCallable_Check(callable)) {
@@ -1032,6 +1799,15 @@ PYM_setThrowHook(PYM_JSContextObject *self, PyObject *args)
     return NULL;
   }
 
+  PYM_ThrowHookFilter filter;
+  memset(&filter, 0, sizeof(filter));
+  filter.sampleRate = 1.0;
+
+  if (filters && PYM_parseThrowHookFilter(filters, &filter) == -1) {
+    PYM_clearThrowHookFilter(&filter);
+    return NULL;
+  }
+
   self->hooks.throwHook = PYM_throwHook;
   JS_SetContextDebugHooks(self->cx, &self->hooks);
 
@@ -1040,6 +1816,11 @@ PYM_setThrowHook(PYM_JSContextObject *self, PyObject *args)
     Py_DECREF(self->throwHook);
   self->throwHook = callable;
 
+  filter.calls = self->throwHookFilter.calls;
+  filter.suppressed = self->throwHookFilter.suppressed;
+  PYM_clearThrowHookFilter(&self->throwHookFilter);
+  self->throwHookFilter = filter;
+
   Py_RETURN_NONE;
 }
 
@@ -1057,8 +1838,6 @@ PYM_setOperationCallback(PYM_JSContextObject *self, PyObject *args)
     return NULL;
   }
 
-  JS_SetOperationCallback(self->cx, PYM_operationCallback);
-
   Py_INCREF(callable);
   if (self->opCallback)
     Py_DECREF(self->opCallback);
@@ -1074,18 +1853,281 @@ PYM_triggerOperationCallback(PYM_JSContextObject *self, PyObject *args)
   Py_RETURN_NONE;
 }
 
+static PyObject *
+PYM_startProfilerMethod(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+  unsigned int interval;
+  unsigned int maxDepth = 64;
+
+  if (!PyArg_ParseTuple(args, "I|I", &interval, &maxDepth))
+    return NULL;
+
+  if (interval == 0 || maxDepth == 0) {
+    PyErr_SetString(PyExc_ValueError,
+                    "Interval and maximum depth must be positive.");
+    return NULL;
+  }
+
+  if (self->profiler) {
+    PyErr_SetString(PYM_error, "Profiler is already running.");
+    return NULL;
+  }
+
+  self->profiler = PYM_startProfiler(self, interval, maxDepth);
+  if (self->profiler == NULL)
+    return NULL;
+
+  Py_RETURN_NONE;
+}
+
+static PyObject *
+PYM_stopProfilerMethod(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+
+  if (self->profiler == NULL) {
+    PyErr_SetString(PYM_error, "Profiler is not running.");
+    return NULL;
+  }
+
+  PyObject *stacks = PYM_stopProfiler(self->profiler);
+  self->profiler = NULL;
+  return stacks;
+}
+
+static void *
+PYM_interpreterHook(JSContext *cx, JSStackFrame *fp, JSBool before,
+                    JSBool *ok, void *closure)
+{
+  PYM_JSContextObject *context = (PYM_JSContextObject *)
+    JS_GetContextPrivate(cx);
+
+  if (before && context->coverage)
+    PYM_coverFrame(context->coverage, cx, fp);
+
+  if (context->functionStats)
+    return PYM_functionStatsHook(context->functionStats, cx, fp, before,
+                                 closure);
+
+  return NULL;
+}
+
+void
+PYM_destroyScriptHook(JSContext *cx, JSScript *script, void *closure)
+{
+  PYM_JSRuntimeObject *runtime = (PYM_JSRuntimeObject *)
+    JS_GetRuntimePrivate(JS_GetRuntime(cx));
+
+  for (PYM_JSContextObject *context = runtime->firstContext;
+       context;
+       context = context->nextContext)
+  {
+    if (context->coverage)
+      PYM_forgetCoverageScript(context->coverage, script);
+    if (context->functionStats)
+      PYM_forgetFunctionStatsScript(context->functionStats, script);
+  }
+}
+
+void
+PYM_updateInterpreterHooks(PYM_JSContextObject *context)
+{
+  JSInterpreterHook hook = NULL;
+
+  if (context->functionStats || context->coverage)
+    hook = PYM_interpreterHook;
+
+  context->hooks.callHook = hook;
+  context->hooks.executeHook = hook;
+  if (context->cx)
+    JS_SetContextDebugHooks(context->cx, &context->hooks);
+}
+
+static PyObject *
+PYM_startCoverageMethod(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+
+  if (self->coverage) {
+    PyErr_SetString(PYM_error, "Coverage is already running.");
+    return NULL;
+  }
+
+  self->coverage = PYM_startCoverage(self);
+  if (self->coverage == NULL)
+    return NULL;
+
+  PYM_updateInterpreterHooks(self);
+  Py_RETURN_NONE;
+}
+
+static PyObject *
+PYM_stopCoverageMethod(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+
+  if (self->coverage == NULL) {
+    PyErr_SetString(PYM_error, "Coverage is not running.");
+    return NULL;
+  }
+
+  PYM_Coverage *coverage = self->coverage;
+  self->coverage = NULL;
+  PYM_updateInterpreterHooks(self);
+  return PYM_stopCoverage(self, coverage);
+}
+
+static PyObject *
+PYM_enableFunctionStatsMethod(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+
+  if (self->functionStats == NULL &&
+      PYM_enableFunctionStats(self) == NULL)
+    return NULL;
+
+  Py_RETURN_NONE;
+}
+
+static PyObject *
+PYM_disableFunctionStatsMethod(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+
+  if (self->functionStats)
+    PYM_disableFunctionStats(self);
+
+  Py_RETURN_NONE;
+}
+
+static PyObject *
+PYM_getFunctionStatsMethod(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+  int reset = 0;
+
+  if (!PyArg_ParseTuple(args, "|i", &reset))
+    return NULL;
+
+  if (self->functionStats == NULL) {
+    PyErr_SetString(PYM_error, "Function stats are not enabled.");
+    return NULL;
+  }
+
+  return PYM_getFunctionStats(self->functionStats, reset);
+}
+
+static void
+PYM_resetUsageCounter(PYM_UsageCounter *counter)
+{
+  counter->calls = 0;
+  counter->wallTime = 0.0;
+  counter->cpuTime = 0.0;
+
+  // If we're being called from inside the activity being measured,
+  // only charge the time that's left from now on.
+  if (counter->depth) {
+    counter->startWallTime = PYM_getWallTime();
+    counter->startCPUTime = PYM_getThreadCPUTime();
+  }
+}
+
+static PyObject *
+PYM_getUsage(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+  int reset = 0;
+
+  if (!PyArg_ParseTuple(args, "|i", &reset))
+    return NULL;
+
+  PyObject *usage = Py_BuildValue(
+    "{sksdsdsksdsdsksksk}",
+    "calls", self->jsUsage.calls,
+    "wall_time", self->jsUsage.wallTime,
+    "cpu_time", self->jsUsage.cpuTime,
+    "callback_calls", self->callbackUsage.calls,
+    "callback_wall_time", self->callbackUsage.wallTime,
+    "callback_cpu_time", self->callbackUsage.cpuTime,
+    "operation_callbacks", self->operationCallbackTicks,
+    "throw_hook_calls", self->throwHookFilter.calls,
+    "throw_hook_suppressed", self->throwHookFilter.suppressed
+    );
+
+  if (usage && reset) {
+    PYM_resetUsageCounter(&self->jsUsage);
+    PYM_resetUsageCounter(&self->callbackUsage);
+    self->operationCallbackTicks = 0;
+    self->throwHookFilter.calls = 0;
+    self->throwHookFilter.suppressed = 0;
+  }
+
+  return usage;
+}
+
+static PyObject *
+PYM_setBudget(PYM_JSContextObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self->runtime);
+  double wallTime = 0.0;
+  double cpuTime = 0.0;
+
+  if (!PyArg_ParseTuple(args, "|dd", &wallTime, &cpuTime))
+    return NULL;
+
+  if (wallTime < 0.0 || cpuTime < 0.0) {
+    PyErr_SetString(PyExc_ValueError, "Budget must be non-negative.");
+    return NULL;
+  }
+
+  if ((wallTime > 0.0 || cpuTime > 0.0) && self->watchdog == NULL) {
+    self->watchdog = PYM_startWatchdog(self->cx, PYM_WATCHDOG_INTERVAL);
+    if (self->watchdog == NULL)
+      return NULL;
+  } else if (wallTime == 0.0 && cpuTime == 0.0 && self->watchdog) {
+    PYM_stopWatchdog(self->watchdog);
+    self->watchdog = NULL;
+  }
+
+  self->wallTimeBudget = wallTime;
+  self->cpuTimeBudget = cpuTime;
+
+  Py_RETURN_NONE;
+}
+
 static PyMethodDef PYM_JSContextMethods[] = {
   {"get_runtime", (PyCFunction) PYM_getRuntime, METH_VARARGS,
    "Get the JavaScript runtime associated with this context."},
   {"get_stack", (PyCFunction) PYM_getStack, METH_VARARGS,
    "Get the current stack for the context."},
+  {"get_stack_compact", (PyCFunction) PYM_getStackCompact,
+   METH_VARARGS | METH_KEYWORDS,
+   "Returns a tuple of lightweight frames for the current stack."},
   {"new_array_object", (PyCFunction) PYM_newArrayObject, METH_VARARGS,
    "Create a new JavaScript Array object."},
   {"new_object", (PyCFunction) PYM_newObject, METH_VARARGS,
    "Create a new JavaScript object."},
+  {"new_host_object", (PyCFunction) PYM_newHostObjectMethod, METH_VARARGS,
+   "Creates a JavaScript object that exposes a Python object's items."},
+  {"new_buffer_view", (PyCFunction) PYM_newBufferViewMethod, METH_VARARGS,
+   "Creates a JavaScript object that indexes into a Python buffer."},
+  {"new_global", (PyCFunction) PYM_newGlobal, METH_VARARGS,
+   "Creates a new global object with the standard JavaScript classes."},
+  {"snapshot_global", (PyCFunction) PYM_snapshotGlobalMethod, METH_VARARGS,
+   "Records an object's own properties so they can be restored later."},
+  {"reset_global", (PyCFunction) PYM_resetGlobalMethod, METH_VARARGS,
+   "Restores an object's own properties to those in a snapshot."},
+  {"freeze_prelude", (PyCFunction) PYM_freezePrelude, METH_VARARGS,
+   "Deep-seals a global and makes it the runtime's shared prelude."},
+  {"new_prelude_global", (PyCFunction) PYM_newPreludeGlobal, METH_VARARGS,
+   "Creates a new global object that inherits from the runtime's prelude."},
   {"init_standard_classes",
    (PyCFunction) PYM_initStandardClasses, METH_VARARGS,
    "Add standard classes and functions to the given object."},
+  {"compile_function",
+   (PyCFunction) PYM_compileFunction, METH_VARARGS,
+   "Compiles the given body of code into a JS function."},
   {"compile_script",
    (PyCFunction) PYM_compileScript, METH_VARARGS,
    "Compile the given JavaScript code using the given filename"
@@ -1109,6 +2151,12 @@ static PyMethodDef PYM_JSContextMethods[] = {
    "Returns whether or not the given JavaScript object is an array."},
   {"enumerate", (PyCFunction) PYM_enumerate, METH_VARARGS,
    "Returns a tuple of all a JavaScript object's enumerable properties."},
+  {"set_identity_preserving", (PyCFunction) PYM_setIdentityPreserving,
+   METH_VARARGS,
+   "Sets whether JavaScript objects are always wrapped by the same "
+   "Python object."},
+  {"promote_object", (PyCFunction) PYM_promoteObject, METH_VARARGS,
+   "Returns the identity-preserving wrapper for a JavaScript object."},
   {"define_property",
    (PyCFunction) PYM_defineProperty, METH_VARARGS,
    "Defines a property on a JavaScript object."},
@@ -1126,6 +2174,8 @@ static PyMethodDef PYM_JSContextMethods[] = {
    "Deletes the given property on the given object."},
   {"gc", (PyCFunction) PYM_gc, METH_VARARGS,
    "Performs garbage collection on the context's runtime."},
+  {"maybe_gc", (PyCFunction) PYM_maybeGC, METH_VARARGS,
+   "Performs garbage collection on the context's runtime if needed."},
   {"set_operation_callback", (PyCFunction) PYM_setOperationCallback,
    METH_VARARGS,
    "Sets the operation callback for the context."},
@@ -1134,6 +2184,27 @@ static PyMethodDef PYM_JSContextMethods[] = {
   {"trigger_operation_callback", (PyCFunction) PYM_triggerOperationCallback,
    METH_VARARGS,
    "Triggers the operation callback for the context."},
+  {"get_usage", (PyCFunction) PYM_getUsage, METH_VARARGS,
+   "Returns the JS and callback time used by the context."},
+  {"set_budget", (PyCFunction) PYM_setBudget, METH_VARARGS,
+   "Sets the maximum wall and CPU time the context may spend in JS."},
+  {"start_profiler", (PyCFunction) PYM_startProfilerMethod, METH_VARARGS,
+   "Starts sampling the context's JS stack at the given interval."},
+  {"stop_profiler", (PyCFunction) PYM_stopProfilerMethod, METH_VARARGS,
+   "Stops the profiler and returns the sampled stacks."},
+  {"enable_function_stats", (PyCFunction) PYM_enableFunctionStatsMethod,
+   METH_VARARGS,
+   "Starts collecting per-function call statistics for the context."},
+  {"disable_function_stats", (PyCFunction) PYM_disableFunctionStatsMethod,
+   METH_VARARGS,
+   "Stops collecting per-function call statistics for the context."},
+  {"get_function_stats", (PyCFunction) PYM_getFunctionStatsMethod,
+   METH_VARARGS,
+   "Returns the per-function call statistics for the context."},
+  {"start_coverage", (PyCFunction) PYM_startCoverageMethod, METH_VARARGS,
+   "Starts collecting line coverage for the context."},
+  {"stop_coverage", (PyCFunction) PYM_stopCoverageMethod, METH_VARARGS,
+   "Stops collecting line coverage and returns the per-line hit counts."},
   {"get_version", (PyCFunction) PYM_getVersion, METH_VARARGS,
    "Returns the JS version of the context."},
   {"set_gc_zeal", (PyCFunction) PYM_setGCZeal, METH_VARARGS,
@@ -1206,16 +2277,37 @@ PYM_newJSContextObject(PYM_JSRuntimeObject *runtime, JSContext *cx)
     return NULL;
 
   memset(&context->hooks, 0, sizeof(context->hooks));
+  context->hooks.destroyScriptHook = PYM_destroyScriptHook;
 
   context->weakrefs = NULL;
   context->opCallback = NULL;
   context->throwHook = NULL;
+  memset(&context->throwHookFilter, 0, sizeof(context->throwHookFilter));
+  context->throwHookFilter.sampleRate = 1.0;
+  memset(&context->jsUsage, 0, sizeof(context->jsUsage));
+  memset(&context->callbackUsage, 0, sizeof(context->callbackUsage));
+  context->operationCallbackTicks = 0;
+  context->wallTimeBudget = 0.0;
+  context->cpuTimeBudget = 0.0;
+  context->watchdog = NULL;
+  context->profiler = NULL;
+  context->functionStats = NULL;
+  context->coverage = NULL;
+  context->preserveIdentity = 1;
   context->runtime = runtime;
   Py_INCREF(runtime);
 
+  context->prevContext = NULL;
+  context->nextContext = runtime->firstContext;
+  if (runtime->firstContext)
+    runtime->firstContext->prevContext = context;
+  runtime->firstContext = context;
+
   context->cx = cx;
+  runtime->contextCount++;
   JS_SetContextPrivate(cx, context);
   JS_SetErrorReporter(cx, PYM_reportError);
+  JS_SetOperationCallback(cx, PYM_operationCallback);
 
 #ifdef JS_GC_ZEAL
   JS_SetGCZeal(cx, PYM_defaultGCZeal);
@@ -43,14 +43,59 @@
 #include <jsdbgapi.h>
 #include <Python.h>
 
+// Accumulated resource usage for one kind of activity on a context.
+// Re-entrant activity is only timed at its outermost level, so that
+// nested calls aren't counted twice.
 typedef struct {
+  unsigned long calls;
+  unsigned int depth;
+  double wallTime;
+  double cpuTime;
+  double startWallTime;
+  double startCPUTime;
+} PYM_UsageCounter;
+
+// Filters that are applied in C before a context's throw hook is
+// called, so that exceptions nobody is interested in don't cost a call
+// into Python. They're checked without the GIL, so they're copied out
+// of the Python objects they were given as.
+typedef struct {
+  char **classNames;
+  Py_ssize_t classNameCount;
+  char *filenamePrefix;
+  double sampleRate;
+  double sampleCredit;
+  int uncaughtOnly;
+  unsigned long calls;
+  unsigned long suppressed;
+} PYM_ThrowHookFilter;
+
+struct PYM_Profiler;
+struct PYM_FunctionStatsTable;
+struct PYM_Coverage;
+struct PYM_Watchdog;
+
+typedef struct PYM_JSContextObject {
   PyObject_HEAD
   PYM_JSRuntimeObject *runtime;
   JSContext *cx;
   PyObject *opCallback;
   PyObject *throwHook;
+  PYM_ThrowHookFilter throwHookFilter;
   PyObject *weakrefs;
   JSDebugHooks hooks;
+  PYM_UsageCounter jsUsage;
+  PYM_UsageCounter callbackUsage;
+  unsigned long operationCallbackTicks;
+  double wallTimeBudget;
+  double cpuTimeBudget;
+  struct PYM_Watchdog *watchdog;
+  struct PYM_Profiler *profiler;
+  struct PYM_FunctionStatsTable *functionStats;
+  struct PYM_Coverage *coverage;
+  int preserveIdentity;
+  struct PYM_JSContextObject *prevContext;
+  struct PYM_JSContextObject *nextContext;
 } PYM_JSContextObject;
 
 extern PyTypeObject PYM_JSContextType;
@@ -62,4 +107,23 @@ PYM_newJSContextObject(PYM_JSRuntimeObject *runtime,
 extern PyObject *
 PYM_setDefaultGCZeal(PyObject *self, PyObject *args);
 
+// Checks the given context's JS usage against its budget. Returns 0
+// if the context is within budget; otherwise, returns -1 and sets a
+// Python exception.
+extern int
+PYM_checkUsageBudget(PYM_JSContextObject *context);
+
+// Installs or removes the context's call and execute hooks,
+// depending on whether anything that needs them is enabled.
+extern void
+PYM_updateInterpreterHooks(PYM_JSContextObject *context);
+
+// Tells every context of the script's runtime that the script is being
+// destroyed, so that anything they keep keyed by its address can be
+// dropped before the address is reused. This is installed as the
+// destroy script hook of the runtime and of every context, since
+// scripts are destroyed on whichever context runs the GC.
+extern void
+PYM_destroyScriptHook(JSContext *cx, JSScript *script, void *closure);
+
 #endif
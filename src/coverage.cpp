@@ -0,0 +1,377 @@
+/* ***** BEGIN LICENSE BLOCK *****
+ * Version: MPL 1.1/GPL 2.0/LGPL 2.1
+ *
+ * The contents of this file are subject to the Mozilla Public License Version
+ * 1.1 (the "License"); you may not use this file except in compliance with
+ * the License. You may obtain a copy of the License at
+ * http://www.mozilla.org/MPL/
+ *
+ * Software distributed under the License is distributed on an "AS IS" basis,
+ * WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+ * for the specific language governing rights and limitations under the
+ * License.
+ *
+ * The Original Code is Pydermonkey.
+ *
+ * The Initial Developer of the Original Code is Mozilla.
+ * Portions created by the Initial Developer are Copyright (C) 2007
+ * the Initial Developer. All Rights Reserved.
+ *
+ * Contributor(s):
+ *   Atul Varma <atul@mozilla.com>
+ *
+ * Alternatively, the contents of this file may be used under the terms of
+ * either the GNU General Public License Version 2 or later (the "GPL"), or
+ * the GNU Lesser General Public License Version 2.1 or later (the "LGPL"),
+ * in which case the provisions of the GPL or the LGPL are applicable instead
+ * of those above. If you wish to allow use of your version of this file only
+ * under the terms of either the GPL or the LGPL, and not to allow others to
+ * use your version of this file under the terms of the MPL, indicate your
+ * decision by deleting the provisions above and replace them with the notice
+ * and other provisions required by the GPL or the LGPL. If you do not delete
+ * the provisions above, a recipient may use your version of this file under
+ * the terms of any one of the MPL, the GPL or the LGPL.
+ *
+ * ***** END LICENSE BLOCK ***** */
+
+#include "coverage.h"
+#include "utils.h"
+
+#include "jsdbgapi.h"
+
+#include <limits.h>
+#include <stdlib.h>
+#include <string.h>
+
+typedef struct {
+  JSDHashEntryStub base;
+  PYM_CoverageScript *script;
+} PYM_CoverageEntry;
+
+static void
+PYM_destroyCoverageScript(PYM_CoverageScript *covered)
+{
+  free(covered->filename);
+  free(covered->hits);
+  free(covered);
+}
+
+static PYM_CoverageScript *
+PYM_findCoverageScript(PYM_Coverage *coverage, JSScript *script)
+{
+  PYM_CoverageEntry *entry = (PYM_CoverageEntry *)
+    JS_DHashTableOperate(&coverage->scripts, script, JS_DHASH_LOOKUP);
+  if (JS_DHASH_ENTRY_IS_BUSY((JSDHashEntryHdr *) entry))
+    return entry->script;
+  return NULL;
+}
+
+// Returns whether any collector in the runtime other than the given
+// one is covering the given script and hasn't seen the given line of
+// it run yet. If line is negative, any collector covering the script
+// at all counts.
+static bool
+PYM_isCoveredElsewhere(JSContext *cx, PYM_Coverage *coverage,
+                       JSScript *script, int line)
+{
+  PYM_JSRuntimeObject *runtime = (PYM_JSRuntimeObject *)
+    JS_GetRuntimePrivate(JS_GetRuntime(cx));
+
+  for (PYM_JSContextObject *context = runtime->firstContext;
+       context;
+       context = context->nextContext) {
+    if (context->coverage == NULL || context->coverage == coverage)
+      continue;
+    PYM_CoverageScript *other = PYM_findCoverageScript(context->coverage,
+                                                       script);
+    if (other && (line < 0 || !other->hits[line]))
+      return true;
+  }
+
+  return false;
+}
+
+// The trap set on the first instruction of every line of a covered
+// script. Traps belong to the script, which may also be run on other
+// contexts, so each collector that's covering the script has its own
+// record of the line, and the trap is removed once none of them is
+// waiting for the line any more.
+static JSTrapStatus
+PYM_coverageTrap(JSContext *cx, JSScript *script, jsbytecode *pc,
+                 jsval *rval, void *closure)
+{
+  PYM_JSContextObject *context = (PYM_JSContextObject *)
+    JS_GetContextPrivate(cx);
+  unsigned int baseLine = JS_GetScriptBaseLineNumber(cx, script);
+  int line = (int) (JS_PCToLineNumber(cx, script, pc) - baseLine);
+
+  if (line < 0 || (unsigned int) line >= JS_GetScriptLineExtent(cx, script))
+    return JSTRAP_CONTINUE;
+
+  PYM_Coverage *coverage = context ? context->coverage : NULL;
+  if (coverage) {
+    PYM_CoverageScript *covered = PYM_findCoverageScript(coverage, script);
+    if (covered)
+      covered->hits[line] = 1;
+  }
+
+  if (!PYM_isCoveredElsewhere(cx, coverage, script, line))
+    JS_ClearTrap(cx, script, pc, NULL, NULL);
+
+  return JSTRAP_CONTINUE;
+}
+
+// Sets a trap at the first instruction of every line of the given
+// script. This is called without the GIL, so the C library's
+// allocator is used instead of Python's.
+static PYM_CoverageScript *
+PYM_instrumentScript(PYM_Coverage *coverage, JSContext *cx,
+                     JSScript *script)
+{
+  PYM_CoverageScript *covered = (PYM_CoverageScript *) calloc(
+    1, sizeof(PYM_CoverageScript)
+    );
+  if (covered == NULL)
+    return NULL;
+
+  const char *filename = JS_GetScriptFilename(cx, script);
+  if (filename == NULL)
+    filename = "<unknown>";
+
+  covered->script = script;
+  covered->baseLine = JS_GetScriptBaseLineNumber(cx, script);
+  covered->lineExtent = JS_GetScriptLineExtent(cx, script);
+  covered->filename = (char *) malloc(strlen(filename) + 1);
+  covered->hits = (unsigned char *) calloc(covered->lineExtent ?
+                                           covered->lineExtent : 1, 1);
+
+  if (covered->filename == NULL || covered->hits == NULL) {
+    PYM_destroyCoverageScript(covered);
+    return NULL;
+  }
+  strcpy(covered->filename, filename);
+
+  for (unsigned int i = 0; i < covered->lineExtent; i++) {
+    unsigned int lineno = covered->baseLine + i;
+    jsbytecode *pc = JS_LineNumberToPC(cx, script, lineno);
+
+    // JS_LineNumberToPC() returns the closest following line if the
+    // given one has no code of its own.
+    if (pc == NULL || JS_PCToLineNumber(cx, script, pc) != lineno)
+      continue;
+
+    if (!JS_SetTrap(cx, script, pc, PYM_coverageTrap, NULL))
+      break;
+  }
+
+  covered->next = coverage->first;
+  coverage->first = covered;
+  return covered;
+}
+
+void
+PYM_coverFrame(PYM_Coverage *coverage, JSContext *cx, JSStackFrame *fp)
+{
+  JSScript *script = JS_GetFrameScript(cx, fp);
+  if (script == NULL)
+    return;
+
+  PYM_CoverageEntry *entry = (PYM_CoverageEntry *)
+    JS_DHashTableOperate(&coverage->scripts, script, JS_DHASH_ADD);
+  if (entry == NULL || entry->script != NULL)
+    return;
+
+  entry->base.key = script;
+  entry->script = PYM_instrumentScript(coverage, cx, script);
+  if (entry->script == NULL)
+    JS_DHashTableRawRemove(&coverage->scripts, (JSDHashEntryHdr *) entry);
+}
+
+void
+PYM_forgetCoverageScript(PYM_Coverage *coverage, JSScript *script)
+{
+  PYM_CoverageEntry *entry = (PYM_CoverageEntry *)
+    JS_DHashTableOperate(&coverage->scripts, script, JS_DHASH_LOOKUP);
+  if (!JS_DHASH_ENTRY_IS_BUSY((JSDHashEntryHdr *) entry))
+    return;
+
+  // The script's traps are cleared when it's destroyed.
+  entry->script->script = NULL;
+  JS_DHashTableRawRemove(&coverage->scripts, (JSDHashEntryHdr *) entry);
+}
+
+PYM_Coverage *
+PYM_startCoverage(PYM_JSContextObject *context)
+{
+  PYM_Coverage *coverage = (PYM_Coverage *) calloc(1, sizeof(PYM_Coverage));
+  if (coverage == NULL) {
+    PyErr_NoMemory();
+    return NULL;
+  }
+
+  if (!JS_DHashTableInit(&coverage->scripts,
+                         JS_DHashGetStubOps(),
+                         NULL,
+                         sizeof(PYM_CoverageEntry),
+                         JS_DHASH_DEFAULT_CAPACITY(100))) {
+    free(coverage);
+    PyErr_SetString(PYM_error, "JS_DHashTableInit() failed");
+    return NULL;
+  }
+
+  return coverage;
+}
+
+// Adds the given script's counts to the list of per-line counts for
+// its file, growing the list as necessary.
+static int
+PYM_addCoverageCounts(PyObject *files, PYM_CoverageScript *covered)
+{
+  PyObject *lines = PyDict_GetItemString(files, covered->filename);
+  if (lines == NULL) {
+    lines = PyList_New(0);
+    if (lines == NULL)
+      return -1;
+    int result = PyDict_SetItemString(files, covered->filename, lines);
+    Py_DECREF(lines);
+    if (result == -1)
+      return -1;
+  }
+
+  Py_ssize_t size = covered->baseLine + covered->lineExtent;
+  while (PyList_GET_SIZE(lines) < size) {
+    PyObject *zero = PyInt_FromLong(0);
+    if (zero == NULL)
+      return -1;
+    int result = PyList_Append(lines, zero);
+    Py_DECREF(zero);
+    if (result == -1)
+      return -1;
+  }
+
+  for (unsigned int i = 0; i < covered->lineExtent; i++) {
+    if (covered->hits[i] == 0)
+      continue;
+    Py_ssize_t lineno = covered->baseLine + i;
+    unsigned long total = PyInt_AsUnsignedLongMask(
+      PyList_GET_ITEM(lines, lineno)
+      );
+    // Counts saturate rather than overflowing the array's items.
+    if (total < ULONG_MAX)
+      total++;
+    PyObject *count = PyLong_FromUnsignedLong(total);
+    if (count == NULL)
+      return -1;
+    PyList_SetItem(lines, lineno, count);
+  }
+
+  return 0;
+}
+
+static PyObject *
+PYM_coverageToDict(PYM_Coverage *coverage)
+{
+  PyObject *files = PyDict_New();
+  if (files == NULL)
+    return NULL;
+
+  PYM_CoverageScript *covered;
+  for (covered = coverage->first; covered; covered = covered->next)
+    if (PYM_addCoverageCounts(files, covered) == -1) {
+      Py_DECREF(files);
+      return NULL;
+    }
+
+  PyObject *arrayModule = PyImport_ImportModule("array");
+  if (arrayModule == NULL) {
+    Py_DECREF(files);
+    return NULL;
+  }
+
+  Py_ssize_t pos = 0;
+  PyObject *filename;
+  PyObject *lines;
+  while (PyDict_Next(files, &pos, &filename, &lines)) {
+    PyObject *array = PyObject_CallMethod(arrayModule, "array", "sO",
+                                          "L", lines);
+    if (array == NULL) {
+      Py_DECREF(arrayModule);
+      Py_DECREF(files);
+      return NULL;
+    }
+    // Replacing the value of an existing key doesn't disturb the
+    // iteration.
+    PyDict_SetItem(files, filename, array);
+    Py_DECREF(array);
+  }
+
+  Py_DECREF(arrayModule);
+  return files;
+}
+
+PyObject *
+PYM_stopCoverage(PYM_JSContextObject *context, PYM_Coverage *coverage)
+{
+  PYM_CoverageScript *covered;
+
+  PyObject *files = PYM_coverageToDict(coverage);
+
+  // Scripts that have been destroyed have lost their traps already.
+  for (covered = coverage->first; covered; covered = covered->next)
+    if (covered->script &&
+        !PYM_isCoveredElsewhere(context->cx, coverage, covered->script, -1))
+      JS_ClearScriptTraps(context->cx, covered->script);
+
+  JS_DHashTableFinish(&coverage->scripts);
+  while (coverage->first) {
+    covered = coverage->first;
+    coverage->first = covered->next;
+    PYM_destroyCoverageScript(covered);
+  }
+  free(coverage);
+
+  return files;
+}
+
+PyObject *
+PYM_getScriptCoverage(PYM_JSRuntimeObject *runtime, JSScript *script)
+{
+  PyObject *hits = NULL;
+
+  for (PYM_JSContextObject *context = runtime->firstContext;
+       context;
+       context = context->nextContext) {
+    if (context->coverage == NULL)
+      continue;
+    PYM_CoverageScript *covered = PYM_findCoverageScript(context->coverage,
+                                                         script);
+    if (covered == NULL)
+      continue;
+
+    if (hits == NULL) {
+      hits = PyString_FromStringAndSize((const char *) covered->hits,
+                                        covered->lineExtent);
+      if (hits == NULL)
+        return NULL;
+    } else {
+      char *buffer = PyString_AS_STRING(hits);
+      for (unsigned int i = 0; i < covered->lineExtent; i++)
+        buffer[i] |= covered->hits[i];
+    }
+  }
+
+  if (hits == NULL)
+    Py_RETURN_NONE;
+
+  PyObject *arrayModule = PyImport_ImportModule("array");
+  if (arrayModule == NULL) {
+    Py_DECREF(hits);
+    return NULL;
+  }
+
+  PyObject *array = PyObject_CallMethod(arrayModule, "array", "sO", "B",
+                                        hits);
+  Py_DECREF(arrayModule);
+  Py_DECREF(hits);
+  return array;
+}
@@ -0,0 +1,99 @@
+/* ***** BEGIN LICENSE BLOCK *****
+ * Version: MPL 1.1/GPL 2.0/LGPL 2.1
+ *
+ * The contents of this file are subject to the Mozilla Public License Version
+ * 1.1 (the "License"); you may not use this file except in compliance with
+ * the License. You may obtain a copy of the License at
+ * http://www.mozilla.org/MPL/
+ *
+ * Software distributed under the License is distributed on an "AS IS" basis,
+ * WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+ * for the specific language governing rights and limitations under the
+ * License.
+ *
+ * The Original Code is Pydermonkey.
+ *
+ * The Initial Developer of the Original Code is Mozilla.
+ * Portions created by the Initial Developer are Copyright (C) 2007
+ * the Initial Developer. All Rights Reserved.
+ *
+ * Contributor(s):
+ *   Atul Varma <atul@mozilla.com>
+ *
+ * Alternatively, the contents of this file may be used under the terms of
+ * either the GNU General Public License Version 2 or later (the "GPL"), or
+ * the GNU Lesser General Public License Version 2.1 or later (the "LGPL"),
+ * in which case the provisions of the GPL or the LGPL are applicable instead
+ * of those above. If you wish to allow use of your version of this file only
+ * under the terms of either the GPL or the LGPL, and not to allow others to
+ * use your version of this file under the terms of the MPL, indicate your
+ * decision by deleting the provisions above and replace them with the notice
+ * and other provisions required by the GPL or the LGPL. If you do not delete
+ * the provisions above, a recipient may use your version of this file under
+ * the terms of any one of the MPL, the GPL or the LGPL.
+ *
+ * ***** END LICENSE BLOCK ***** */
+
+#ifndef PYM_COVERAGE_H
+#define PYM_COVERAGE_H
+
+#include "context.h"
+
+#include <jsapi.h>
+#include <jsdhash.h>
+#include <Python.h>
+
+// Lines of a single script that have run. Each line starts out with a
+// trap on its first instruction; the first time the line runs, it's
+// marked in hits, which is indexed by line number relative to the
+// script's base line, and its trap is removed so that it runs at full
+// speed from then on. The script is NULL once it's been destroyed.
+typedef struct PYM_CoverageScript {
+  JSScript *script;
+  char *filename;
+  unsigned int baseLine;
+  unsigned int lineExtent;
+  unsigned char *hits;
+  struct PYM_CoverageScript *next;
+} PYM_CoverageScript;
+
+// A line coverage collector attached to a single context. Scripts are
+// instrumented by the context's call and execute hooks the first time
+// they're entered on that context.
+typedef struct PYM_Coverage {
+  JSDHashTable scripts;
+  PYM_CoverageScript *first;
+} PYM_Coverage;
+
+// Creates a coverage collector for the given context. Returns NULL and
+// sets a Python exception on failure.
+extern PYM_Coverage *
+PYM_startCoverage(PYM_JSContextObject *context);
+
+// Destroys the collector, returning a new reference to a dictionary
+// that maps filenames to arrays of per-line hit counts, and removes
+// any traps that no other collector needs. The collector must already
+// have been detached from its context.
+extern PyObject *
+PYM_stopCoverage(PYM_JSContextObject *context, PYM_Coverage *coverage);
+
+// Instruments the script of the given frame, if it hasn't been
+// already. This is called from the context's call and execute hooks,
+// possibly without the GIL.
+extern void
+PYM_coverFrame(PYM_Coverage *coverage, JSContext *cx, JSStackFrame *fp);
+
+// Forgets the given script, which is being destroyed, so that a new
+// script at the same address gets instrumented again. The lines
+// recorded so far are kept. This may be called during GC.
+extern void
+PYM_forgetCoverageScript(PYM_Coverage *coverage, JSScript *script);
+
+// Returns a new reference to an array of flags, one per line of the
+// given script, that are set for the lines that any of the runtime's
+// running collectors has seen run. Returns None if no collector is
+// covering the script.
+extern PyObject *
+PYM_getScriptCoverage(PYM_JSRuntimeObject *runtime, JSScript *script);
+
+#endif
@@ -0,0 +1,368 @@
+/* ***** BEGIN LICENSE BLOCK *****
+ * Version: MPL 1.1/GPL 2.0/LGPL 2.1
+ *
+ * The contents of this file are subject to the Mozilla Public License Version
+ * 1.1 (the "License"); you may not use this file except in compliance with
+ * the License. You may obtain a copy of the License at
+ * http://www.mozilla.org/MPL/
+ *
+ * Software distributed under the License is distributed on an "AS IS" basis,
+ * WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+ * for the specific language governing rights and limitations under the
+ * License.
+ *
+ * The Original Code is Pydermonkey.
+ *
+ * The Initial Developer of the Original Code is Mozilla.
+ * Portions created by the Initial Developer are Copyright (C) 2007
+ * the Initial Developer. All Rights Reserved.
+ *
+ * Contributor(s):
+ *   Atul Varma <atul@mozilla.com>
+ *
+ * Alternatively, the contents of this file may be used under the terms of
+ * either the GNU General Public License Version 2 or later (the "GPL"), or
+ * the GNU Lesser General Public License Version 2.1 or later (the "LGPL"),
+ * in which case the provisions of the GPL or the LGPL are applicable instead
+ * of those above. If you wish to allow use of your version of this file only
+ * under the terms of either the GPL or the LGPL, and not to allow others to
+ * use your version of this file under the terms of the MPL, indicate your
+ * decision by deleting the provisions above and replace them with the notice
+ * and other provisions required by the GPL or the LGPL. If you do not delete
+ * the provisions above, a recipient may use your version of this file under
+ * the terms of any one of the MPL, the GPL or the LGPL.
+ *
+ * ***** END LICENSE BLOCK ***** */
+
+#include "funcstats.h"
+#include "utils.h"
+
+#include "jsdbgapi.h"
+
+#include <stdlib.h>
+#include <string.h>
+
+typedef struct {
+  JSDHashEntryStub base;
+  PYM_FunctionStats *stats;
+} PYM_FunctionStatsEntry;
+
+// The hooks are called without the GIL, so the C library's allocator
+// is used throughout instead of Python's.
+static char *
+PYM_copyString(const char *str)
+{
+  size_t size = strlen(str) + 1;
+  char *copy = (char *) malloc(size);
+  if (copy)
+    memcpy(copy, str, size);
+  return copy;
+}
+
+// Statistics are kept per (filename, lineno, name) key rather than
+// per script, so that compiling the same code over and over doesn't
+// grow the table. The keys table's entries are JSDHashEntryStubs whose
+// keys are the statistics themselves.
+static JSDHashNumber
+PYM_hashFunctionStatsKey(JSDHashTable *table, const void *key)
+{
+  const PYM_FunctionStats *stats = (const PYM_FunctionStats *) key;
+  JSDHashNumber hash = JS_DHashStringKey(table, stats->filename);
+
+  hash = (hash >> 28) ^ (hash << 4) ^ stats->lineno;
+  if (stats->name)
+    hash = (hash >> 28) ^ (hash << 4) ^ JS_DHashStringKey(table, stats->name);
+  return hash;
+}
+
+static JSBool
+PYM_matchFunctionStatsKey(JSDHashTable *table, const JSDHashEntryHdr *entry,
+                          const void *key)
+{
+  const PYM_FunctionStats *a = (const PYM_FunctionStats *)
+    ((const JSDHashEntryStub *) entry)->key;
+  const PYM_FunctionStats *b = (const PYM_FunctionStats *) key;
+
+  if (a->lineno != b->lineno || strcmp(a->filename, b->filename) != 0)
+    return JS_FALSE;
+  if (a->name == NULL || b->name == NULL)
+    return a->name == b->name;
+  return strcmp(a->name, b->name) == 0;
+}
+
+static JSDHashTableOps PYM_functionStatsKeyOps = {
+  JS_DHashAllocTable,
+  JS_DHashFreeTable,
+  JS_DHashGetKeyStub,
+  PYM_hashFunctionStatsKey,
+  PYM_matchFunctionStatsKey,
+  JS_DHashMoveEntryStub,
+  JS_DHashClearEntryStub,
+  JS_DHashFinalizeStub,
+  NULL
+};
+
+static PYM_FunctionStats *
+PYM_newFunctionStats(PYM_FunctionStatsTable *table,
+                     const PYM_FunctionStats *key)
+{
+  PYM_FunctionStats *stats = (PYM_FunctionStats *) calloc(
+    1, sizeof(PYM_FunctionStats)
+    );
+  if (stats == NULL)
+    return NULL;
+
+  stats->filename = PYM_copyString(key->filename);
+  stats->lineno = key->lineno;
+  if (key->name)
+    stats->name = PYM_copyString(key->name);
+
+  if (stats->filename == NULL || (key->name && stats->name == NULL)) {
+    free(stats->filename);
+    free(stats->name);
+    free(stats);
+    return NULL;
+  }
+
+  stats->next = table->first;
+  table->first = stats;
+  return stats;
+}
+
+// Looks up the statistics for the given frame's script, creating them
+// if necessary.
+static PYM_FunctionStats *
+PYM_lookupFunctionStats(PYM_FunctionStatsTable *table, JSContext *cx,
+                        JSStackFrame *fp, JSScript *script)
+{
+  PYM_FunctionStatsEntry *entry = (PYM_FunctionStatsEntry *)
+    JS_DHashTableOperate(&table->scripts, script, JS_DHASH_ADD);
+  if (entry == NULL)
+    return NULL;
+
+  // Scripts are keyed by address, but entries are removed when their
+  // script is destroyed, so an address that's been reused by a new
+  // script is always looked up by key again.
+  if (entry->stats != NULL)
+    return entry->stats;
+
+  PYM_FunctionStats key;
+  const char *filename = JS_GetScriptFilename(cx, script);
+  key.filename = (char *) (filename ? filename : "<unknown>");
+  key.lineno = JS_GetScriptBaseLineNumber(cx, script);
+  key.name = NULL;
+
+  JSFunction *fun = JS_GetFrameFunction(cx, fp);
+  if (fun) {
+    JSString *id = JS_GetFunctionId(fun);
+    if (id)
+      key.name = JS_GetStringBytes(id);
+  }
+
+  JSDHashEntryStub *keyEntry = (JSDHashEntryStub *)
+    JS_DHashTableOperate(&table->keys, &key, JS_DHASH_ADD);
+  if (keyEntry == NULL) {
+    JS_DHashTableRawRemove(&table->scripts, (JSDHashEntryHdr *) entry);
+    return NULL;
+  }
+
+  if (keyEntry->key == NULL) {
+    keyEntry->key = PYM_newFunctionStats(table, &key);
+    if (keyEntry->key == NULL) {
+      JS_DHashTableRawRemove(&table->keys, (JSDHashEntryHdr *) keyEntry);
+      JS_DHashTableRawRemove(&table->scripts, (JSDHashEntryHdr *) entry);
+      return NULL;
+    }
+  }
+
+  entry->base.key = script;
+  entry->stats = (PYM_FunctionStats *) keyEntry->key;
+  return entry->stats;
+}
+
+void *
+PYM_functionStatsHook(PYM_FunctionStatsTable *table, JSContext *cx,
+                      JSStackFrame *fp, JSBool before, void *closure)
+{
+  if (before) {
+    // Native functions have no script; time spent in them is charged
+    // to their caller.
+    JSScript *script = JS_GetFrameScript(cx, fp);
+    if (script == NULL)
+      return NULL;
+
+    if (table->depth == table->maxDepth) {
+      unsigned int maxDepth = table->maxDepth ? table->maxDepth * 2 : 64;
+      PYM_FunctionStatsFrame *frames = (PYM_FunctionStatsFrame *) realloc(
+        table->frames, sizeof(PYM_FunctionStatsFrame) * maxDepth
+        );
+      if (frames == NULL)
+        return NULL;
+      table->frames = frames;
+      table->maxDepth = maxDepth;
+    }
+
+    PYM_FunctionStats *stats = PYM_lookupFunctionStats(table, cx, fp,
+                                                       script);
+    if (stats == NULL)
+      return NULL;
+
+    stats->calls++;
+    stats->active++;
+
+    PYM_FunctionStatsFrame *frame = &table->frames[table->depth++];
+    frame->stats = stats;
+    frame->childTime = 0.0;
+    frame->startTime = PYM_getWallTime();
+
+    // The return value is handed back to us when the frame exits. It's
+    // the frame's depth rather than a pointer, so that it can be
+    // safely ignored if the table has been replaced in the meantime.
+    return (void *) (size_t) table->depth;
+  }
+
+  size_t depth = (size_t) closure;
+  if (depth == 0 || depth > table->depth)
+    return NULL;
+
+  // Any frames above this one should already have exited, but if they
+  // haven't, they're discarded without being timed.
+  while (table->depth > depth)
+    table->frames[--table->depth].stats->active--;
+
+  PYM_FunctionStatsFrame *frame = &table->frames[--table->depth];
+  PYM_FunctionStats *stats = frame->stats;
+  double elapsed = PYM_getWallTime() - frame->startTime;
+
+  stats->selfTime += elapsed - frame->childTime;
+
+  // Only the outermost activation of a recursive function counts
+  // towards its total time.
+  if (--stats->active == 0)
+    stats->totalTime += elapsed;
+
+  if (table->depth)
+    table->frames[table->depth - 1].childTime += elapsed;
+
+  return NULL;
+}
+
+void
+PYM_forgetFunctionStatsScript(PYM_FunctionStatsTable *table,
+                              JSScript *script)
+{
+  PYM_FunctionStatsEntry *entry = (PYM_FunctionStatsEntry *)
+    JS_DHashTableOperate(&table->scripts, script, JS_DHASH_LOOKUP);
+  if (JS_DHASH_ENTRY_IS_BUSY((JSDHashEntryHdr *) entry))
+    JS_DHashTableRawRemove(&table->scripts, (JSDHashEntryHdr *) entry);
+}
+
+PYM_FunctionStatsTable *
+PYM_enableFunctionStats(PYM_JSContextObject *context)
+{
+  PYM_FunctionStatsTable *table = (PYM_FunctionStatsTable *) calloc(
+    1, sizeof(PYM_FunctionStatsTable)
+    );
+  if (table == NULL) {
+    PyErr_NoMemory();
+    return NULL;
+  }
+
+  if (!JS_DHashTableInit(&table->scripts,
+                         JS_DHashGetStubOps(),
+                         NULL,
+                         sizeof(PYM_FunctionStatsEntry),
+                         JS_DHASH_DEFAULT_CAPACITY(100))) {
+    free(table);
+    PyErr_SetString(PYM_error, "JS_DHashTableInit() failed");
+    return NULL;
+  }
+
+  if (!JS_DHashTableInit(&table->keys,
+                         &PYM_functionStatsKeyOps,
+                         NULL,
+                         sizeof(JSDHashEntryStub),
+                         JS_DHASH_DEFAULT_CAPACITY(100))) {
+    JS_DHashTableFinish(&table->scripts);
+    free(table);
+    PyErr_SetString(PYM_error, "JS_DHashTableInit() failed");
+    return NULL;
+  }
+
+  context->functionStats = table;
+  PYM_updateInterpreterHooks(context);
+  return table;
+}
+
+void
+PYM_disableFunctionStats(PYM_JSContextObject *context)
+{
+  PYM_FunctionStatsTable *table = context->functionStats;
+
+  context->functionStats = NULL;
+  PYM_updateInterpreterHooks(context);
+
+  JS_DHashTableFinish(&table->scripts);
+  JS_DHashTableFinish(&table->keys);
+  while (table->first) {
+    PYM_FunctionStats *stats = table->first;
+    table->first = stats->next;
+    free(stats->filename);
+    free(stats->name);
+    free(stats);
+  }
+  free(table->frames);
+  free(table);
+}
+
+PyObject *
+PYM_getFunctionStats(PYM_FunctionStatsTable *table, int reset)
+{
+  PyObject *result = PyDict_New();
+  if (result == NULL)
+    return NULL;
+
+  PYM_FunctionStats *stats;
+  for (stats = table->first; stats; stats = stats->next) {
+    if (stats->calls == 0)
+      continue;
+
+    PyObject *key = Py_BuildValue("(sIz)", stats->filename, stats->lineno,
+                                  stats->name);
+    if (key == NULL) {
+      Py_DECREF(result);
+      return NULL;
+    }
+
+    PyObject *value = Py_BuildValue("(kdd)", stats->calls, stats->totalTime,
+                                    stats->selfTime);
+    if (value == NULL || PyDict_SetItem(result, key, value) == -1) {
+      Py_XDECREF(value);
+      Py_DECREF(key);
+      Py_DECREF(result);
+      return NULL;
+    }
+    Py_DECREF(value);
+    Py_DECREF(key);
+  }
+
+  if (reset) {
+    // Frames that are currently running keep their statistics
+    // objects, so these are zeroed rather than freed.
+    for (stats = table->first; stats; stats = stats->next) {
+      stats->calls = 0;
+      stats->totalTime = 0.0;
+      stats->selfTime = 0.0;
+    }
+
+    // Frames that are currently running are only charged for the time
+    // that's left from now on.
+    double now = PYM_getWallTime();
+    for (unsigned int i = 0; i < table->depth; i++) {
+      table->frames[i].startTime = now;
+      table->frames[i].childTime = 0.0;
+    }
+  }
+
+  return result;
+}
@@ -0,0 +1,111 @@
+/* ***** BEGIN LICENSE BLOCK *****
+ * Version: MPL 1.1/GPL 2.0/LGPL 2.1
+ *
+ * The contents of this file are subject to the Mozilla Public License Version
+ * 1.1 (the "License"); you may not use this file except in compliance with
+ * the License. You may obtain a copy of the License at
+ * http://www.mozilla.org/MPL/
+ *
+ * Software distributed under the License is distributed on an "AS IS" basis,
+ * WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+ * for the specific language governing rights and limitations under the
+ * License.
+ *
+ * The Original Code is Pydermonkey.
+ *
+ * The Initial Developer of the Original Code is Mozilla.
+ * Portions created by the Initial Developer are Copyright (C) 2007
+ * the Initial Developer. All Rights Reserved.
+ *
+ * Contributor(s):
+ *   Atul Varma <atul@mozilla.com>
+ *
+ * Alternatively, the contents of this file may be used under the terms of
+ * either the GNU General Public License Version 2 or later (the "GPL"), or
+ * the GNU Lesser General Public License Version 2.1 or later (the "LGPL"),
+ * in which case the provisions of the GPL or the LGPL are applicable instead
+ * of those above. If you wish to allow use of your version of this file only
+ * under the terms of either the GPL or the LGPL, and not to allow others to
+ * use your version of this file under the terms of the MPL, indicate your
+ * decision by deleting the provisions above and replace them with the notice
+ * and other provisions required by the GPL or the LGPL. If you do not delete
+ * the provisions above, a recipient may use your version of this file under
+ * the terms of any one of the MPL, the GPL or the LGPL.
+ *
+ * ***** END LICENSE BLOCK ***** */
+
+#ifndef PYM_FUNCSTATS_H
+#define PYM_FUNCSTATS_H
+
+#include "context.h"
+
+#include <jsapi.h>
+#include <jsdhash.h>
+#include <Python.h>
+
+// Accumulated statistics for one JS function or top-level script,
+// shared by every script with the same filename, line number and name.
+typedef struct PYM_FunctionStats {
+  char *filename;
+  unsigned int lineno;
+  char *name;
+  unsigned long calls;
+  unsigned int active;
+  double totalTime;
+  double selfTime;
+  struct PYM_FunctionStats *next;
+} PYM_FunctionStats;
+
+// A JS frame that is currently being timed.
+typedef struct {
+  PYM_FunctionStats *stats;
+  double startTime;
+  double childTime;
+} PYM_FunctionStatsFrame;
+
+// Per-function call statistics for a single context, collected by its
+// call and execute debug hooks. Since the hooks are called while JS
+// code is running, and therefore without the GIL, nothing in here may
+// be touched by them through the Python C API.
+typedef struct PYM_FunctionStatsTable {
+  JSDHashTable scripts;
+  JSDHashTable keys;
+  PYM_FunctionStats *first;
+  PYM_FunctionStatsFrame *frames;
+  unsigned int depth;
+  unsigned int maxDepth;
+} PYM_FunctionStatsTable;
+
+// Creates a function stats table and installs its hooks on the given
+// context. Returns NULL and sets a Python exception on failure.
+extern PYM_FunctionStatsTable *
+PYM_enableFunctionStats(PYM_JSContextObject *context);
+
+// Removes the function stats hooks from the given context and
+// destroys its table.
+extern void
+PYM_disableFunctionStats(PYM_JSContextObject *context);
+
+// Records the entry into or exit from the given frame. This is called
+// from the context's call and execute hooks, with the same arguments;
+// the return value of the call made on entry must be passed back as
+// the closure of the call made on exit.
+extern void *
+PYM_functionStatsHook(PYM_FunctionStatsTable *table, JSContext *cx,
+                      JSStackFrame *fp, JSBool before, void *closure);
+
+// Forgets the given script, which is being destroyed, so that a new
+// script at the same address is looked up by its own key. The
+// statistics collected so far stay with the script's key. This may be
+// called during GC.
+extern void
+PYM_forgetFunctionStatsScript(PYM_FunctionStatsTable *table,
+                              JSScript *script);
+
+// Returns a new reference to a dictionary mapping (filename, lineno,
+// name) tuples to (calls, total time, self time) tuples, optionally
+// resetting the table's statistics afterwards.
+extern PyObject *
+PYM_getFunctionStats(PYM_FunctionStatsTable *table, int reset);
+
+#endif
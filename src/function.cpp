@@ -36,6 +36,7 @@
 
 #include "function.h"
 #include "utils.h"
+#include "tracer.h"
 
 #include "jsdbgapi.h"
 #include "structmember.h"
@@ -44,7 +45,6 @@ static void
 PYM_JSFunctionDealloc(PYM_JSFunction *self)
 {
   self->fun = NULL;
-  self->filename = NULL;
 
   if (self->name) {
     Py_DECREF(self->name);
@@ -80,6 +80,22 @@ PYM_dispatchJSFunctionToPython(JSContext *cx,
   PYM_JSContextObject *context = (PYM_JSContextObject *)
     JS_GetContextPrivate(cx);
 
+  // Like the operation callback, this is a point at which we can stop
+  // a context that's gone over budget; no JS exception is set, so the
+  // script can't catch the error.
+  if (PYM_checkUsageBudget(context) == -1)
+    return JS_FALSE;
+
+  PYM_enforceMemoryLimits(context->runtime, cx);
+  PYM_deliverGCEvents(context->runtime);
+
+  PYM_AutoUsageTimer timer(&context->callbackUsage);
+  context->runtime->stats.jsToPythonCalls++;
+
+  PYM_AutoTraceEvent traceEvent(context->runtime, "callback", "callback");
+  if (traceEvent.isRecording())
+    traceEvent.setFunctionDetail(JS_ValueToFunction(cx, callee));
+
   jsval thisArg = OBJECT_TO_JSVAL(obj);
   PyObject *pyThisArg = PYM_jsvalToPyObject(context, thisArg);
   if (pyThisArg == NULL) {
@@ -135,20 +151,95 @@ PYM_dispatchJSFunctionToPython(JSContext *cx,
   return JS_TRUE;
 }
 
+static PyObject *
+PYM_getName(PYM_JSFunction *self, void *closure)
+{
+  if (!self->nameResolved) {
+    JSString *name = JS_GetFunctionId(self->fun);
+    if (name != NULL) {
+      // It's not an anonymous function.
+      self->name = PYM_jsStringToPyObject(name);
+      if (self->name == NULL)
+        return NULL;
+    }
+    self->nameResolved = 1;
+  }
+
+  if (self->name == NULL)
+    Py_RETURN_NONE;
+
+  Py_INCREF(self->name);
+  return self->name;
+}
+
+// TODO: Ideally, we'd convert the script to an object and set it as
+// an attribute of the function, but this results in strange segfaults,
+// perhaps because JS functions destroy their scripts on finalization
+// while creating an object from a script makes it subject to GC.
+static JSScript *
+PYM_getFunctionScript(PYM_JSFunction *self)
+{
+  return JS_GetFunctionScript(self->base.runtime->cx, self->fun);
+}
+
+static PyObject *
+PYM_getFilename(PYM_JSFunction *self, void *closure)
+{
+  JSScript *script = PYM_getFunctionScript(self);
+  const char *filename = NULL;
+
+  // Only interpreted functions have scripts.
+  if (script)
+    filename = JS_GetScriptFilename(self->base.runtime->cx, script);
+
+  if (filename == NULL)
+    Py_RETURN_NONE;
+
+  return PyString_FromString(filename);
+}
+
+static PyObject *
+PYM_getBaseLineno(PYM_JSFunction *self, void *closure)
+{
+  JSScript *script = PYM_getFunctionScript(self);
+  unsigned int baseLineno = 0;
+
+  if (script)
+    baseLineno = JS_GetScriptBaseLineNumber(self->base.runtime->cx, script);
+
+  return PyInt_FromLong(baseLineno);
+}
+
+static PyObject *
+PYM_getLineExtent(PYM_JSFunction *self, void *closure)
+{
+  JSScript *script = PYM_getFunctionScript(self);
+  unsigned int lineExtent = 0;
+
+  if (script)
+    lineExtent = JS_GetScriptLineExtent(self->base.runtime->cx, script);
+
+  return PyInt_FromLong(lineExtent);
+}
+
 static PyMemberDef PYM_members[] = {
-  {"name", T_OBJECT, offsetof(PYM_JSFunction, name), READONLY,
-   "Name of the function."},
-  {"filename", T_STRING, offsetof(PYM_JSFunction, filename), READONLY,
-   "Filename of function's source code."},
-  {"base_lineno", T_UINT, offsetof(PYM_JSFunction, baseLineno), READONLY,
-   "Base line number of function's source code."},
-  {"line_extent", T_UINT, offsetof(PYM_JSFunction, lineExtent), READONLY,
-   "Line extent of function's source code."},
   {"is_python", T_BYTE, offsetof(PYM_JSFunction, isPython), READONLY,
    "Whether or not the function is implemented in Python."},
   {NULL, NULL, NULL, NULL, NULL}
 };
 
+static PyGetSetDef PYM_getsets[] = {
+  {"name", (getter) PYM_getName, NULL,
+   "Name of the function.", NULL},
+  {"filename", (getter) PYM_getFilename, NULL,
+   "Filename of function's source code.", NULL},
+  {"base_lineno", (getter) PYM_getBaseLineno, NULL,
+   "Base line number of function's source code.", NULL},
+  {"line_extent", (getter) PYM_getLineExtent, NULL,
+   "Line extent of function's source code.", NULL},
+  {NULL, NULL, NULL, NULL, NULL}
+};
+
 PyTypeObject PYM_JSFunctionType = {
   PyObject_HEAD_INIT(NULL)
   0,                           /*ob_size*/
@@ -178,12 +269,13 @@ PyTypeObject PYM_JSFunctionType = {
   0,                           /* tp_traverse */
   0,                           /* tp_clear */
   0,                           /* tp_richcompare */
-  0,                           /* tp_weaklistoffset */
+                               /* tp_weaklistoffset */
+  offsetof(PYM_JSObject, weakrefs),
   0,                           /* tp_iter */
   0,                           /* tp_iternext */
   0,                           /* tp_methods */
   PYM_members,                 /* tp_members */
-  0,                           /* tp_getset */
+  PYM_getsets,                 /* tp_getset */
   0,                           /* tp_base */
   0,                           /* tp_dict */
   0,                           /* tp_descr_get */
@@ -198,43 +290,18 @@ PYM_JSFunction *
 PYM_newJSFunction(PYM_JSContextObject *context,
                   JSFunction *function)
 {
-  PYM_JSFunction *jsFunction = PyObject_New(PYM_JSFunction,
-                                            &PYM_JSFunctionType);
+  PYM_JSFunction *jsFunction = (PYM_JSFunction *) PYM_allocWrapper(
+    &PYM_JSFunctionType
+    );
   if (jsFunction == NULL)
     return NULL;
 
   jsFunction->fun = function;
   jsFunction->name = NULL;
-  jsFunction->filename = NULL;
-  jsFunction->baseLineno = 0;
-  jsFunction->lineExtent = 0;
+  jsFunction->nameResolved = 0;
   jsFunction->isPython = (JS_GetFunctionNative(context->cx, function) ==
                           PYM_dispatchJSFunctionToPython);
 
-  JSString *name = JS_GetFunctionId(jsFunction->fun);
-  if (name != NULL) {
-    // It's not an anonymous function.
-    jsFunction->name = PYM_jsvalToPyObject(context,
-                                           STRING_TO_JSVAL(name));
-    if (jsFunction->name == NULL) {
-      Py_DECREF((PyObject *) jsFunction);
-      return NULL;
-    }
-  }
-
-  JSScript *script = JS_GetFunctionScript(context->cx, jsFunction->fun);
-
-  // TODO: Ideally, we'd convert the script to an object and set it as
-  // an attribute of the function, but this results in strange segfaults,
-  // perhaps because JS functions destroy their scripts on finalization
-  // while creating an object from a script makes it subject to GC.
-  if (script) {
-    // It's an interpreted function.
-    jsFunction->filename = JS_GetScriptFilename(context->cx, script);
-    jsFunction->baseLineno = JS_GetScriptBaseLineNumber(context->cx, script);
-    jsFunction->lineExtent = JS_GetScriptLineExtent(context->cx, script);
-  }
-
   return jsFunction;
 }
 
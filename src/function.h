@@ -43,13 +43,13 @@
 #include <jsapi.h>
 #include <Python.h>
 
+// The function's name and source information are only looked up when
+// they're first accessed.
 typedef struct {
   PYM_JSObject base;
   JSFunction *fun;
   PyObject *name;
-  const char *filename;
-  unsigned int baseLineno;
-  unsigned int lineExtent;
+  char nameResolved;
   char isPython;
 } PYM_JSFunction;
 
@@ -0,0 +1,569 @@
+/* ***** BEGIN LICENSE BLOCK *****
+ * Version: MPL 1.1/GPL 2.0/LGPL 2.1
+ *
+ * The contents of this file are subject to the Mozilla Public License Version
+ * 1.1 (the "License"); you may not use this file except in compliance with
+ * the License. You may obtain a copy of the License at
+ * http://www.mozilla.org/MPL/
+ *
+ * Software distributed under the License is distributed on an "AS IS" basis,
+ * WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+ * for the specific language governing rights and limitations under the
+ * License.
+ *
+ * The Original Code is Pydermonkey.
+ *
+ * The Initial Developer of the Original Code is Mozilla.
+ * Portions created by the Initial Developer are Copyright (C) 2007
+ * the Initial Developer. All Rights Reserved.
+ *
+ * Contributor(s):
+ *   Atul Varma <atul@mozilla.com>
+ *
+ * Alternatively, the contents of this file may be used under the terms of
+ * either the GNU General Public License Version 2 or later (the "GPL"), or
+ * the GNU Lesser General Public License Version 2.1 or later (the "LGPL"),
+ * in which case the provisions of the GPL or the LGPL are applicable instead
+ * of those above. If you wish to allow use of your version of this file only
+ * under the terms of either the GPL or the LGPL, and not to allow others to
+ * use your version of this file under the terms of the MPL, indicate your
+ * decision by deleting the provisions above and replace them with the notice
+ * and other provisions required by the GPL or the LGPL. If you do not delete
+ * the provisions above, a recipient may use your version of this file under
+ * the terms of any one of the MPL, the GPL or the LGPL.
+ *
+ * ***** END LICENSE BLOCK ***** */
+
+#include "hostobject.h"
+#include "runtime.h"
+#include "utils.h"
+
+// Host objects expose the items of a Python object to JS without
+// copying them up front. The first time a script looks up a property,
+// the resolve hook checks that the item exists in Python and defines
+// a shared property for it, whose getter and setter go through to
+// Python on every access, so changes made on either side are always
+// seen by the other. Deletions are passed on to Python too.
+//
+// Only two things are kept on the JS side: the names that have been
+// resolved, and the host objects created for nested dictionaries,
+// lists and tuples, which are cached in an object in the reserved
+// slot so that reading the same container twice gives the same JS
+// object.
+
+#define PYM_CHILD_CACHE_SLOT 0
+
+static PYM_JSRuntimeObject *
+PYM_getRuntimeObject(JSContext *cx)
+{
+  return (PYM_JSRuntimeObject *) JS_GetRuntimePrivate(JS_GetRuntime(cx));
+}
+
+static PYM_HostObject *
+PYM_getHostObject(JSContext *cx, JSObject *obj)
+{
+  return (PYM_HostObject *) JS_GetInstancePrivate(cx, obj,
+                                                  &PYM_JS_HostObjectClass,
+                                                  NULL);
+}
+
+// Converts a property id to a Python key, returning a new reference.
+// Returns NULL without setting a Python exception if the id can't be
+// represented as a key.
+static PyObject *
+PYM_idToKey(jsval id)
+{
+  if (JSVAL_IS_INT(id))
+    return PyInt_FromLong(JSVAL_TO_INT(id));
+  if (JSVAL_IS_STRING(id))
+    return PYM_jsStringToPyObject(JSVAL_TO_STRING(id));
+  return NULL;
+}
+
+// Looks up the item with the given key. Returns 1 and sets value to a
+// new reference if the item exists, 0 if it doesn't, and -1 if a
+// Python exception was raised.
+static int
+PYM_lookupItem(PYM_JSContextObject *context, PYM_HostObject *host,
+               PyObject *key, PyObject **value)
+{
+  PyObject *backing = host->backing;
+
+  *value = NULL;
+
+  if (host->resolver) {
+    PyObject *result = PyObject_CallFunctionObjArgs(host->resolver,
+                                                    (PyObject *) context,
+                                                    backing, key, NULL);
+    if (result == NULL)
+      return -1;
+    int exists = PyObject_IsTrue(result);
+    Py_DECREF(result);
+    if (exists != 1)
+      return exists;
+  }
+
+  if (host->getter)
+    *value = PyObject_CallFunctionObjArgs(host->getter,
+                                          (PyObject *) context,
+                                          backing, key, NULL);
+  else if (PyDict_CheckExact(backing)) {
+    *value = PyDict_GetItem(backing, key);
+    if (*value == NULL)
+      return 0;
+    Py_INCREF(*value);
+    return 1;
+  } else if (PyList_CheckExact(backing) || PyTuple_CheckExact(backing)) {
+    Py_ssize_t size = PySequence_Fast_GET_SIZE(backing);
+    if (PyInt_Check(key)) {
+      long index = PyInt_AS_LONG(key);
+      if (index < 0 || index >= size)
+        return 0;
+      *value = PySequence_Fast_GET_ITEM(backing, index);
+      Py_INCREF(*value);
+      return 1;
+    }
+    static PyObject *lengthKey = NULL;
+    if (lengthKey == NULL) {
+      lengthKey = PyUnicode_FromString("length");
+      if (lengthKey == NULL)
+        return -1;
+    }
+    if (PyUnicode_Check(key) && PyUnicode_Compare(key, lengthKey) == 0) {
+      *value = PyInt_FromSsize_t(size);
+      return *value ? 1 : -1;
+    }
+    return 0;
+  } else
+    *value = PyObject_GetItem(backing, key);
+
+  if (*value == NULL) {
+    // A resolver has already told us that the item exists, so a
+    // missing item is an error in that case.
+    if (!host->resolver && PyErr_ExceptionMatches(PyExc_LookupError)) {
+      PyErr_Clear();
+      return 0;
+    }
+    return -1;
+  }
+
+  return 1;
+}
+
+static JSBool
+PYM_defineIdProperty(JSContext *cx, JSObject *obj, jsval id, jsval value,
+                     JSPropertyOp getter, JSPropertyOp setter, uintN attrs)
+{
+  if (JSVAL_IS_INT(id))
+    return JS_DefineElement(cx, obj, JSVAL_TO_INT(id), value, getter,
+                            setter, attrs);
+
+  JSString *str = JSVAL_TO_STRING(id);
+  return JS_DefineUCProperty(cx, obj, JS_GetStringChars(str),
+                             JS_GetStringLength(str), value, getter, setter,
+                             attrs);
+}
+
+static JSBool
+PYM_lookupIdProperty(JSContext *cx, JSObject *obj, jsval id, jsval *vp)
+{
+  if (JSVAL_IS_INT(id))
+    return JS_LookupElement(cx, obj, JSVAL_TO_INT(id), vp);
+
+  JSString *str = JSVAL_TO_STRING(id);
+  return JS_LookupUCProperty(cx, obj, JS_GetStringChars(str),
+                             JS_GetStringLength(str), vp);
+}
+
+// Returns the host object that exposes the given dictionary, list or
+// tuple item, reusing the one made the last time the item was read if
+// Python still has the same container there.
+static JSBool
+PYM_getChildHostObject(JSContext *cx, PYM_JSContextObject *context,
+                       PYM_HostObject *host, JSObject *obj, jsval id,
+                       PyObject *item, jsval *rval)
+{
+  jsval cacheVal;
+  if (!JS_GetReservedSlot(cx, obj, PYM_CHILD_CACHE_SLOT, &cacheVal))
+    return JS_FALSE;
+
+  JSObject *cache;
+  if (JSVAL_IS_OBJECT(cacheVal) && !JSVAL_IS_NULL(cacheVal)) {
+    cache = JSVAL_TO_OBJECT(cacheVal);
+    jsval cached;
+    if (!PYM_lookupIdProperty(cx, cache, id, &cached))
+      return JS_FALSE;
+    if (JSVAL_IS_OBJECT(cached) && !JSVAL_IS_NULL(cached)) {
+      PYM_HostObject *child = PYM_getHostObject(cx, JSVAL_TO_OBJECT(cached));
+      if (child && child->backing == item) {
+        *rval = cached;
+        return JS_TRUE;
+      }
+    }
+  } else {
+    cache = JS_NewObject(cx, NULL, NULL, NULL);
+    if (cache == NULL ||
+        !JS_SetReservedSlot(cx, obj, PYM_CHILD_CACHE_SLOT,
+                            OBJECT_TO_JSVAL(cache)))
+      return JS_FALSE;
+  }
+
+  JSObject *child = PYM_newHostObject(context, item, host->getter,
+                                      host->setter, host->enumerator,
+                                      host->resolver);
+  if (child == NULL) {
+    PYM_pythonExceptionToJs(context);
+    return JS_FALSE;
+  }
+
+  *rval = OBJECT_TO_JSVAL(child);
+  return PYM_defineIdProperty(cx, cache, id, *rval, NULL, NULL, 0);
+}
+
+// This is the getter of every resolved property. An item that has
+// since been removed from Python reads as undefined.
+static JSBool
+PYM_getHostObjectItem(JSContext *cx, JSObject *obj, jsval id, jsval *vp)
+{
+  PYM_PyAutoEnsureGIL gil;
+  PYM_JSContextObject *context = (PYM_JSContextObject *)
+    JS_GetContextPrivate(cx);
+  PYM_HostObject *host = PYM_getHostObject(cx, obj);
+  if (context == NULL || host == NULL)
+    return JS_TRUE;
+
+  PyObject *key = PYM_idToKey(id);
+  if (key == NULL) {
+    if (!PyErr_Occurred())
+      return JS_TRUE;
+    PYM_pythonExceptionToJs(context);
+    return JS_FALSE;
+  }
+
+  PyObject *item;
+  int found = PYM_lookupItem(context, host, key, &item);
+  Py_DECREF(key);
+  if (found == -1) {
+    PYM_pythonExceptionToJs(context);
+    return JS_FALSE;
+  }
+  if (found == 0) {
+    *vp = JSVAL_VOID;
+    return JS_TRUE;
+  }
+
+  // Dictionaries, lists and tuples become host objects with the same
+  // callables as their parent, so nested data is exposed lazily too.
+  JSBool result = JS_TRUE;
+  if (PyDict_CheckExact(item) || PyList_CheckExact(item) ||
+      PyTuple_CheckExact(item))
+    result = PYM_getChildHostObject(cx, context, host, obj, id, item, vp);
+  else if (PYM_pyObjectToJsval(context, item, vp) == -1) {
+    PYM_pythonExceptionToJs(context);
+    result = JS_FALSE;
+  }
+
+  Py_DECREF(item);
+  return result;
+}
+
+static JSBool
+PYM_setHostObjectProperty(JSContext *cx, JSObject *obj, jsval id, jsval *vp)
+{
+  PYM_PyAutoEnsureGIL gil;
+  PYM_JSContextObject *context = (PYM_JSContextObject *)
+    JS_GetContextPrivate(cx);
+  PYM_HostObject *host = PYM_getHostObject(cx, obj);
+  if (context == NULL || host == NULL)
+    return JS_TRUE;
+
+  PyObject *key = PYM_idToKey(id);
+  if (key == NULL) {
+    if (!PyErr_Occurred())
+      return JS_TRUE;
+    PYM_pythonExceptionToJs(context);
+    return JS_FALSE;
+  }
+
+  PyObject *value = PYM_jsvalToPyObject(context, *vp);
+  if (value == NULL) {
+    Py_DECREF(key);
+    PYM_pythonExceptionToJs(context);
+    return JS_FALSE;
+  }
+
+  int error;
+  if (host->setter) {
+    PyObject *result = PyObject_CallFunctionObjArgs(host->setter,
+                                                    (PyObject *) context,
+                                                    host->backing, key,
+                                                    value, NULL);
+    error = result ? 0 : -1;
+    Py_XDECREF(result);
+  } else if (PyDict_CheckExact(host->backing))
+    error = PyDict_SetItem(host->backing, key, value);
+  else
+    error = PyObject_SetItem(host->backing, key, value);
+
+  Py_DECREF(key);
+  Py_DECREF(value);
+
+  if (error) {
+    PYM_pythonExceptionToJs(context);
+    return JS_FALSE;
+  }
+
+  return JS_TRUE;
+}
+
+// Deleting a property deletes the item from Python. Deleting an item
+// that's already gone isn't an error, and neither is deleting a
+// non-index property such as the length of a list or tuple.
+static JSBool
+PYM_delHostObjectProperty(JSContext *cx, JSObject *obj, jsval id, jsval *vp)
+{
+  PYM_PyAutoEnsureGIL gil;
+  PYM_JSContextObject *context = (PYM_JSContextObject *)
+    JS_GetContextPrivate(cx);
+  PYM_HostObject *host = PYM_getHostObject(cx, obj);
+  if (context == NULL || host == NULL)
+    return JS_TRUE;
+
+  PyObject *key = PYM_idToKey(id);
+  if (key == NULL) {
+    if (!PyErr_Occurred())
+      return JS_TRUE;
+    PYM_pythonExceptionToJs(context);
+    return JS_FALSE;
+  }
+
+  PyObject *backing = host->backing;
+  int error = 0;
+  if (PyDict_CheckExact(backing))
+    error = PyDict_DelItem(backing, key);
+  else if (!(PyList_CheckExact(backing) || PyTuple_CheckExact(backing)) ||
+           PyInt_Check(key))
+    error = PyObject_DelItem(backing, key);
+  Py_DECREF(key);
+
+  if (error) {
+    if (!PyErr_ExceptionMatches(PyExc_LookupError)) {
+      PYM_pythonExceptionToJs(context);
+      return JS_FALSE;
+    }
+    PyErr_Clear();
+  }
+
+  return JS_TRUE;
+}
+
+static JSBool
+PYM_resolveHostObject(JSContext *cx, JSObject *obj, jsval id, uintN flags,
+                      JSObject **objp)
+{
+  *objp = NULL;
+
+  PYM_PyAutoEnsureGIL gil;
+  PYM_JSContextObject *context = (PYM_JSContextObject *)
+    JS_GetContextPrivate(cx);
+  PYM_HostObject *host = PYM_getHostObject(cx, obj);
+  if (context == NULL || host == NULL)
+    return JS_TRUE;
+
+  PyObject *key = PYM_idToKey(id);
+  if (key == NULL) {
+    if (!PyErr_Occurred())
+      return JS_TRUE;
+    PYM_pythonExceptionToJs(context);
+    return JS_FALSE;
+  }
+
+  // Nothing needs to be fetched from Python if the property is about
+  // to be assigned, since the setter passes the value along.
+  if (!(flags & JSRESOLVE_ASSIGNING)) {
+    PyObject *item;
+    int found = PYM_lookupItem(context, host, key, &item);
+    if (found == -1) {
+      Py_DECREF(key);
+      PYM_pythonExceptionToJs(context);
+      return JS_FALSE;
+    }
+    Py_XDECREF(item);
+    if (found == 0) {
+      Py_DECREF(key);
+      return JS_TRUE;
+    }
+  }
+  Py_DECREF(key);
+
+  if (!PYM_defineIdProperty(cx, obj, id, JSVAL_VOID, PYM_getHostObjectItem,
+                            PYM_setHostObjectProperty,
+                            JSPROP_ENUMERATE | JSPROP_SHARED))
+    return JS_FALSE;
+
+  *objp = obj;
+  return JS_TRUE;
+}
+
+// Returns a new reference to a sequence of the names of all the items
+// of the host object, or NULL if a Python exception was raised.
+static PyObject *
+PYM_getItemNames(PYM_JSContextObject *context, PYM_HostObject *host)
+{
+  PyObject *backing = host->backing;
+
+  if (host->enumerator) {
+    PyObject *names = PyObject_CallFunctionObjArgs(host->enumerator,
+                                                   (PyObject *) context,
+                                                   backing, NULL);
+    if (names == NULL)
+      return NULL;
+    PyObject *sequence = PySequence_Fast(names,
+                                         "Enumerator must return a "
+                                         "sequence.");
+    Py_DECREF(names);
+    return sequence;
+  }
+
+  if (PyDict_CheckExact(backing))
+    return PyDict_Keys(backing);
+
+  Py_ssize_t size = 0;
+  if (PyList_CheckExact(backing) || PyTuple_CheckExact(backing))
+    size = PySequence_Fast_GET_SIZE(backing);
+
+  PyObject *names = PyList_New(size);
+  if (names == NULL)
+    return NULL;
+  for (Py_ssize_t i = 0; i < size; i++) {
+    PyObject *index = PyInt_FromSsize_t(i);
+    if (index == NULL) {
+      Py_DECREF(names);
+      return NULL;
+    }
+    PyList_SET_ITEM(names, i, index);
+  }
+  return names;
+}
+
+// Enumerating a host object resolves all of its items, since that's
+// what defines them as enumerable properties of the JS object.
+static JSBool
+PYM_enumerateHostObject(JSContext *cx, JSObject *obj)
+{
+  PYM_PyAutoEnsureGIL gil;
+  PYM_JSContextObject *context = (PYM_JSContextObject *)
+    JS_GetContextPrivate(cx);
+  PYM_HostObject *host = PYM_getHostObject(cx, obj);
+  if (context == NULL || host == NULL)
+    return JS_TRUE;
+
+  PyObject *names = PYM_getItemNames(context, host);
+  if (names == NULL) {
+    PYM_pythonExceptionToJs(context);
+    return JS_FALSE;
+  }
+
+  for (Py_ssize_t i = 0; i < PySequence_Fast_GET_SIZE(names); i++) {
+    PyObject *name = PySequence_Fast_GET_ITEM(names, i);
+    JSBool found;
+    JSBool result;
+
+    if (PyInt_Check(name)) {
+      long index = PyInt_AS_LONG(name);
+      if (!INT_FITS_IN_JSVAL(index))
+        continue;
+      result = JS_HasElement(cx, obj, index, &found);
+    } else if (PyString_Check(name) || PyUnicode_Check(name)) {
+      jsval nameVal;
+      if (PYM_pyObjectToJsval(context, name, &nameVal) == -1) {
+        Py_DECREF(names);
+        PYM_pythonExceptionToJs(context);
+        return JS_FALSE;
+      }
+      JSString *str = JSVAL_TO_STRING(nameVal);
+      result = JS_HasUCProperty(cx, obj, JS_GetStringChars(str),
+                                JS_GetStringLength(str), &found);
+    } else
+      // Names that can't be property ids are skipped.
+      continue;
+
+    if (!result) {
+      Py_DECREF(names);
+      return JS_FALSE;
+    }
+  }
+
+  Py_DECREF(names);
+  return JS_TRUE;
+}
+
+static void
+PYM_finalizeHostObject(JSContext *cx, JSObject *obj)
+{
+  PYM_PyAutoEnsureGIL gil;
+  PYM_HostObject *host = (PYM_HostObject *) JS_GetPrivate(cx, obj);
+  if (host == NULL)
+    return;
+
+  Py_DECREF(host->backing);
+  Py_XDECREF(host->getter);
+  Py_XDECREF(host->setter);
+  Py_XDECREF(host->enumerator);
+  Py_XDECREF(host->resolver);
+  PyMem_Free(host);
+
+  PYM_JSRuntimeObject *runtime = PYM_getRuntimeObject(cx);
+  if (runtime)
+    runtime->privateHolderCount--;
+}
+
+JSClass PYM_JS_HostObjectClass = {
+  "PydermonkeyHostObject",
+  JSCLASS_HAS_PRIVATE | JSCLASS_NEW_RESOLVE | JSCLASS_HAS_RESERVED_SLOTS(1),
+  JS_PropertyStub, PYM_delHostObjectProperty, JS_PropertyStub,
+  PYM_setHostObjectProperty, PYM_enumerateHostObject,
+  (JSResolveOp) PYM_resolveHostObject, JS_ConvertStub,
+  PYM_finalizeHostObject, JSCLASS_NO_OPTIONAL_MEMBERS
+};
+
+JSObject *
+PYM_newHostObject(PYM_JSContextObject *context, PyObject *backing,
+                  PyObject *getter, PyObject *setter, PyObject *enumerator,
+                  PyObject *resolver)
+{
+  PYM_HostObject *host = PyMem_New(PYM_HostObject, 1);
+  if (host == NULL) {
+    PyErr_NoMemory();
+    return NULL;
+  }
+
+  Py_INCREF(backing);
+  Py_XINCREF(getter);
+  Py_XINCREF(setter);
+  Py_XINCREF(enumerator);
+  Py_XINCREF(resolver);
+  host->backing = backing;
+  host->getter = getter;
+  host->setter = setter;
+  host->enumerator = enumerator;
+  host->resolver = resolver;
+
+  JSObject *obj = JS_NewObject(context->cx, &PYM_JS_HostObjectClass, NULL,
+                               NULL);
+  if (obj == NULL || !JS_SetPrivate(context->cx, obj, host)) {
+    // If the object was created, it has no private data, so its
+    // finalizer won't touch the host data we're freeing here.
+    Py_DECREF(backing);
+    Py_XDECREF(getter);
+    Py_XDECREF(setter);
+    Py_XDECREF(enumerator);
+    Py_XDECREF(resolver);
+    PyMem_Free(host);
+    PyErr_SetString(PYM_error, "Creating host object failed");
+    return NULL;
+  }
+
+  context->runtime->privateHolderCount++;
+  return obj;
+}
@@ -36,9 +36,16 @@
 
 #include "object.h"
 #include "function.h"
+#include "script.h"
 #include "runtime.h"
 #include "utils.h"
 
+static PYM_JSRuntimeObject *
+PYM_getRuntimeObject(JSContext *cx)
+{
+  return (PYM_JSRuntimeObject *) JS_GetRuntimePrivate(JS_GetRuntime(cx));
+}
+
 JSObject *
 PYM_JS_newObject(JSContext *cx, PyObject *pyObject, JSObject *proto,
                  JSObject *parent)
@@ -48,6 +55,10 @@ PYM_JS_newObject(JSContext *cx, PyObject *pyObject, JSObject *proto,
     if (!JS_SetPrivate(cx, obj, pyObject))
       return NULL;
     Py_XINCREF(pyObject);
+
+    PYM_JSRuntimeObject *runtime = PYM_getRuntimeObject(cx);
+    if (runtime)
+      runtime->privateHolderCount++;
   }
   return obj;
 }
@@ -86,6 +97,10 @@ PYM_JS_finalizeObject(JSContext *cx, JSObject *obj)
   // TODO: What if this fails?
   if (PYM_JS_getPrivatePyObject(cx, obj, &pyObject))
     Py_XDECREF(pyObject);
+
+  PYM_JSRuntimeObject *runtime = PYM_getRuntimeObject(cx);
+  if (runtime)
+    runtime->privateHolderCount--;
 }
 
 // This one-size-fits-all JSClass is used for any JS objects created
@@ -100,17 +115,178 @@ JSClass PYM_JS_ObjectClass = {
   JSCLASS_NO_OPTIONAL_MEMBERS
 };
 
+#define PYM_DEFAULT_FREE_LIST_SIZE 128
+
+typedef struct {
+  PyTypeObject *type;
+  const char *name;
+  PyObject *first;
+  unsigned int length;
+  unsigned int maxLength;
+} PYM_FreeList;
+
+// Free lists of deallocated wrappers for each of our wrapper types.
+// Like CPython's own free lists, each object's type pointer is used to
+// link to the next object in the list.
+static PYM_FreeList PYM_freeLists[] = {
+  {&PYM_JSObjectType, "object", NULL, 0, PYM_DEFAULT_FREE_LIST_SIZE},
+  {&PYM_JSFunctionType, "function", NULL, 0, PYM_DEFAULT_FREE_LIST_SIZE},
+  {&PYM_JSScriptType, "script", NULL, 0, PYM_DEFAULT_FREE_LIST_SIZE},
+  {NULL, NULL, NULL, 0, 0}
+};
+
+static PYM_FreeList *
+PYM_getFreeList(PyTypeObject *type)
+{
+  for (PYM_FreeList *list = PYM_freeLists; list->type; list++)
+    if (list->type == type)
+      return list;
+  return NULL;
+}
+
+PyObject *
+PYM_allocWrapper(PyTypeObject *type)
+{
+  PYM_FreeList *list = PYM_getFreeList(type);
+  PyObject *object;
+
+  if (list && list->first) {
+    object = list->first;
+    list->first = (PyObject *) Py_TYPE(object);
+    list->length--;
+    object = PyObject_INIT(object, type);
+  } else {
+    object = _PyObject_New(type);
+    if (object == NULL)
+      return NULL;
+  }
+
+  ((PYM_JSObject *) object)->weakrefs = NULL;
+  return object;
+}
+
+static void
+PYM_freeWrapper(PyObject *object)
+{
+  // Instances of Python subclasses never have a free list.
+  PYM_FreeList *list = PYM_getFreeList(Py_TYPE(object));
+
+  if (list && list->length < list->maxLength) {
+    Py_TYPE(object) = (PyTypeObject *) list->first;
+    list->first = object;
+    list->length++;
+  } else
+    Py_TYPE(object)->tp_free(object);
+}
+
+PyObject *
+PYM_setFreeListSize(PyObject *self, PyObject *args)
+{
+  PyTypeObject *type;
+  unsigned int maxLength;
+
+  if (!PyArg_ParseTuple(args, "O!I", &PyType_Type, &type, &maxLength))
+    return NULL;
+
+  PYM_FreeList *list = PYM_getFreeList(type);
+  if (list == NULL) {
+    PyErr_SetString(PyExc_TypeError,
+                    "Type must be Object, Function or Script.");
+    return NULL;
+  }
+
+  list->maxLength = maxLength;
+  while (list->length > maxLength) {
+    PyObject *object = list->first;
+    list->first = (PyObject *) Py_TYPE(object);
+    list->length--;
+    PyObject_Del(object);
+  }
+
+  Py_RETURN_NONE;
+}
+
+PyObject *
+PYM_getFreeListLengths()
+{
+  PyObject *lengths = PyDict_New();
+  if (lengths == NULL)
+    return NULL;
+
+  for (PYM_FreeList *list = PYM_freeLists; list->type; list++) {
+    PyObject *length = PyInt_FromLong(list->length);
+    if (length == NULL ||
+        PyDict_SetItemString(lengths, list->name, length) == -1) {
+      Py_XDECREF(length);
+      Py_DECREF(lengths);
+      return NULL;
+    }
+    Py_DECREF(length);
+  }
+
+  return lengths;
+}
+
+// Returns the runtime's count of live wrappers of the given wrapper's
+// type.
+static unsigned long *
+PYM_getWrapperCounter(PYM_JSObject *object)
+{
+  if (PyObject_TypeCheck(object, &PYM_JSFunctionType))
+    return &object->runtime->functionCount;
+  if (PyObject_TypeCheck(object, &PYM_JSScriptType))
+    return &object->runtime->scriptCount;
+  return &object->runtime->objectCount;
+}
+
+static void
+PYM_linkTransient(PYM_JSObject *object)
+{
+  PYM_JSRuntimeObject *runtime = object->runtime;
+
+  object->isTransient = 1;
+  object->prevTransient = NULL;
+  object->nextTransient = runtime->transientObjects;
+  if (runtime->transientObjects)
+    runtime->transientObjects->prevTransient = object;
+  runtime->transientObjects = object;
+  runtime->transientCount++;
+}
+
+static void
+PYM_unlinkTransient(PYM_JSObject *object)
+{
+  PYM_JSRuntimeObject *runtime = object->runtime;
+
+  if (object->prevTransient)
+    object->prevTransient->nextTransient = object->nextTransient;
+  else
+    runtime->transientObjects = object->nextTransient;
+  if (object->nextTransient)
+    object->nextTransient->prevTransient = object->prevTransient;
+  object->isTransient = 0;
+  object->prevTransient = NULL;
+  object->nextTransient = NULL;
+  runtime->transientCount--;
+}
+
 static void
 PYM_JSObjectDealloc(PYM_JSObject *self)
 {
-  if (self->obj) {
-    JS_DHashTableOperate(&self->runtime->objects,
-                         (void *) self->obj,
-                         JS_DHASH_REMOVE);
+  if (self->weakrefs)
+    PyObject_ClearWeakRefs((PyObject *) self);
 
-    // JS_RemoveRoot() always returns JS_TRUE, so don't
-    // bother checking its return value.
-    JS_RemoveRootRT(self->runtime->rt, &self->obj);
+  if (self->obj) {
+    // Removing the object from the runtime's table of wrapped objects,
+    // or from its list of transient wrappers, also stops the runtime
+    // from tracing it.
+    if (self->isTransient)
+      PYM_unlinkTransient(self);
+    else
+      JS_DHashTableOperate(&self->runtime->objects,
+                           (void *) self->obj,
+                           JS_DHASH_REMOVE);
+    (*PYM_getWrapperCounter(self))--;
     self->obj = NULL;
   }
 
@@ -119,7 +295,7 @@ PYM_JSObjectDealloc(PYM_JSObject *self)
     self->runtime = NULL;
   }
 
-  self->ob_type->tp_free((PyObject *) self);
+  PYM_freeWrapper((PyObject *) self);
 }
 
 static PyObject *
@@ -164,7 +340,8 @@ PyTypeObject PYM_JSObjectType = {
   0,                           /* tp_traverse */
   0,                           /* tp_clear */
   0,                           /* tp_richcompare */
-  0,                           /* tp_weaklistoffset */
+                               /* tp_weaklistoffset */
+  offsetof(PYM_JSObject, weakrefs),
   0,                           /* tp_iter */
   0,                           /* tp_iternext */
   PYM_JSObjectMethods,         /* tp_methods */
@@ -200,9 +377,13 @@ PYM_JSObject *PYM_newJSObject(PYM_JSContextObject *context,
                               JSObject *obj,
                               PYM_JSObject *subclass)
 {
-  PYM_JSObject *cachedObject = PYM_findJSObject(context, obj);
-  if (cachedObject)
-    return cachedObject;
+  int isTransient = !subclass && !context->preserveIdentity;
+
+  if (!isTransient) {
+    PYM_JSObject *cachedObject = PYM_findJSObject(context, obj);
+    if (cachedObject)
+      return cachedObject;
+  }
 
   PYM_JSObject *object;
 
@@ -216,8 +397,7 @@ PYM_JSObject *PYM_newJSObject(PYM_JSContextObject *context,
         );
       object = (PYM_JSObject *) func;
     } else
-      object = PyObject_New(PYM_JSObject,
-                            &PYM_JSObjectType);
+      object = (PYM_JSObject *) PYM_allocWrapper(&PYM_JSObjectType);
   }
 
   if (object == NULL)
@@ -225,6 +405,18 @@ PYM_JSObject *PYM_newJSObject(PYM_JSContextObject *context,
 
   object->runtime = NULL;
   object->obj = NULL;
+  object->isTransient = 0;
+  object->prevTransient = NULL;
+  object->nextTransient = NULL;
+
+  if (isTransient) {
+    object->runtime = context->runtime;
+    Py_INCREF(object->runtime);
+    object->obj = obj;
+    PYM_linkTransient(object);
+    (*PYM_getWrapperCounter(object))++;
+    return object;
+  }
 
   PYM_HashEntry *cached = (PYM_HashEntry *) JS_DHashTableOperate(
     &context->runtime->objects,
@@ -244,9 +436,43 @@ PYM_JSObject *PYM_newJSObject(PYM_JSContextObject *context,
   object->runtime = context->runtime;
   Py_INCREF(object->runtime);
 
+  // The object is kept alive by the runtime's tracer for as long as
+  // it's in the runtime's table of wrapped objects.
   object->obj = obj;
+  (*PYM_getWrapperCounter(object))++;
+  return object;
+}
+
+PYM_JSObject *PYM_promoteJSObject(PYM_JSContextObject *context,
+                                  PYM_JSObject *object)
+{
+  if (!object->isTransient) {
+    Py_INCREF((PyObject *) object);
+    return object;
+  }
+
+  PYM_JSObject *cachedObject = PYM_findJSObject(context, object->obj);
+  if (cachedObject)
+    return cachedObject;
+
+  PYM_HashEntry *cached = (PYM_HashEntry *) JS_DHashTableOperate(
+    &context->runtime->objects,
+    (void *) object->obj,
+    JS_DHASH_ADD
+    );
+
+  if (cached == NULL) {
+    PyErr_SetString(PYM_error, "JS_DHashTableOperate() failed");
+    return NULL;
+  }
+
+  cached->base.key = (void *) object->obj;
+  cached->value = object;
+
+  // The object is traced through the table from now on, so it no
+  // longer needs to be in the list of transient wrappers.
+  PYM_unlinkTransient(object);
 
-  JS_AddNamedRootRT(object->runtime->rt, &object->obj,
-                    "Pydermonkey-Generated Object");
+  Py_INCREF((PyObject *) object);
   return object;
 }
@@ -54,19 +54,55 @@ PYM_JS_getPrivatePyObject(JSContext *cx, JSObject *obj, PyObject **pyObject);
 
 extern JSClass PYM_JS_ObjectClass;
 
-typedef struct {
+typedef struct PYM_JSObject {
   PyObject_HEAD
   PYM_JSRuntimeObject *runtime;
   JSObject *obj;
+  PyObject *weakrefs;
+  // Transient wrappers aren't in the runtime's table of wrapped
+  // objects, so they don't preserve identity; instead, they're kept
+  // in a doubly-linked list that the runtime traces.
+  char isTransient;
+  struct PYM_JSObject *prevTransient;
+  struct PYM_JSObject *nextTransient;
 } PYM_JSObject;
 
 extern PyTypeObject PYM_JSObjectType;
 
+// Allocates a new, uninitialized wrapper of the given type, which
+// must be PYM_JSObjectType or one of its built-in subtypes. Wrappers
+// of these types are kept on per-type free lists when they're
+// deallocated, and reused here. Returns NULL and sets a Python
+// exception on failure.
+extern PyObject *
+PYM_allocWrapper(PyTypeObject *type);
+
+// Sets the maximum number of deallocated wrappers that are kept for
+// reuse for the given type.
+extern PyObject *
+PYM_setFreeListSize(PyObject *self, PyObject *args);
+
+// Returns a dictionary of the current lengths of the free lists.
+extern PyObject *
+PYM_getFreeListLengths();
+
 extern PYM_JSObject *
 PYM_findJSObject(PYM_JSContextObject *context, JSObject *obj);
 
+// Returns a wrapper for the given JS object. If a subclass is given,
+// it's initialized and registered as the object's wrapper. Otherwise,
+// if the context is preserving identity, the object's registered
+// wrapper is returned, creating it if needed; if it isn't, a new
+// transient wrapper is returned without touching the runtime's table
+// of wrapped objects at all.
 extern PYM_JSObject *
 PYM_newJSObject(PYM_JSContextObject *context, JSObject *obj,
                 PYM_JSObject *subclass);
 
+// Returns the identity-preserving wrapper for the JS object wrapped by
+// the given wrapper, registering the wrapper itself if it's transient
+// and the object has no other wrapper.
+extern PYM_JSObject *
+PYM_promoteJSObject(PYM_JSContextObject *context, PYM_JSObject *object);
+
 #endif
@@ -0,0 +1,272 @@
+/* ***** BEGIN LICENSE BLOCK *****
+ * Version: MPL 1.1/GPL 2.0/LGPL 2.1
+ *
+ * The contents of this file are subject to the Mozilla Public License Version
+ * 1.1 (the "License"); you may not use this file except in compliance with
+ * the License. You may obtain a copy of the License at
+ * http://www.mozilla.org/MPL/
+ *
+ * Software distributed under the License is distributed on an "AS IS" basis,
+ * WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+ * for the specific language governing rights and limitations under the
+ * License.
+ *
+ * The Original Code is Pydermonkey.
+ *
+ * The Initial Developer of the Original Code is Mozilla.
+ * Portions created by the Initial Developer are Copyright (C) 2007
+ * the Initial Developer. All Rights Reserved.
+ *
+ * Contributor(s):
+ *   Atul Varma <atul@mozilla.com>
+ *
+ * Alternatively, the contents of this file may be used under the terms of
+ * either the GNU General Public License Version 2 or later (the "GPL"), or
+ * the GNU Lesser General Public License Version 2.1 or later (the "LGPL"),
+ * in which case the provisions of the GPL or the LGPL are applicable instead
+ * of those above. If you wish to allow use of your version of this file only
+ * under the terms of either the GPL or the LGPL, and not to allow others to
+ * use your version of this file under the terms of the MPL, indicate your
+ * decision by deleting the provisions above and replace them with the notice
+ * and other provisions required by the GPL or the LGPL. If you do not delete
+ * the provisions above, a recipient may use your version of this file under
+ * the terms of any one of the MPL, the GPL or the LGPL.
+ *
+ * ***** END LICENSE BLOCK ***** */
+
+#include "profiler.h"
+#include "utils.h"
+
+#include "jsdbgapi.h"
+
+// This is the body of the profiler's timer thread. Note that it never
+// touches the Python interpreter, so it doesn't need the GIL.
+static void
+PYM_profilerThread(void *arg)
+{
+  PYM_Profiler *profiler = (PYM_Profiler *) arg;
+
+  while (profiler->running) {
+    PYM_sleepMilliseconds(profiler->interval);
+    if (profiler->running) {
+      profiler->triggered = 1;
+      JS_TriggerOperationCallback(profiler->cx);
+    }
+  }
+
+  PyThread_release_lock(profiler->threadDone);
+}
+
+static void
+PYM_destroyProfiler(PYM_Profiler *profiler)
+{
+  if (profiler->threadDone)
+    PyThread_free_lock(profiler->threadDone);
+  PyMem_Free(profiler->frames);
+  PyMem_Free(profiler->ring);
+  PyMem_Free(profiler);
+}
+
+PYM_Profiler *
+PYM_startProfiler(PYM_JSContextObject *context, unsigned int interval,
+                  unsigned int maxDepth)
+{
+  PYM_Profiler *profiler = (PYM_Profiler *) PyMem_Malloc(
+    sizeof(PYM_Profiler)
+    );
+  if (profiler == NULL) {
+    PyErr_NoMemory();
+    return NULL;
+  }
+
+  profiler->cx = context->cx;
+  profiler->interval = interval;
+  profiler->maxDepth = maxDepth;
+  profiler->running = 1;
+  profiler->triggered = 0;
+  profiler->samples = 0;
+  profiler->frames = (JSStackFrame **) PyMem_Malloc(
+    sizeof(JSStackFrame *) * maxDepth
+    );
+  profiler->ring = (char *) PyMem_Malloc(PYM_PROFILER_RING_SIZE);
+  profiler->ringStart = 0;
+  profiler->ringUsed = 0;
+  profiler->threadDone = PyThread_allocate_lock();
+
+  if (profiler->frames == NULL || profiler->ring == NULL ||
+      profiler->threadDone == NULL) {
+    PYM_destroyProfiler(profiler);
+    PyErr_NoMemory();
+    return NULL;
+  }
+
+  // The lock is held for as long as the timer thread is running.
+  PyThread_acquire_lock(profiler->threadDone, 1);
+
+  if (PyThread_start_new_thread(PYM_profilerThread, profiler) == -1) {
+    PyThread_release_lock(profiler->threadDone);
+    PYM_destroyProfiler(profiler);
+    PyErr_SetString(PYM_error, "Couldn't start profiler thread");
+    return NULL;
+  }
+
+  return profiler;
+}
+
+// Adds each collapsed stack in the profiler's ring buffer, oldest
+// first, to the given dictionary of sample counts.
+static int
+PYM_aggregateSamples(PYM_Profiler *profiler, PyObject *stacks)
+{
+  size_t pos = profiler->ringStart;
+  size_t remaining = profiler->ringUsed;
+
+  while (remaining > 0) {
+    size_t length = 0;
+    while (profiler->ring[pos] != '\0') {
+      profiler->buffer[length++] = profiler->ring[pos];
+      pos = (pos + 1) % PYM_PROFILER_RING_SIZE;
+    }
+    pos = (pos + 1) % PYM_PROFILER_RING_SIZE;
+    remaining -= length + 1;
+
+    PyObject *key = PyString_FromStringAndSize(profiler->buffer, length);
+    if (key == NULL)
+      return -1;
+
+    PyObject *count = PyDict_GetItem(stacks, key);
+    count = PyInt_FromLong(count ? PyInt_AS_LONG(count) + 1 : 1);
+    if (count == NULL || PyDict_SetItem(stacks, key, count) == -1) {
+      Py_XDECREF(count);
+      Py_DECREF(key);
+      return -1;
+    }
+    Py_DECREF(count);
+    Py_DECREF(key);
+  }
+
+  return 0;
+}
+
+PyObject *
+PYM_stopProfiler(PYM_Profiler *profiler)
+{
+  profiler->running = 0;
+
+  Py_BEGIN_ALLOW_THREADS;
+  PyThread_acquire_lock(profiler->threadDone, 1);
+  Py_END_ALLOW_THREADS;
+  PyThread_release_lock(profiler->threadDone);
+
+  PyObject *stacks = PyDict_New();
+  if (stacks && PYM_aggregateSamples(profiler, stacks) == -1) {
+    Py_DECREF(stacks);
+    stacks = NULL;
+  }
+
+  PYM_destroyProfiler(profiler);
+  return stacks;
+}
+
+// Appends the given string to the profiler's buffer at the given
+// position, truncating it if necessary, and returns the new position.
+static size_t
+PYM_appendToBuffer(PYM_Profiler *profiler, size_t pos, const char *str)
+{
+  while (*str && pos < PYM_PROFILER_BUFFER_SIZE - 1) {
+    // Semicolons separate frames in collapsed stacks.
+    profiler->buffer[pos++] = (*str == ';') ? ':' : *str;
+    str++;
+  }
+  return pos;
+}
+
+// Writes the first `length` bytes of the profiler's buffer to its ring
+// buffer as a NUL-terminated string, overwriting the oldest samples if
+// there isn't enough room.
+static void
+PYM_writeSample(PYM_Profiler *profiler, size_t length)
+{
+  char *ring = profiler->ring;
+  size_t end;
+
+  while (PYM_PROFILER_RING_SIZE - profiler->ringUsed < length + 1) {
+    while (ring[profiler->ringStart] != '\0') {
+      profiler->ringStart = (profiler->ringStart + 1) %
+                            PYM_PROFILER_RING_SIZE;
+      profiler->ringUsed--;
+    }
+    profiler->ringStart = (profiler->ringStart + 1) % PYM_PROFILER_RING_SIZE;
+    profiler->ringUsed--;
+  }
+
+  end = (profiler->ringStart + profiler->ringUsed) % PYM_PROFILER_RING_SIZE;
+  for (size_t i = 0; i < length; i++) {
+    ring[end] = profiler->buffer[i];
+    end = (end + 1) % PYM_PROFILER_RING_SIZE;
+  }
+  ring[end] = '\0';
+  profiler->ringUsed += length + 1;
+}
+
+void
+PYM_sampleProfiler(PYM_Profiler *profiler)
+{
+  if (!profiler->triggered)
+    return;
+  profiler->triggered = 0;
+
+  JSContext *cx = profiler->cx;
+  JSStackFrame *iteratorp = NULL;
+  JSStackFrame *frame;
+  unsigned int depth = 0;
+  bool truncated = false;
+
+  while ((frame = JS_FrameIterator(cx, &iteratorp)) != NULL) {
+    if (depth == profiler->maxDepth) {
+      truncated = true;
+      break;
+    }
+    profiler->frames[depth++] = frame;
+  }
+
+  if (depth == 0)
+    return;
+
+  profiler->samples++;
+
+  size_t pos = 0;
+  if (truncated)
+    pos = PYM_appendToBuffer(profiler, pos, "[truncated];");
+
+  // JS_FrameIterator() starts at the innermost frame, but collapsed
+  // stacks start at the outermost one.
+  while (depth-- > 0) {
+    frame = profiler->frames[depth];
+    JSScript *script = JS_GetFrameScript(cx, frame);
+    JSFunction *fun = JS_GetFrameFunction(cx, frame);
+    const char *name = "(top level)";
+    char lineno[16];
+
+    if (fun) {
+      JSString *id = JS_GetFunctionId(fun);
+      name = id ? JS_GetStringBytes(id) : "(anonymous)";
+    }
+
+    pos = PYM_appendToBuffer(profiler, pos, name);
+    pos = PYM_appendToBuffer(profiler, pos, " (");
+    if (script) {
+      const char *filename = JS_GetScriptFilename(cx, script);
+      PyOS_snprintf(lineno, sizeof(lineno), ":%u",
+                    JS_PCToLineNumber(cx, script,
+                                      JS_GetFramePC(cx, frame)));
+      pos = PYM_appendToBuffer(profiler, pos,
+                               filename ? filename : "<unknown>");
+      pos = PYM_appendToBuffer(profiler, pos, lineno);
+    } else
+      pos = PYM_appendToBuffer(profiler, pos, "native");
+    pos = PYM_appendToBuffer(profiler, pos, depth ? ");" : ")");
+  }
+
+  PYM_writeSample(profiler, pos);
+}
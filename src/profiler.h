@@ -0,0 +1,94 @@
+/* ***** BEGIN LICENSE BLOCK *****
+ * Version: MPL 1.1/GPL 2.0/LGPL 2.1
+ *
+ * The contents of this file are subject to the Mozilla Public License Version
+ * 1.1 (the "License"); you may not use this file except in compliance with
+ * the License. You may obtain a copy of the License at
+ * http://www.mozilla.org/MPL/
+ *
+ * Software distributed under the License is distributed on an "AS IS" basis,
+ * WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+ * for the specific language governing rights and limitations under the
+ * License.
+ *
+ * The Original Code is Pydermonkey.
+ *
+ * The Initial Developer of the Original Code is Mozilla.
+ * Portions created by the Initial Developer are Copyright (C) 2007
+ * the Initial Developer. All Rights Reserved.
+ *
+ * Contributor(s):
+ *   Atul Varma <atul@mozilla.com>
+ *
+ * Alternatively, the contents of this file may be used under the terms of
+ * either the GNU General Public License Version 2 or later (the "GPL"), or
+ * the GNU Lesser General Public License Version 2.1 or later (the "LGPL"),
+ * in which case the provisions of the GPL or the LGPL are applicable instead
+ * of those above. If you wish to allow use of your version of this file only
+ * under the terms of either the GPL or the LGPL, and not to allow others to
+ * use your version of this file under the terms of the MPL, indicate your
+ * decision by deleting the provisions above and replace them with the notice
+ * and other provisions required by the GPL or the LGPL. If you do not delete
+ * the provisions above, a recipient may use your version of this file under
+ * the terms of any one of the MPL, the GPL or the LGPL.
+ *
+ * ***** END LICENSE BLOCK ***** */
+
+#ifndef PYM_PROFILER_H
+#define PYM_PROFILER_H
+
+#include "context.h"
+
+#include <jsapi.h>
+#include <Python.h>
+#include <pythread.h>
+
+// Maximum length of a single collapsed stack, in bytes.
+#define PYM_PROFILER_BUFFER_SIZE 8192
+
+// Size of the ring buffer that sampled stacks are written to, in
+// bytes. Once it's full, the oldest samples are overwritten.
+#define PYM_PROFILER_RING_SIZE (1 << 20)
+
+// A sampling profiler attached to a single context. A background
+// thread periodically triggers the context's operation callback, which
+// records the current JS stack in a ring buffer of NUL-terminated
+// collapsed stacks. The samples are only aggregated into Python
+// objects when the profiler is stopped.
+typedef struct PYM_Profiler {
+  JSContext *cx;
+  unsigned int interval;
+  unsigned int maxDepth;
+  volatile int running;
+  // Set by the timer thread just before it triggers the operation
+  // callback, so that triggers made by anyone else aren't sampled.
+  volatile int triggered;
+  PyThread_type_lock threadDone;
+  JSStackFrame **frames;
+  char buffer[PYM_PROFILER_BUFFER_SIZE];
+  char *ring;
+  size_t ringStart;
+  size_t ringUsed;
+  unsigned long samples;
+} PYM_Profiler;
+
+// Creates a profiler for the given context and starts its timer
+// thread. Returns NULL and sets a Python exception on failure.
+extern PYM_Profiler *
+PYM_startProfiler(PYM_JSContextObject *context, unsigned int interval,
+                  unsigned int maxDepth);
+
+// Stops and destroys the given profiler, returning a new reference to
+// a dictionary that maps collapsed stacks to sample counts. Returns
+// NULL and sets a Python exception if the dictionary can't be built.
+extern PyObject *
+PYM_stopProfiler(PYM_Profiler *profiler);
+
+// Records the current stack of the profiler's context, if the
+// profiler's own timer thread triggered the operation callback. Must
+// be called from the context's operation callback; it never touches
+// the Python interpreter.
+extern void
+PYM_sampleProfiler(PYM_Profiler *profiler);
+
+#endif
@@ -40,13 +40,27 @@
 #include "object.h"
 #include "function.h"
 #include "script.h"
+#include "scripterror.h"
+#include "stackframe.h"
 #include "utils.h"
 
 static PyObject *
 PYM_getDebugInfo(PyObject *self, PyObject *args)
 {
-  PyObject *info = Py_BuildValue("{sI}",
-                                 "runtime_count", PYM_getJSRuntimeCount());
+  PyObject *runtimes = PYM_getJSRuntimesDebugInfo();
+  if (runtimes == NULL)
+    return NULL;
+
+  PyObject *freeLists = PYM_getFreeListLengths();
+  if (freeLists == NULL) {
+    Py_DECREF(runtimes);
+    return NULL;
+  }
+
+  PyObject *info = Py_BuildValue("{sIsNsN}",
+                                 "runtime_count", PYM_getJSRuntimeCount(),
+                                 "runtimes", runtimes,
+                                 "free_list_lengths", freeLists);
   return info;
 }
 
@@ -55,6 +69,8 @@ static PyMethodDef PYM_methods[] = {
    "Get debugging information about the module."},
   {"set_default_gc_zeal", PYM_setDefaultGCZeal, METH_VARARGS,
    "Sets the default frequency of garbage collection for new contexts."},
+  {"set_free_list_size", PYM_setFreeListSize, METH_VARARGS,
+   "Sets the number of deallocated wrappers kept for reuse for a type."},
   {NULL, NULL, 0, NULL}
 };
 
@@ -81,11 +97,26 @@ initpydermonkey(void)
   Py_INCREF(PYM_error);
   PyModule_AddObject(module, "InterpreterError", PYM_error);
 
-  PYM_scriptError = PyErr_NewException("pydermonkey.ScriptError",
-                                       PyExc_StandardError, NULL);
+  PYM_ScriptErrorType.tp_base = (PyTypeObject *) PyExc_StandardError;
+  if (PyType_Ready(&PYM_ScriptErrorType) < 0)
+    return;
+
+  PYM_scriptError = (PyObject *) &PYM_ScriptErrorType;
   Py_INCREF(PYM_scriptError);
   PyModule_AddObject(module, "ScriptError", PYM_scriptError);
 
+  PYM_budgetExceededError = PyErr_NewException(
+    "pydermonkey.BudgetExceededError",
+    PYM_error, NULL
+    );
+  Py_INCREF(PYM_budgetExceededError);
+  PyModule_AddObject(module, "BudgetExceededError", PYM_budgetExceededError);
+
+  PYM_memoryLimitError = PyErr_NewException("pydermonkey.MemoryLimitError",
+                                            PYM_error, NULL);
+  Py_INCREF(PYM_memoryLimitError);
+  PyModule_AddObject(module, "MemoryLimitError", PYM_memoryLimitError);
+
   if (!PyType_Ready(&PYM_JSRuntimeType) < 0)
     return;
 
@@ -98,6 +129,12 @@ initpydermonkey(void)
   Py_INCREF(&PYM_JSContextType);
   PyModule_AddObject(module, "Context", (PyObject *) &PYM_JSContextType);
 
+  if (PyType_Ready(&PYM_StackFrameType) < 0)
+    return;
+
+  Py_INCREF(&PYM_StackFrameType);
+  PyModule_AddObject(module, "StackFrame", (PyObject *) &PYM_StackFrameType);
+
   if (!PyType_Ready(&PYM_JSObjectType) < 0)
     return;
 
@@ -36,15 +36,224 @@
 
 #include "runtime.h"
 #include "context.h"
+#include "object.h"
 #include "utils.h"
+#include "tracer.h"
 
 static unsigned int runtimeCount = 0;
 
+// Linked list of all live runtimes.
+static PYM_JSRuntimeObject *firstRuntime = NULL;
+
 unsigned int PYM_getJSRuntimeCount()
 {
   return runtimeCount;
 }
 
+PyObject *
+PYM_getJSRuntimesDebugInfo()
+{
+  PyObject *list = PyList_New(0);
+  if (list == NULL)
+    return NULL;
+
+  for (PYM_JSRuntimeObject *runtime = firstRuntime;
+       runtime != NULL;
+       runtime = runtime->nextRuntime) {
+    uint32 capacity = JS_DHASH_TABLE_SIZE(&runtime->objects);
+    PyObject *info = Py_BuildValue(
+      "{sOsIsksksksIsIsIsdsksk}",
+      "runtime", (PyObject *) runtime,
+      "context_count", runtime->contextCount,
+      "object_count", runtime->objectCount,
+      "function_count", runtime->functionCount,
+      "script_count", runtime->scriptCount,
+      "table_entries", runtime->objects.entryCount,
+      "table_removed", runtime->objects.removedCount,
+      "table_capacity", capacity,
+      "table_load", (double) runtime->objects.entryCount / capacity,
+      "transient_count", runtime->transientCount,
+      "private_holder_count", runtime->privateHolderCount
+      );
+    if (info == NULL || PyList_Append(list, info)) {
+      Py_XDECREF(info);
+      Py_DECREF(list);
+      return NULL;
+    }
+    Py_DECREF(info);
+  }
+
+  return list;
+}
+
+static uint32
+PYM_updatePeakBytes(PYM_JSRuntimeObject *runtime)
+{
+  uint32 bytes = JS_GetGCParameter(runtime->rt, JSGC_BYTES);
+  if (bytes > runtime->peakBytes)
+    runtime->peakBytes = bytes;
+  return bytes;
+}
+
+void
+PYM_enforceMemoryLimits(PYM_JSRuntimeObject *runtime, JSContext *cx)
+{
+  uint32 bytes = PYM_updatePeakBytes(runtime);
+
+  // Don't bother collecting again if nothing's been allocated since
+  // the last time the soft limit made us collect.
+  if (runtime->softMemoryLimit &&
+      bytes >= runtime->softMemoryLimit &&
+      bytes != runtime->bytesAfterSoftLimitGC) {
+    JS_GC(cx);
+    runtime->softLimitGCs++;
+    runtime->bytesAfterSoftLimitGC = JS_GetGCParameter(runtime->rt,
+                                                       JSGC_BYTES);
+  }
+}
+
+// SpiderMonkey allocates GC things an arena at a time, so an
+// allocation can fail while the GC heap is still this far below its
+// maximum size.
+#define PYM_GC_ARENA_SIZE 4096
+
+JSBool
+PYM_hitHardMemoryLimit(PYM_JSRuntimeObject *runtime)
+{
+  uint32 bytes = PYM_updatePeakBytes(runtime);
+  return bytes + PYM_GC_ARENA_SIZE >= runtime->hardMemoryLimit;
+}
+
+// Calls the runtime's Python GC callback. Since there's nobody to
+// propagate an exception to, any exception raised by the callback is
+// written to stderr, and any exception that was already pending is
+// preserved.
+void
+PYM_deliverGCEvents(PYM_JSRuntimeObject *runtime)
+{
+  // The callback may itself cause more collections, which are
+  // delivered by this same loop.
+  while (runtime->gcPendingCount) {
+    PYM_GCEvent event = runtime->gcPendingEvents[runtime->gcPendingStart];
+    runtime->gcPendingStart = ((runtime->gcPendingStart + 1) %
+                               PYM_MAX_PENDING_GC_EVENTS);
+    runtime->gcPendingCount--;
+
+    PyObject *callable = runtime->gcCallback;
+    if (callable == NULL)
+      break;
+
+    PyObject *type;
+    PyObject *value;
+    PyObject *traceback;
+    PyErr_Fetch(&type, &value, &traceback);
+
+    // Start times are taken from a monotonic clock, which is cheaper
+    // and steadier, so they're converted to the epoch here.
+    double startTime = (PYM_getEpochTime() -
+                        (PYM_getWallTime() - event.startTime));
+    Py_INCREF(callable);
+    PyObject *result = PyObject_CallFunction(
+      callable, "O{sdsdsIsI}", (PyObject *) runtime,
+      "time", startTime,
+      "pause", event.pause,
+      "bytes_before", event.bytesBefore,
+      "bytes_after", event.bytesAfter
+      );
+    if (result == NULL)
+      PyErr_WriteUnraisable(callable);
+    else
+      Py_DECREF(result);
+    Py_DECREF(callable);
+
+    PyErr_Restore(type, value, traceback);
+  }
+}
+
+static JSDHashOperator
+PYM_traceWrappedObject(JSDHashTable *table, JSDHashEntryHdr *hdr,
+                       uint32 number, void *arg)
+{
+  PYM_HashEntry *entry = (PYM_HashEntry *) hdr;
+  JS_CALL_OBJECT_TRACER((JSTracer *) arg, (JSObject *) entry->base.key,
+                        "Pydermonkey-Generated Object");
+  return JS_DHASH_NEXT;
+}
+
+// This traces every JS object that has a Python wrapper, keeping them
+// all alive with a single extra root rather than one root per wrapper.
+static void
+PYM_traceWrappedObjects(JSTracer *trc, void *data)
+{
+  PYM_JSRuntimeObject *runtime = (PYM_JSRuntimeObject *) data;
+
+  JS_DHashTableEnumerate(&runtime->objects, PYM_traceWrappedObject, trc);
+
+  for (PYM_JSObject *object = runtime->transientObjects;
+       object != NULL;
+       object = object->nextTransient)
+    JS_CALL_OBJECT_TRACER(trc, object->obj,
+                          "Pydermonkey-Generated Transient Object");
+
+  if (runtime->prelude)
+    JS_CALL_OBJECT_TRACER(trc, runtime->prelude, "Pydermonkey Prelude");
+}
+
+// This is the GC callback for pydermonkey-owned JS runtimes. It keeps
+// track of GC statistics; since the JS heap is at its largest right
+// before a collection, this is also where we track its peak size.
+static JSBool
+PYM_gcCallback(JSContext *cx, JSGCStatus status)
+{
+  PYM_JSRuntimeObject *runtime = (PYM_JSRuntimeObject *)
+    JS_GetRuntimePrivate(JS_GetRuntime(cx));
+
+  if (runtime == NULL)
+    return JS_TRUE;
+
+  switch (status) {
+  case JSGC_BEGIN:
+    runtime->gcBytesBefore = PYM_updatePeakBytes(runtime);
+    runtime->gcStartTime = PYM_getWallTime();
+    break;
+  case JSGC_END:
+    {
+      double pause = PYM_getWallTime() - runtime->gcStartTime;
+      runtime->gcCount++;
+      runtime->gcBytesAfter = JS_GetGCParameter(runtime->rt, JSGC_BYTES);
+      runtime->gcLastPause = pause;
+      runtime->gcTotalPause += pause;
+      if (pause > runtime->gcMaxPause)
+        runtime->gcMaxPause = pause;
+      if (runtime->tracer)
+        PYM_recordTraceEvent(runtime->tracer, "gc", "gc", NULL,
+                             runtime->gcStartTime, pause);
+      // Python can't be called from inside the collector, so the
+      // callback is only told about the collection later on.
+      if (runtime->gcCallback) {
+        if (runtime->gcPendingCount == PYM_MAX_PENDING_GC_EVENTS) {
+          runtime->gcPendingStart = ((runtime->gcPendingStart + 1) %
+                                     PYM_MAX_PENDING_GC_EVENTS);
+          runtime->gcPendingCount--;
+        }
+        PYM_GCEvent *event = &runtime->gcPendingEvents[
+          (runtime->gcPendingStart + runtime->gcPendingCount++) %
+          PYM_MAX_PENDING_GC_EVENTS
+          ];
+        event->startTime = runtime->gcStartTime;
+        event->pause = pause;
+        event->bytesBefore = runtime->gcBytesBefore;
+        event->bytesAfter = runtime->gcBytesAfter;
+      }
+    }
+    break;
+  default:
+    break;
+  }
+
+  return JS_TRUE;
+}
+
 static PyObject *
 PYM_JSRuntimeNew(PyTypeObject *type, PyObject *args,
                  PyObject *kwds)
@@ -58,6 +267,34 @@ PYM_JSRuntimeNew(PyTypeObject *type, PyObject *args,
     self->rt = NULL;
     self->cx = NULL;
     self->objects.ops = NULL;
+    self->softMemoryLimit = 0;
+    self->hardMemoryLimit = PYM_DEFAULT_MAX_BYTES;
+    self->peakBytes = 0;
+    self->bytesAfterSoftLimitGC = 0;
+    self->softLimitGCs = 0;
+    self->gcCount = 0;
+    self->gcBytesBefore = 0;
+    self->gcBytesAfter = 0;
+    self->gcStartTime = 0.0;
+    self->gcLastPause = 0.0;
+    self->gcMaxPause = 0.0;
+    self->gcTotalPause = 0.0;
+    self->gcCallback = NULL;
+    self->gcPendingStart = 0;
+    self->gcPendingCount = 0;
+    self->contextCount = 0;
+    self->objectCount = 0;
+    self->functionCount = 0;
+    self->scriptCount = 0;
+    self->transientCount = 0;
+    self->transientObjects = NULL;
+    self->privateHolderCount = 0;
+    memset(&self->stats, 0, sizeof(self->stats));
+    self->tracer = NULL;
+    self->prelude = NULL;
+    self->firstContext = NULL;
+    self->prevRuntime = NULL;
+    self->nextRuntime = NULL;
 
     if (!JS_DHashTableInit(&self->objects,
                            JS_DHashGetStubOps(),
@@ -70,12 +307,16 @@ PYM_JSRuntimeNew(PyTypeObject *type, PyObject *args,
     }
 
     if (self != NULL) {
-      self->rt = JS_NewRuntime(8L * 1024L * 1024L);
+      self->rt = JS_NewRuntime(PYM_DEFAULT_MAX_BYTES);
       if (!self->rt) {
         PyErr_SetString(PYM_error, "JS_NewRuntime() failed");
         type->tp_dealloc((PyObject *) self);
         self = NULL;
       } else {
+        JS_SetRuntimePrivate(self->rt, self);
+        JS_SetGCCallbackRT(self->rt, PYM_gcCallback);
+        JS_SetExtraGCRoots(self->rt, PYM_traceWrappedObjects, self);
+        JS_SetDestroyScriptHook(self->rt, PYM_destroyScriptHook, NULL);
         self->cx = JS_NewContext(self->rt, 8192);
         if (!self->cx) {
           PyErr_SetString(PYM_error, "JS_NewContext() failed");
@@ -86,17 +327,44 @@ PYM_JSRuntimeNew(PyTypeObject *type, PyObject *args,
     }
   }
 
-  if (self)
+  if (self) {
     runtimeCount++;
+    self->nextRuntime = firstRuntime;
+    if (firstRuntime)
+      firstRuntime->prevRuntime = self;
+    firstRuntime = self;
+  }
 
   return (PyObject *) self;
 }
 
+static int
+PYM_traverse(PYM_JSRuntimeObject *self, visitproc visit, void *arg)
+{
+  Py_VISIT(self->gcCallback);
+  return 0;
+}
+
+static int
+PYM_clear(PYM_JSRuntimeObject *self)
+{
+  Py_CLEAR(self->gcCallback);
+  return 0;
+}
+
 static void
 PYM_JSRuntimeDealloc(PYM_JSRuntimeObject *self)
 {
   if (self->weakrefs)
     PyObject_ClearWeakRefs((PyObject *) self);
+  PyObject_GC_UnTrack(self);
+
+  // Destroying our JS context below triggers a final GC, and we don't
+  // want to pass a dying runtime to Python code.
+  PYM_clear(self);
+
+  if (self->rt)
+    JS_SetExtraGCRoots(self->rt, NULL, NULL);
 
   if (self->objects.ops) {
     JS_DHashTableFinish(&self->objects);
@@ -111,13 +379,29 @@ PYM_JSRuntimeDealloc(PYM_JSRuntimeObject *self)
   }
 
   if (self->rt) {
+    JS_SetRuntimePrivate(self->rt, NULL);
     JS_DestroyRuntime(self->rt);
     self->rt = NULL;
   }
 
-  self->ob_type->tp_free((PyObject *) self);
+  if (self->tracer) {
+    PYM_freeTracer(self->tracer);
+    self->tracer = NULL;
+  }
+
+  // Runtimes that failed to initialize never made it into the list
+  // or the count.
+  if (self->prevRuntime || firstRuntime == self) {
+    if (self->prevRuntime)
+      self->prevRuntime->nextRuntime = self->nextRuntime;
+    else
+      firstRuntime = self->nextRuntime;
+    if (self->nextRuntime)
+      self->nextRuntime->prevRuntime = self->prevRuntime;
+    runtimeCount--;
+  }
 
-  runtimeCount--;
+  self->ob_type->tp_free((PyObject *) self);
 }
 
 static PyObject *
@@ -142,9 +426,474 @@ PYM_newContext(PYM_JSRuntimeObject *self, PyObject *args)
   return retval;
 }
 
+static PyObject *
+PYM_getMemoryUsage(PYM_JSRuntimeObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self);
+  uint32 bytes = PYM_updatePeakBytes(self);
+
+  return Py_BuildValue("{sIsIsIsIsk}",
+                       "bytes", bytes,
+                       "peak_bytes", self->peakBytes,
+                       "soft_limit", self->softMemoryLimit,
+                       "hard_limit", self->hardMemoryLimit,
+                       "soft_limit_gcs", self->softLimitGCs);
+}
+
+static PyObject *
+PYM_setMemoryLimits(PYM_JSRuntimeObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self);
+  unsigned int softLimit;
+  unsigned int hardLimit = 0;
+
+  if (!PyArg_ParseTuple(args, "I|I", &softLimit, &hardLimit))
+    return NULL;
+
+  if (hardLimit == 0)
+    hardLimit = PYM_DEFAULT_MAX_BYTES;
+
+  if (softLimit > hardLimit) {
+    PyErr_SetString(PyExc_ValueError,
+                    "Soft limit must not exceed hard limit.");
+    return NULL;
+  }
+
+  self->softMemoryLimit = softLimit;
+  self->hardMemoryLimit = hardLimit;
+  self->bytesAfterSoftLimitGC = 0;
+  JS_SetGCParameter(self->rt, JSGC_MAX_BYTES, hardLimit);
+
+  Py_RETURN_NONE;
+}
+
+static PyObject *
+PYM_getGCStats(PYM_JSRuntimeObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self);
+
+  return Py_BuildValue("{sksIsIsdsdsd}",
+                       "count", self->gcCount,
+                       "bytes_before", self->gcBytesBefore,
+                       "bytes_after", self->gcBytesAfter,
+                       "last_pause", self->gcLastPause,
+                       "max_pause", self->gcMaxPause,
+                       "total_pause", self->gcTotalPause);
+}
+
+static PyObject *
+PYM_setGCParameter(PYM_JSRuntimeObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self);
+  const char *name;
+  unsigned int value;
+
+  if (!PyArg_ParseTuple(args, "sI", &name, &value))
+    return NULL;
+
+  JSGCParamKey key;
+
+  // The heap size limit isn't settable here, since it's managed by
+  // set_memory_limits().
+  if (strcmp(name, "max_malloc_bytes") == 0)
+    key = JSGC_MAX_MALLOC_BYTES;
+  else if (strcmp(name, "stackpool_lifespan") == 0)
+    key = JSGC_STACKPOOL_LIFESPAN;
+  else if (strcmp(name, "trigger_factor") == 0) {
+    if (value < 100) {
+      PyErr_SetString(PyExc_ValueError,
+                      "Trigger factor must be at least 100.");
+      return NULL;
+    }
+    key = JSGC_TRIGGER_FACTOR;
+  } else {
+    PyErr_Format(PyExc_ValueError, "Unknown GC parameter '%s'.", name);
+    return NULL;
+  }
+
+  JS_SetGCParameter(self->rt, key, value);
+  Py_RETURN_NONE;
+}
+
+static PyObject *
+PYM_setGCCallback(PYM_JSRuntimeObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self);
+  PyObject *callable;
+
+  if (!PyArg_ParseTuple(args, "O", &callable))
+    return NULL;
+
+  if (callable == Py_None)
+    callable = NULL;
+  else if (!PyCallable_Check(callable)) {
+    PyErr_SetString(PyExc_TypeError, "Callable must be callable");
+    return NULL;
+  }
+
+  Py_XINCREF(callable);
+  Py_XDECREF(self->gcCallback);
+  self->gcCallback = callable;
+  self->gcPendingCount = 0;
+
+  Py_RETURN_NONE;
+}
+
+static const char *PYM_valueTypeNames[PYM_VALUE_TYPE_COUNT] = {
+  "int", "double", "boolean", "null", "undefined", "string", "object"
+};
+
+static const char *PYM_apiNames[PYM_API_COUNT] = {
+  "compile_script", "compile_function", "execute_script",
+  "evaluate_script", "call_function"
+};
+
+static PyObject *
+PYM_valueCountsToDict(unsigned long *counts)
+{
+  PyObject *dict = PyDict_New();
+  if (dict == NULL)
+    return NULL;
+
+  for (int i = 0; i < PYM_VALUE_TYPE_COUNT; i++) {
+    PyObject *count = Py_BuildValue("k", counts[i]);
+    if (count == NULL ||
+        PyDict_SetItemString(dict, PYM_valueTypeNames[i], count) == -1) {
+      Py_XDECREF(count);
+      Py_DECREF(dict);
+      return NULL;
+    }
+    Py_DECREF(count);
+  }
+
+  return dict;
+}
+
+static PyObject *
+PYM_apiStatsToDict(PYM_APIStats *api)
+{
+  PyObject *dict = PyDict_New();
+  if (dict == NULL)
+    return NULL;
+
+  for (int i = 0; i < PYM_API_COUNT; i++) {
+    PyObject *entry = Py_BuildValue("{sksd}",
+                                    "calls", api[i].calls,
+                                    "time", api[i].time);
+    if (entry == NULL ||
+        PyDict_SetItemString(dict, PYM_apiNames[i], entry) == -1) {
+      Py_XDECREF(entry);
+      Py_DECREF(dict);
+      return NULL;
+    }
+    Py_DECREF(entry);
+  }
+
+  return dict;
+}
+
+static PyObject *
+PYM_getStats(PYM_JSRuntimeObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self);
+  PYM_RuntimeStats *stats = &self->stats;
+
+  PyObject *valuesToPython = PYM_valueCountsToDict(stats->valuesToPython);
+  PyObject *valuesToJs = PYM_valueCountsToDict(stats->valuesToJs);
+  PyObject *api = PYM_apiStatsToDict(stats->api);
+
+  PyObject *result = NULL;
+  if (valuesToPython && valuesToJs && api)
+    result = Py_BuildValue(
+      "{sksksKsksksksOsOsksKsksksO}",
+      "scripts_compiled", stats->scriptsCompiled,
+      "functions_compiled", stats->functionsCompiled,
+      "source_bytes_compiled", stats->sourceBytesCompiled,
+      "executions", stats->executions,
+      "js_to_python_calls", stats->jsToPythonCalls,
+      "python_to_js_calls", stats->pythonToJsCalls,
+      "values_to_python", valuesToPython,
+      "values_to_js", valuesToJs,
+      "strings_transcoded", stats->stringsTranscoded,
+      "bytes_transcoded", stats->bytesTranscoded,
+      "exceptions_to_python", stats->exceptionsToPython,
+      "exceptions_to_js", stats->exceptionsToJs,
+      "api", api
+      );
+
+  Py_XDECREF(valuesToPython);
+  Py_XDECREF(valuesToJs);
+  Py_XDECREF(api);
+  return result;
+}
+
+static PyObject *
+PYM_resetStats(PYM_JSRuntimeObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self);
+
+  memset(&self->stats, 0, sizeof(self->stats));
+  Py_RETURN_NONE;
+}
+
+// Appends a line formatted with the given arguments to the list,
+// returning -1 on failure.
+static int
+PYM_appendLine(PyObject *lines, const char *format, ...)
+{
+  char buffer[256];
+  va_list ap;
+
+  va_start(ap, format);
+  vsnprintf(buffer, sizeof(buffer), format, ap);
+  va_end(ap);
+
+  PyObject *line = PyString_FromString(buffer);
+  if (line == NULL)
+    return -1;
+  int result = PyList_Append(lines, line);
+  Py_DECREF(line);
+  return result;
+}
+
+// Appends a counter with a single value, in the Prometheus text
+// exposition format.
+static int
+PYM_appendCounter(PyObject *lines, const char *prefix, const char *name,
+                  const char *help, unsigned PY_LONG_LONG value)
+{
+  if (PYM_appendLine(lines, "# HELP %s_%s %s", prefix, name, help) == -1 ||
+      PYM_appendLine(lines, "# TYPE %s_%s counter", prefix, name) == -1 ||
+      PYM_appendLine(lines, "%s_%s %llu", prefix, name, value) == -1)
+    return -1;
+  return 0;
+}
+
+static int
+PYM_appendValueCounter(PyObject *lines, const char *prefix,
+                       const char *name, const char *help,
+                       unsigned long *counts)
+{
+  if (PYM_appendLine(lines, "# HELP %s_%s %s", prefix, name, help) == -1 ||
+      PYM_appendLine(lines, "# TYPE %s_%s counter", prefix, name) == -1)
+    return -1;
+
+  for (int i = 0; i < PYM_VALUE_TYPE_COUNT; i++)
+    if (PYM_appendLine(lines, "%s_%s{type=\"%s\"} %lu", prefix, name,
+                       PYM_valueTypeNames[i], counts[i]) == -1)
+      return -1;
+  return 0;
+}
+
+static PyObject *
+PYM_getStatsPrometheus(PYM_JSRuntimeObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self);
+  const char *prefix = "pydermonkey";
+
+  if (!PyArg_ParseTuple(args, "|s", &prefix))
+    return NULL;
+
+  if (strlen(prefix) > 64) {
+    PyErr_SetString(PyExc_ValueError, "Prefix is too long.");
+    return NULL;
+  }
+
+  // Metric names must match [a-zA-Z_:][a-zA-Z0-9_:]*.
+  bool valid = (*prefix != '\0');
+  for (const char *c = prefix; valid && *c; c++)
+    valid = ((*c >= 'a' && *c <= 'z') || (*c >= 'A' && *c <= 'Z') ||
+             *c == '_' || *c == ':' ||
+             (c != prefix && *c >= '0' && *c <= '9'));
+  if (!valid) {
+    PyErr_SetString(PyExc_ValueError, "Prefix isn't a valid metric name.");
+    return NULL;
+  }
+
+  PyObject *lines = PyList_New(0);
+  if (lines == NULL)
+    return NULL;
+
+  PYM_RuntimeStats *stats = &self->stats;
+  int i;
+
+  if (PYM_appendCounter(lines, prefix, "scripts_compiled_total",
+                        "Scripts compiled.",
+                        stats->scriptsCompiled) == -1 ||
+      PYM_appendCounter(lines, prefix, "functions_compiled_total",
+                        "Functions compiled from source.",
+                        stats->functionsCompiled) == -1 ||
+      PYM_appendCounter(lines, prefix, "source_bytes_compiled_total",
+                        "Bytes of UTF-16 source compiled.",
+                        stats->sourceBytesCompiled) == -1 ||
+      PYM_appendCounter(lines, prefix, "executions_total",
+                        "Scripts executed.",
+                        stats->executions) == -1 ||
+      PYM_appendCounter(lines, prefix, "js_to_python_calls_total",
+                        "Calls from JS into Python functions.",
+                        stats->jsToPythonCalls) == -1 ||
+      PYM_appendCounter(lines, prefix, "python_to_js_calls_total",
+                        "Calls from Python into JS functions.",
+                        stats->pythonToJsCalls) == -1 ||
+      PYM_appendValueCounter(lines, prefix, "values_to_python_total",
+                             "Values converted from JS to Python.",
+                             stats->valuesToPython) == -1 ||
+      PYM_appendValueCounter(lines, prefix, "values_to_js_total",
+                             "Values converted from Python to JS.",
+                             stats->valuesToJs) == -1 ||
+      PYM_appendCounter(lines, prefix, "strings_transcoded_total",
+                        "Strings transcoded in either direction.",
+                        stats->stringsTranscoded) == -1 ||
+      PYM_appendCounter(lines, prefix, "bytes_transcoded_total",
+                        "Bytes of UTF-16 strings transcoded.",
+                        stats->bytesTranscoded) == -1 ||
+      PYM_appendCounter(lines, prefix, "exceptions_to_python_total",
+                        "JS exceptions raised in Python.",
+                        stats->exceptionsToPython) == -1 ||
+      PYM_appendCounter(lines, prefix, "exceptions_to_js_total",
+                        "Python exceptions thrown into JS.",
+                        stats->exceptionsToJs) == -1)
+    goto error;
+
+  if (PYM_appendLine(lines, "# HELP %s_api_calls_total Calls to API methods.",
+                     prefix) == -1 ||
+      PYM_appendLine(lines, "# TYPE %s_api_calls_total counter",
+                     prefix) == -1)
+    goto error;
+  for (i = 0; i < PYM_API_COUNT; i++)
+    if (PYM_appendLine(lines, "%s_api_calls_total{api=\"%s\"} %lu", prefix,
+                       PYM_apiNames[i], stats->api[i].calls) == -1)
+      goto error;
+
+  if (PYM_appendLine(lines, "# HELP %s_api_seconds_total Wall-clock time "
+                     "spent in API methods.", prefix) == -1 ||
+      PYM_appendLine(lines, "# TYPE %s_api_seconds_total counter",
+                     prefix) == -1)
+    goto error;
+  for (i = 0; i < PYM_API_COUNT; i++)
+    if (PYM_appendLine(lines, "%s_api_seconds_total{api=\"%s\"} %.9f",
+                       prefix, PYM_apiNames[i], stats->api[i].time) == -1)
+      goto error;
+
+  // The text format requires a trailing newline.
+  if (PYM_appendLine(lines, "") == -1)
+    goto error;
+
+  {
+    PyObject *separator = PyString_FromString("\n");
+    if (separator == NULL)
+      goto error;
+    PyObject *result = _PyString_Join(separator, lines);
+    Py_DECREF(separator);
+    Py_DECREF(lines);
+    return result;
+  }
+
+ error:
+  Py_DECREF(lines);
+  return NULL;
+}
+
+static PyObject *
+PYM_startTrace(PYM_JSRuntimeObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self);
+  unsigned int capacity = PYM_DEFAULT_TRACE_CAPACITY;
+
+  if (!PyArg_ParseTuple(args, "|I", &capacity))
+    return NULL;
+
+  if (self->tracer) {
+    PyErr_SetString(PYM_error, "Tracing is already in progress.");
+    return NULL;
+  }
+
+  self->tracer = PYM_newTracer(capacity);
+  if (self->tracer == NULL)
+    return NULL;
+
+  Py_RETURN_NONE;
+}
+
+static PyObject *
+PYM_stopTrace(PYM_JSRuntimeObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self);
+
+  if (self->tracer == NULL) {
+    PyErr_SetString(PYM_error, "Tracing is not in progress.");
+    return NULL;
+  }
+
+  PYM_Tracer *tracer = self->tracer;
+  self->tracer = NULL;
+
+  PyObject *events = PYM_getTraceEvents(tracer, self->thread);
+  PYM_freeTracer(tracer);
+  return events;
+}
+
+static PyObject *
+PYM_getTrace(PYM_JSRuntimeObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self);
+
+  if (self->tracer == NULL) {
+    PyErr_SetString(PYM_error, "Tracing is not in progress.");
+    return NULL;
+  }
+
+  return PYM_getTraceEvents(self->tracer, self->thread);
+}
+
+static PyObject *
+PYM_dumpTraceMethod(PYM_JSRuntimeObject *self, PyObject *args)
+{
+  PYM_SANITY_CHECK(self);
+  const char *path;
+
+  if (!PyArg_ParseTuple(args, "s", &path))
+    return NULL;
+
+  if (self->tracer == NULL) {
+    PyErr_SetString(PYM_error, "Tracing is not in progress.");
+    return NULL;
+  }
+
+  if (PYM_dumpTrace(self->tracer, self->thread, path) == -1)
+    return NULL;
+
+  Py_RETURN_NONE;
+}
+
 static PyMethodDef PYM_JSRuntimeMethods[] = {
   {"new_context", (PyCFunction) PYM_newContext, METH_VARARGS,
    "Create a new JavaScript context."},
+  {"get_memory_usage", (PyCFunction) PYM_getMemoryUsage, METH_VARARGS,
+   "Get the current and peak size of the runtime's JS heap."},
+  {"set_memory_limits", (PyCFunction) PYM_setMemoryLimits, METH_VARARGS,
+   "Set the soft and hard limits on the size of the runtime's JS heap."},
+  {"get_gc_stats", (PyCFunction) PYM_getGCStats, METH_VARARGS,
+   "Get statistics about the runtime's garbage collections."},
+  {"set_gc_parameter", (PyCFunction) PYM_setGCParameter, METH_VARARGS,
+   "Tune the runtime's garbage collector."},
+  {"set_gc_callback", (PyCFunction) PYM_setGCCallback, METH_VARARGS,
+   "Set a callable to be notified when garbage collection begins and ends."},
+  {"get_stats", (PyCFunction) PYM_getStats, METH_VARARGS,
+   "Get aggregate counters for all of the runtime's contexts."},
+  {"reset_stats", (PyCFunction) PYM_resetStats, METH_VARARGS,
+   "Reset the runtime's aggregate counters to zero."},
+  {"get_stats_prometheus", (PyCFunction) PYM_getStatsPrometheus,
+   METH_VARARGS,
+   "Get the runtime's aggregate counters in the Prometheus text format."},
+  {"start_trace", (PyCFunction) PYM_startTrace, METH_VARARGS,
+   "Start recording calls across the Python/JS boundary and GCs."},
+  {"stop_trace", (PyCFunction) PYM_stopTrace, METH_VARARGS,
+   "Stop tracing and return the recorded events."},
+  {"get_trace", (PyCFunction) PYM_getTrace, METH_VARARGS,
+   "Get the events recorded so far in the Chrome trace event format."},
+  {"dump_trace", (PyCFunction) PYM_dumpTraceMethod, METH_VARARGS,
+   "Write the events recorded so far to a Chrome trace event JSON file."},
   {NULL, NULL, 0, NULL}
 };
 
@@ -171,11 +920,11 @@ PyTypeObject PYM_JSRuntimeType = {
   0,                           /*tp_setattro*/
   0,                           /*tp_as_buffer*/
                                /*tp_flags*/
-  Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_WEAKREFS,
+  Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC | Py_TPFLAGS_HAVE_WEAKREFS,
                                /* tp_doc */
   "JavaScript Runtime.",
-  0,                           /* tp_traverse */
-  0,                           /* tp_clear */
+  (traverseproc) PYM_traverse, /* tp_traverse */
+  (inquiry) PYM_clear,         /* tp_clear */
   0,                           /* tp_richcompare */
                                /* tp_weaklistoffset */
   offsetof(PYM_JSRuntimeObject, weakrefs),
@@ -54,17 +54,141 @@
     return NULL; \
   }
 
+// Maximum number of bytes a runtime's JS heap may use if no other
+// hard memory limit has been set.
+#define PYM_DEFAULT_MAX_BYTES (8L * 1024L * 1024L)
+
+struct PYM_JSObject;
+
+// Types of values counted when they're converted between JS and
+// Python.
+enum {
+  PYM_VALUE_INT,
+  PYM_VALUE_DOUBLE,
+  PYM_VALUE_BOOLEAN,
+  PYM_VALUE_NULL,
+  PYM_VALUE_UNDEFINED,
+  PYM_VALUE_STRING,
+  PYM_VALUE_OBJECT,
+  PYM_VALUE_TYPE_COUNT
+};
+
+// Context methods whose calls and cumulative wall time are counted.
+enum {
+  PYM_API_COMPILE_SCRIPT,
+  PYM_API_COMPILE_FUNCTION,
+  PYM_API_EXECUTE_SCRIPT,
+  PYM_API_EVALUATE_SCRIPT,
+  PYM_API_CALL_FUNCTION,
+  PYM_API_COUNT
+};
+
 typedef struct {
+  unsigned long calls;
+  double time;
+} PYM_APIStats;
+
+// Aggregate counters for all of a runtime's contexts. These are only
+// ever touched from the runtime's thread, so they're simply
+// incremented in place.
+typedef struct {
+  unsigned long scriptsCompiled;
+  unsigned long functionsCompiled;
+  unsigned PY_LONG_LONG sourceBytesCompiled;
+  unsigned long executions;
+  unsigned long jsToPythonCalls;
+  unsigned long pythonToJsCalls;
+  unsigned long valuesToPython[PYM_VALUE_TYPE_COUNT];
+  unsigned long valuesToJs[PYM_VALUE_TYPE_COUNT];
+  unsigned long stringsTranscoded;
+  unsigned PY_LONG_LONG bytesTranscoded;
+  unsigned long exceptionsToPython;
+  unsigned long exceptionsToJs;
+  PYM_APIStats api[PYM_API_COUNT];
+} PYM_RuntimeStats;
+
+struct PYM_Tracer;
+struct PYM_JSContextObject;
+
+// Maximum number of finished collections that are kept for the Python
+// GC callback until it can be called; beyond that, the oldest ones are
+// dropped.
+#define PYM_MAX_PENDING_GC_EVENTS 16
+
+// A finished collection that the Python GC callback hasn't been told
+// about yet. The start time is taken from PYM_getWallTime().
+typedef struct {
+  double startTime;
+  double pause;
+  uint32 bytesBefore;
+  uint32 bytesAfter;
+} PYM_GCEvent;
+
+typedef struct PYM_JSRuntimeObject {
   PyObject_HEAD
   JSRuntime *rt;
   JSContext *cx;
   JSDHashTable objects;
   long thread;
   JSObject *weakrefs;
+  uint32 softMemoryLimit;
+  uint32 hardMemoryLimit;
+  uint32 peakBytes;
+  uint32 bytesAfterSoftLimitGC;
+  unsigned long softLimitGCs;
+  unsigned long gcCount;
+  uint32 gcBytesBefore;
+  uint32 gcBytesAfter;
+  double gcStartTime;
+  double gcLastPause;
+  double gcMaxPause;
+  double gcTotalPause;
+  PyObject *gcCallback;
+  PYM_GCEvent gcPendingEvents[PYM_MAX_PENDING_GC_EVENTS];
+  unsigned int gcPendingStart;
+  unsigned int gcPendingCount;
+  unsigned int contextCount;
+  unsigned long objectCount;
+  unsigned long functionCount;
+  unsigned long scriptCount;
+  unsigned long transientCount;
+  struct PYM_JSObject *transientObjects;
+  unsigned long privateHolderCount;
+  PYM_RuntimeStats stats;
+  struct PYM_Tracer *tracer;
+  JSObject *prelude;
+  struct PYM_JSContextObject *firstContext;
+  struct PYM_JSRuntimeObject *prevRuntime;
+  struct PYM_JSRuntimeObject *nextRuntime;
 } PYM_JSRuntimeObject;
 
 extern PyTypeObject PYM_JSRuntimeType;
 
 extern unsigned int PYM_getJSRuntimeCount();
 
+// Returns a new list containing a dictionary of debugging information
+// for each live runtime.
+extern PyObject *
+PYM_getJSRuntimesDebugInfo();
+
+// Records the runtime's current JS heap size and, if it's over the
+// runtime's soft memory limit, performs garbage collection on the
+// given context. This should only be called at points where it's
+// safe to GC.
+extern void
+PYM_enforceMemoryLimits(PYM_JSRuntimeObject *runtime, JSContext *cx);
+
+// Returns whether the runtime's hard memory limit has been reached,
+// which is the usual reason for SpiderMonkey to report that it's out
+// of memory.
+extern JSBool
+PYM_hitHardMemoryLimit(PYM_JSRuntimeObject *runtime);
+
+// Calls the runtime's Python GC callback for every collection that
+// has finished since the last time this was called. The callback is
+// never called from inside the collector; instead, this is called
+// with the GIL held once control is back in pydermonkey.
+extern void
+PYM_deliverGCEvents(PYM_JSRuntimeObject *runtime);
+
 #endif
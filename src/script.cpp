@@ -35,6 +35,7 @@
  * ***** END LICENSE BLOCK ***** */
 
 #include "script.h"
+#include "coverage.h"
 #include "utils.h"
 
 #include "structmember.h"
@@ -70,6 +71,20 @@ Py_ssize_t PYM_charbuffer(PYM_JSScript *self, Py_ssize_t segment,
   return self->script->length;
 }
 
+static PyObject *
+PYM_getCoverage(PYM_JSScript *self, void *closure)
+{
+  PYM_SANITY_CHECK(self->base.runtime);
+  return PYM_getScriptCoverage(self->base.runtime, self->script);
+}
+
+static PyGetSetDef PYM_getSets[] = {
+  {(char *) "coverage", (getter) PYM_getCoverage, NULL,
+   (char *) "Lines of the script seen by running coverage collectors.",
+   NULL},
+  {NULL, NULL, NULL, NULL, NULL}
+};
+
 static PyBufferProcs PYM_bufferProcs = {
   (readbufferproc) PYM_readbuffer,
   NULL,
@@ -116,12 +131,13 @@ PyTypeObject PYM_JSScriptType = {
   0,                           /* tp_traverse */
   0,                           /* tp_clear */
   0,                           /* tp_richcompare */
-  0,                           /* tp_weaklistoffset */
+                               /* tp_weaklistoffset */
+  offsetof(PYM_JSObject, weakrefs),
   0,                           /* tp_iter */
   0,                           /* tp_iternext */
   0,                           /* tp_methods */
   PYM_members,                 /* tp_members */
-  0,                           /* tp_getset */
+  PYM_getSets,                 /* tp_getset */
   0,                           /* tp_base */
   0,                           /* tp_dict */
   0,                           /* tp_descr_get */
@@ -150,7 +166,7 @@ PYM_newJSScript(PYM_JSContextObject *context, JSScript *script)
   }
 
   if (object == NULL) {
-    object = PyObject_New(PYM_JSScript, &PYM_JSScriptType);
+    object = (PYM_JSScript *) PYM_allocWrapper(&PYM_JSScriptType);
     if (object == NULL)
       return NULL;
 
@@ -0,0 +1,447 @@
+/* ***** BEGIN LICENSE BLOCK *****
+ * Version: MPL 1.1/GPL 2.0/LGPL 2.1
+ *
+ * The contents of this file are subject to the Mozilla Public License Version
+ * 1.1 (the "License"); you may not use this file except in compliance with
+ * the License. You may obtain a copy of the License at
+ * http://www.mozilla.org/MPL/
+ *
+ * Software distributed under the License is distributed on an "AS IS" basis,
+ * WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+ * for the specific language governing rights and limitations under the
+ * License.
+ *
+ * The Original Code is Pydermonkey.
+ *
+ * The Initial Developer of the Original Code is Mozilla.
+ * Portions created by the Initial Developer are Copyright (C) 2007
+ * the Initial Developer. All Rights Reserved.
+ *
+ * Contributor(s):
+ *   Atul Varma <atul@mozilla.com>
+ *
+ * Alternatively, the contents of this file may be used under the terms of
+ * either the GNU General Public License Version 2 or later (the "GPL"), or
+ * the GNU Lesser General Public License Version 2.1 or later (the "LGPL"),
+ * in which case the provisions of the GPL or the LGPL are applicable instead
+ * of those above. If you wish to allow use of your version of this file only
+ * under the terms of either the GPL or the LGPL, and not to allow others to
+ * use your version of this file under the terms of the MPL, indicate your
+ * decision by deleting the provisions above and replace them with the notice
+ * and other provisions required by the GPL or the LGPL. If you do not delete
+ * the provisions above, a recipient may use your version of this file under
+ * the terms of any one of the MPL, the GPL or the LGPL.
+ *
+ * ***** END LICENSE BLOCK ***** */
+
+#include "scripterror.h"
+#include "object.h"
+#include "utils.h"
+
+#define PYM_BASE_EXCEPTION_TYPE ((PyTypeObject *) PyExc_StandardError)
+
+// Converts the given thrown value to a Python string, using a
+// placeholder if that fails.
+static PyObject *
+PYM_thrownValueToMessage(PYM_JSContextObject *context, jsval val)
+{
+  JSString *str = NULL;
+
+  if (context->cx) {
+    Py_BEGIN_ALLOW_THREADS;
+    str = JS_ValueToString(context->cx, val);
+    Py_END_ALLOW_THREADS;
+  }
+
+  if (str != NULL)
+    return PYM_jsvalToPyObject(context, STRING_TO_JSVAL(str));
+
+  if (context->cx)
+    JS_ClearPendingException(context->cx);
+  return PyString_FromString("<string conversion failed>");
+}
+
+// Returns the JS object that was thrown, or NULL if it wasn't an
+// object or the exception wasn't raised by pydermonkey.
+static JSObject *
+PYM_getThrownObject(PYM_ScriptErrorObject *self)
+{
+  PyObject *args = self->base.args;
+
+  if (self->context == NULL || self->context->cx == NULL ||
+      args == NULL || !PyTuple_Check(args) || PyTuple_GET_SIZE(args) == 0)
+    return NULL;
+
+  PyObject *thrown = PyTuple_GET_ITEM(args, 0);
+  if (!PyObject_TypeCheck(thrown, &PYM_JSObjectType))
+    return NULL;
+
+  return ((PYM_JSObject *) thrown)->obj;
+}
+
+static int
+PYM_resolveMessage(PYM_ScriptErrorObject *self)
+{
+  if (!self->messagePending)
+    return 0;
+
+  JSObject *obj = PYM_getThrownObject(self);
+  PyObject *thrown = PyTuple_GET_ITEM(self->base.args, 0);
+  PyObject *message;
+
+  if (obj)
+    message = PYM_thrownValueToMessage(self->context, OBJECT_TO_JSVAL(obj));
+  else
+    message = PyString_FromString("<string conversion failed>");
+  if (message == NULL)
+    return -1;
+
+  PyObject *args = PyTuple_Pack(2, thrown, message);
+  Py_DECREF(message);
+  if (args == NULL)
+    return -1;
+
+  // This is what BaseException would have set the message to if the
+  // exception had been created with both arguments in the first place.
+  PyObject *emptyMessage = PyString_FromString("");
+  if (emptyMessage == NULL) {
+    Py_DECREF(args);
+    return -1;
+  }
+
+  Py_DECREF(self->base.args);
+  self->base.args = args;
+  Py_XDECREF(self->base.message);
+  self->base.message = emptyMessage;
+  self->messagePending = 0;
+  return 0;
+}
+
+static PyObject *
+PYM_getArgs(PYM_ScriptErrorObject *self, void *closure)
+{
+  if (PYM_resolveMessage(self) == -1)
+    return NULL;
+
+  Py_INCREF(self->base.args);
+  return self->base.args;
+}
+
+static int
+PYM_setArgs(PYM_ScriptErrorObject *self, PyObject *value, void *closure)
+{
+  if (value == NULL) {
+    PyErr_SetString(PyExc_TypeError, "args may not be deleted");
+    return -1;
+  }
+
+  PyObject *args = PySequence_Tuple(value);
+  if (args == NULL)
+    return -1;
+
+  Py_XDECREF(self->base.args);
+  self->base.args = args;
+  self->messagePending = 0;
+  return 0;
+}
+
+// BaseException's message attribute is read straight out of the
+// instance, so the message is resolved before it's passed on to the
+// original descriptor.
+static PyObject *
+PYM_getMessage(PYM_ScriptErrorObject *self, void *closure)
+{
+  if (PYM_resolveMessage(self) == -1)
+    return NULL;
+
+  PyObject *descr = PyDict_GetItemString(
+    ((PyTypeObject *) PyExc_BaseException)->tp_dict, "message"
+    );
+  if (descr == NULL) {
+    PyErr_SetString(PyExc_AttributeError, "message");
+    return NULL;
+  }
+  return Py_TYPE(descr)->tp_descr_get(descr, (PyObject *) self,
+                                      (PyObject *) Py_TYPE(self));
+}
+
+static int
+PYM_setMessage(PYM_ScriptErrorObject *self, PyObject *value, void *closure)
+{
+  if (PYM_resolveMessage(self) == -1)
+    return -1;
+
+  PyObject *descr = PyDict_GetItemString(
+    ((PyTypeObject *) PyExc_BaseException)->tp_dict, "message"
+    );
+  if (descr == NULL) {
+    PyErr_SetString(PyExc_AttributeError, "message");
+    return -1;
+  }
+  return Py_TYPE(descr)->tp_descr_set(descr, (PyObject *) self, value);
+}
+
+// Returns the filename or line number of the error report associated
+// with a thrown Error object, or None.
+static PyObject *
+PYM_getReportField(PYM_ScriptErrorObject *self, void *closure)
+{
+  JSObject *obj = PYM_getThrownObject(self);
+  JSErrorReport *report = NULL;
+
+  if (obj)
+    report = JS_ErrorFromException(self->context->cx, OBJECT_TO_JSVAL(obj));
+
+  if (report == NULL)
+    Py_RETURN_NONE;
+
+  if (closure == NULL) {
+    if (report->filename == NULL)
+      Py_RETURN_NONE;
+    return PyString_FromString(report->filename);
+  }
+  return PyInt_FromLong(report->lineno);
+}
+
+static PyObject *
+PYM_getErrorStack(PYM_ScriptErrorObject *self, void *closure)
+{
+  JSObject *obj = PYM_getThrownObject(self);
+  jsval stack;
+
+  // JS_ErrorFromException() only succeeds for genuine Error objects,
+  // whose stack property can be looked up without running any JS.
+  if (obj == NULL ||
+      JS_ErrorFromException(self->context->cx, OBJECT_TO_JSVAL(obj)) == NULL ||
+      !JS_LookupProperty(self->context->cx, obj, "stack", &stack) ||
+      !JSVAL_IS_STRING(stack))
+    Py_RETURN_NONE;
+
+  return PYM_jsvalToPyObject(self->context, stack);
+}
+
+static PyGetSetDef PYM_ScriptErrorGetSets[] = {
+  {(char *) "args", (getter) PYM_getArgs, (setter) PYM_setArgs, NULL, NULL},
+  {(char *) "message", (getter) PYM_getMessage, (setter) PYM_setMessage,
+   NULL, NULL},
+  {(char *) "filename", (getter) PYM_getReportField, NULL,
+   (char *) "Filename at which the thrown Error object was created.", NULL},
+  {(char *) "lineno", (getter) PYM_getReportField, NULL,
+   (char *) "Line number at which the thrown Error object was created.",
+   (void *) 1},
+  {(char *) "stack", (getter) PYM_getErrorStack, NULL,
+   (char *) "Stack trace of the thrown Error object.", NULL},
+  {NULL}
+};
+
+static PyObject *
+PYM_unicode(PYM_ScriptErrorObject *self, PyObject *args)
+{
+  if (PYM_resolveMessage(self) == -1)
+    return NULL;
+
+  PyObject *method = PyObject_GetAttrString((PyObject *) PYM_BASE_EXCEPTION_TYPE,
+                                            "__unicode__");
+  if (method == NULL)
+    return NULL;
+
+  PyObject *result = PyObject_CallFunctionObjArgs(method, self, NULL);
+  Py_DECREF(method);
+  return result;
+}
+
+// Like BaseException's, except that the wrapper of a thrown JS object,
+// which can't be pickled, is replaced with None.
+static PyObject *
+PYM_reduce(PYM_ScriptErrorObject *self)
+{
+  if (PYM_resolveMessage(self) == -1)
+    return NULL;
+
+  PyObject *args = self->base.args;
+  Py_INCREF(args);
+
+  if (PyTuple_GET_SIZE(args) > 0 &&
+      PyObject_TypeCheck(PyTuple_GET_ITEM(args, 0), &PYM_JSObjectType)) {
+    Py_ssize_t size = PyTuple_GET_SIZE(args);
+    PyObject *newArgs = PyTuple_New(size);
+    if (newArgs == NULL) {
+      Py_DECREF(args);
+      return NULL;
+    }
+    Py_INCREF(Py_None);
+    PyTuple_SET_ITEM(newArgs, 0, Py_None);
+    for (Py_ssize_t i = 1; i < size; i++) {
+      PyObject *item = PyTuple_GET_ITEM(args, i);
+      Py_INCREF(item);
+      PyTuple_SET_ITEM(newArgs, i, item);
+    }
+    Py_DECREF(args);
+    args = newArgs;
+  }
+
+  PyObject *result;
+  if (self->base.dict)
+    result = PyTuple_Pack(3, Py_TYPE(self), args, self->base.dict);
+  else
+    result = PyTuple_Pack(2, Py_TYPE(self), args);
+  Py_DECREF(args);
+  return result;
+}
+
+static PyMethodDef PYM_ScriptErrorMethods[] = {
+  {"__unicode__", (PyCFunction) PYM_unicode, METH_NOARGS, NULL},
+  {"__reduce__", (PyCFunction) PYM_reduce, METH_NOARGS, NULL},
+  {NULL, NULL, 0, NULL}
+};
+
+static PyObject *
+PYM_getItem(PYM_ScriptErrorObject *self, Py_ssize_t index)
+{
+  if (PYM_resolveMessage(self) == -1)
+    return NULL;
+  return PYM_BASE_EXCEPTION_TYPE->tp_as_sequence->sq_item((PyObject *) self,
+                                                         index);
+}
+
+static PyObject *
+PYM_getSlice(PYM_ScriptErrorObject *self, Py_ssize_t start, Py_ssize_t stop)
+{
+  if (PYM_resolveMessage(self) == -1)
+    return NULL;
+  return PYM_BASE_EXCEPTION_TYPE->tp_as_sequence->sq_slice((PyObject *) self,
+                                                          start, stop);
+}
+
+static PySequenceMethods PYM_ScriptErrorAsSequence = {
+  0,                           /* sq_length */
+  0,                           /* sq_concat */
+  0,                           /* sq_repeat */
+  (ssizeargfunc) PYM_getItem,  /* sq_item */
+  (ssizessizeargfunc) PYM_getSlice, /* sq_slice */
+  0,                           /* sq_ass_item */
+  0,                           /* sq_ass_slice */
+  0,                           /* sq_contains */
+  0,                           /* sq_inplace_concat */
+  0                            /* sq_inplace_repeat */
+};
+
+static PyObject *
+PYM_str(PYM_ScriptErrorObject *self)
+{
+  if (PYM_resolveMessage(self) == -1)
+    return NULL;
+  return PYM_BASE_EXCEPTION_TYPE->tp_str((PyObject *) self);
+}
+
+static PyObject *
+PYM_repr(PYM_ScriptErrorObject *self)
+{
+  if (PYM_resolveMessage(self) == -1)
+    return NULL;
+  return PYM_BASE_EXCEPTION_TYPE->tp_repr((PyObject *) self);
+}
+
+static int
+PYM_traverse(PYM_ScriptErrorObject *self, visitproc visit, void *arg)
+{
+  Py_VISIT(self->context);
+  return PYM_BASE_EXCEPTION_TYPE->tp_traverse((PyObject *) self, visit, arg);
+}
+
+static int
+PYM_clear(PYM_ScriptErrorObject *self)
+{
+  Py_CLEAR(self->context);
+  return PYM_BASE_EXCEPTION_TYPE->tp_clear((PyObject *) self);
+}
+
+static void
+PYM_dealloc(PYM_ScriptErrorObject *self)
+{
+  PyObject_GC_UnTrack((PyObject *) self);
+  PYM_clear(self);
+  Py_TYPE(self)->tp_free((PyObject *) self);
+}
+
+PyTypeObject PYM_ScriptErrorType = {
+  PyObject_HEAD_INIT(NULL)
+  0,                           /*ob_size*/
+  "pydermonkey.ScriptError",   /*tp_name*/
+  sizeof(PYM_ScriptErrorObject), /*tp_basicsize*/
+  0,                           /*tp_itemsize*/
+  (destructor) PYM_dealloc,    /*tp_dealloc*/
+  0,                           /*tp_print*/
+  0,                           /*tp_getattr*/
+  0,                           /*tp_setattr*/
+  0,                           /*tp_compare*/
+  (reprfunc) PYM_repr,         /*tp_repr*/
+  0,                           /*tp_as_number*/
+  &PYM_ScriptErrorAsSequence,  /*tp_as_sequence*/
+  0,                           /*tp_as_mapping*/
+  0,                           /*tp_hash */
+  0,                           /*tp_call*/
+  (reprfunc) PYM_str,          /*tp_str*/
+  0,                           /*tp_getattro*/
+  0,                           /*tp_setattro*/
+  0,                           /*tp_as_buffer*/
+                               /*tp_flags*/
+  Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE | Py_TPFLAGS_HAVE_GC,
+                               /* tp_doc */
+  "A wrapped JavaScript exception.",
+  (traverseproc) PYM_traverse, /* tp_traverse */
+  (inquiry) PYM_clear,         /* tp_clear */
+  0,                           /* tp_richcompare */
+  0,                           /* tp_weaklistoffset */
+  0,                           /* tp_iter */
+  0,                           /* tp_iternext */
+  PYM_ScriptErrorMethods,      /* tp_methods */
+  0,                           /* tp_members */
+  PYM_ScriptErrorGetSets,      /* tp_getset */
+  0,                           /* tp_base */
+  0,                           /* tp_dict */
+  0,                           /* tp_descr_get */
+  0,                           /* tp_descr_set */
+  0,                           /* tp_dictoffset */
+  0,                           /* tp_init */
+  0,                           /* tp_alloc */
+  0,                           /* tp_new */
+};
+
+PyObject *
+PYM_newScriptError(PYM_JSContextObject *context, jsval val)
+{
+  PyObject *thrown = PYM_jsvalToPyObject(context, val);
+  if (thrown == NULL) {
+    PyErr_Clear();
+    thrown = Py_None;
+    Py_INCREF(thrown);
+  }
+
+  PyObject *error;
+
+  if (PyObject_TypeCheck(thrown, &PYM_JSObjectType)) {
+    error = PyObject_CallFunctionObjArgs((PyObject *) &PYM_ScriptErrorType,
+                                         thrown, NULL);
+    if (error) {
+      PYM_ScriptErrorObject *scriptError = (PYM_ScriptErrorObject *) error;
+      Py_INCREF(context);
+      scriptError->context = context;
+      scriptError->messagePending = 1;
+    }
+  } else {
+    // Converting a primitive value to a string never runs any JS code,
+    // so there's no point in putting it off.
+    PyObject *message = PYM_thrownValueToMessage(context, val);
+    if (message == NULL) {
+      Py_DECREF(thrown);
+      return NULL;
+    }
+    error = PyObject_CallFunctionObjArgs((PyObject *) &PYM_ScriptErrorType,
+                                         thrown, message, NULL);
+    Py_DECREF(message);
+  }
+
+  Py_DECREF(thrown);
+  return error;
+}
@@ -0,0 +1,368 @@
+/* ***** BEGIN LICENSE BLOCK *****
+ * Version: MPL 1.1/GPL 2.0/LGPL 2.1
+ *
+ * The contents of this file are subject to the Mozilla Public License Version
+ * 1.1 (the "License"); you may not use this file except in compliance with
+ * the License. You may obtain a copy of the License at
+ * http://www.mozilla.org/MPL/
+ *
+ * Software distributed under the License is distributed on an "AS IS" basis,
+ * WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+ * for the specific language governing rights and limitations under the
+ * License.
+ *
+ * The Original Code is Pydermonkey.
+ *
+ * The Initial Developer of the Original Code is Mozilla.
+ * Portions created by the Initial Developer are Copyright (C) 2007
+ * the Initial Developer. All Rights Reserved.
+ *
+ * Contributor(s):
+ *   Atul Varma <atul@mozilla.com>
+ *
+ * Alternatively, the contents of this file may be used under the terms of
+ * either the GNU General Public License Version 2 or later (the "GPL"), or
+ * the GNU Lesser General Public License Version 2.1 or later (the "LGPL"),
+ * in which case the provisions of the GPL or the LGPL are applicable instead
+ * of those above. If you wish to allow use of your version of this file only
+ * under the terms of either the GPL or the LGPL, and not to allow others to
+ * use your version of this file under the terms of the MPL, indicate your
+ * decision by deleting the provisions above and replace them with the notice
+ * and other provisions required by the GPL or the LGPL. If you do not delete
+ * the provisions above, a recipient may use your version of this file under
+ * the terms of any one of the MPL, the GPL or the LGPL.
+ *
+ * ***** END LICENSE BLOCK ***** */
+
+
+#include "snapshot.h"
+#include "utils.h"
+
+#include "jsdbgapi.h"
+
+#include <stdlib.h>
+
+// Snapshots are traced and finalized by the JS garbage collector,
+// which may run without the GIL, so the C library's allocator is used
+// throughout instead of Python's.
+static void
+PYM_freeGlobalSnapshot(PYM_GlobalSnapshot *snapshot)
+{
+  if (snapshot->ids.ops)
+    JS_DHashTableFinish(&snapshot->ids);
+  free(snapshot->entries);
+  free(snapshot);
+}
+
+static void
+PYM_finalizeGlobalSnapshot(JSContext *cx, JSObject *obj)
+{
+  PYM_GlobalSnapshot *snapshot = (PYM_GlobalSnapshot *)
+    JS_GetPrivate(cx, obj);
+  if (snapshot)
+    PYM_freeGlobalSnapshot(snapshot);
+}
+
+static void
+PYM_traceGlobalSnapshot(JSTracer *trc, JSObject *obj)
+{
+  PYM_GlobalSnapshot *snapshot = (PYM_GlobalSnapshot *)
+    JS_GetPrivate(trc->context, obj);
+  if (snapshot == NULL)
+    return;
+
+  JS_CALL_OBJECT_TRACER(trc, snapshot->target, "Global Snapshot Target");
+  for (uint32 i = 0; i < snapshot->length; i++) {
+    JS_CALL_VALUE_TRACER(trc, snapshot->entries[i].id,
+                         "Global Snapshot Property Id");
+    JS_CALL_VALUE_TRACER(trc, snapshot->entries[i].value,
+                         "Global Snapshot Property Value");
+    if (snapshot->entries[i].attrs & JSPROP_GETTER)
+      JS_CALL_OBJECT_TRACER(trc, (JSObject *) snapshot->entries[i].getter,
+                            "Global Snapshot Property Getter");
+    if (snapshot->entries[i].attrs & JSPROP_SETTER)
+      JS_CALL_OBJECT_TRACER(trc, (JSObject *) snapshot->entries[i].setter,
+                            "Global Snapshot Property Setter");
+  }
+}
+
+JSClass PYM_JS_GlobalSnapshotClass = {
+  "PydermonkeyGlobalSnapshot",
+  JSCLASS_HAS_PRIVATE | JSCLASS_MARK_IS_TRACE,
+  JS_PropertyStub, JS_PropertyStub, JS_PropertyStub, JS_PropertyStub,
+  JS_EnumerateStub, JS_ResolveStub, JS_ConvertStub,
+  PYM_finalizeGlobalSnapshot,
+  NULL, NULL, NULL, NULL, NULL, NULL,
+  JS_CLASS_TRACE(PYM_traceGlobalSnapshot), NULL
+};
+
+// The attributes that are recorded and restored along with a property.
+#define PYM_SNAPSHOT_ATTRS (JSPROP_ENUMERATE | JSPROP_READONLY |       \
+                            JSPROP_PERMANENT | JSPROP_GETTER |         \
+                            JSPROP_SETTER | JSPROP_SHARED)
+
+// Property ids are either strings or ints; the property APIs that take
+// a name handle ints that are spelled out as strings just the same, so
+// this gets a name for either kind. The buffer must hold at least 16
+// characters.
+static void
+PYM_getPropertyName(jsval id, jschar *buffer, const jschar **chars,
+                    size_t *length)
+{
+  if (JSVAL_IS_INT(id)) {
+    char digits[16];
+    PyOS_snprintf(digits, sizeof(digits), "%d", JSVAL_TO_INT(id));
+    for (*length = 0; digits[*length]; (*length)++)
+      buffer[*length] = digits[*length];
+    *chars = buffer;
+  } else {
+    JSString *name = JSVAL_TO_STRING(id);
+    *chars = JS_GetStringChars(name);
+    *length = JS_GetStringLength(name);
+  }
+}
+
+// Gets the attributes, getter and setter of an own property.
+static JSBool
+PYM_getPropertyAccessors(JSContext *cx, JSObject *obj, jsval id,
+                         uintN *attrs, JSPropertyOp *getter,
+                         JSPropertyOp *setter)
+{
+  jschar buffer[16];
+  const jschar *chars;
+  size_t length;
+  JSBool found;
+
+  PYM_getPropertyName(id, buffer, &chars, &length);
+  if (!JS_GetUCPropertyAttrsGetterAndSetter(cx, obj, chars, length, attrs,
+                                            &found, getter, setter))
+    return JS_FALSE;
+  *attrs &= PYM_SNAPSHOT_ATTRS;
+  return JS_TRUE;
+}
+
+JSObject *
+PYM_snapshotGlobal(PYM_JSContextObject *context, JSObject *obj)
+{
+  JSContext *cx = context->cx;
+
+  // This includes properties that aren't enumerable, such as the
+  // standard classes; on globals that resolve them lazily, they're
+  // all resolved first.
+  JSPropertyDescArray pda;
+  if (!JS_GetPropertyDescArray(cx, obj, &pda)) {
+    PYM_jsExceptionToPython(context);
+    return NULL;
+  }
+
+  PYM_GlobalSnapshot *snapshot = (PYM_GlobalSnapshot *) calloc(
+    1, sizeof(PYM_GlobalSnapshot)
+    );
+  if (snapshot == NULL) {
+    JS_PutPropertyDescArray(cx, &pda);
+    PyErr_NoMemory();
+    return NULL;
+  }
+
+  snapshot->target = obj;
+  snapshot->entries = (PYM_GlobalSnapshotEntry *) malloc(
+    sizeof(PYM_GlobalSnapshotEntry) * (pda.length ? pda.length : 1)
+    );
+  if (snapshot->entries == NULL ||
+      !JS_DHashTableInit(&snapshot->ids,
+                         JS_DHashGetStubOps(),
+                         NULL,
+                         sizeof(PYM_HashEntry),
+                         JS_DHASH_DEFAULT_CAPACITY(pda.length))) {
+    snapshot->ids.ops = NULL;
+    JS_PutPropertyDescArray(cx, &pda);
+    PYM_freeGlobalSnapshot(snapshot);
+    PyErr_NoMemory();
+    return NULL;
+  }
+
+  for (uint32 i = 0; i < pda.length; i++) {
+    JSPropertyDesc *desc = &pda.array[i];
+
+    if (desc->flags & (JSPD_EXCEPTION | JSPD_ERROR)) {
+      JS_PutPropertyDescArray(cx, &pda);
+      PYM_freeGlobalSnapshot(snapshot);
+      PyErr_SetString(PYM_error, "Getting a property's value failed.");
+      return NULL;
+    }
+
+    PYM_GlobalSnapshotEntry *entry = &snapshot->entries[snapshot->length];
+    PYM_HashEntry *hashEntry = (PYM_HashEntry *)
+      JS_DHashTableOperate(&snapshot->ids, (void *) desc->id, JS_DHASH_ADD);
+    if (hashEntry == NULL) {
+      JS_PutPropertyDescArray(cx, &pda);
+      PYM_freeGlobalSnapshot(snapshot);
+      PyErr_NoMemory();
+      return NULL;
+    }
+
+    if (!PYM_getPropertyAccessors(cx, obj, desc->id, &entry->attrs,
+                                  &entry->getter, &entry->setter)) {
+      JS_PutPropertyDescArray(cx, &pda);
+      PYM_freeGlobalSnapshot(snapshot);
+      PYM_jsExceptionToPython(context);
+      return NULL;
+    }
+
+    hashEntry->base.key = (void *) desc->id;
+    hashEntry->value = entry;
+    entry->id = desc->id;
+    entry->value = desc->value;
+    entry->seen = 0;
+    snapshot->length++;
+  }
+
+  // The snapshot object is created while the property descriptions
+  // are still rooted, since creating it may trigger garbage
+  // collection.
+  JSObject *snapshotObj = JS_NewObject(cx, &PYM_JS_GlobalSnapshotClass,
+                                       NULL, NULL);
+  if (snapshotObj == NULL || !JS_SetPrivate(cx, snapshotObj, snapshot)) {
+    JS_PutPropertyDescArray(cx, &pda);
+    PYM_freeGlobalSnapshot(snapshot);
+    PyErr_SetString(PYM_error, "Creating global snapshot failed");
+    return NULL;
+  }
+
+  JS_PutPropertyDescArray(cx, &pda);
+  return snapshotObj;
+}
+
+// Deletes an own property, even if it's permanent; top-level var
+// statements, for instance, create permanent properties on the global.
+static JSBool
+PYM_removeProperty(JSContext *cx, JSObject *obj, jsval id)
+{
+  jschar buffer[16];
+  const jschar *chars;
+  size_t length;
+  uintN attrs;
+  JSBool found;
+  jsval rval;
+
+  PYM_getPropertyName(id, buffer, &chars, &length);
+
+  if (!JS_GetUCPropertyAttributes(cx, obj, chars, length, &attrs, &found))
+    return JS_FALSE;
+
+  if (found && (attrs & JSPROP_PERMANENT) &&
+      !JS_SetUCPropertyAttributes(cx, obj, chars, length,
+                                  attrs & ~JSPROP_PERMANENT, &found))
+    return JS_FALSE;
+
+  if (JSVAL_IS_INT(id))
+    return JS_DeleteElement2(cx, obj, JSVAL_TO_INT(id), &rval);
+
+  return JS_DeleteUCProperty2(cx, obj, chars, length, &rval);
+}
+
+static JSBool
+PYM_restoreProperty(JSContext *cx, JSObject *obj,
+                    PYM_GlobalSnapshotEntry *entry)
+{
+  // Accessor properties don't hold a value of their own.
+  jsval value = entry->value;
+  if (entry->attrs & (JSPROP_GETTER | JSPROP_SETTER))
+    value = JSVAL_VOID;
+
+  if (JSVAL_IS_INT(entry->id))
+    return JS_DefineElement(cx, obj, JSVAL_TO_INT(entry->id), value,
+                            entry->getter, entry->setter, entry->attrs);
+
+  JSString *name = JSVAL_TO_STRING(entry->id);
+  return JS_DefineUCProperty(cx, obj, JS_GetStringChars(name),
+                             JS_GetStringLength(name), value,
+                             entry->getter, entry->setter, entry->attrs);
+}
+
+// Returns whether the given property is unchanged since the snapshot
+// entry was recorded. The values of accessor properties are whatever
+// their getters return, so only the accessors themselves are compared.
+static JSBool
+PYM_isPropertyUnchanged(JSContext *cx, JSObject *obj, JSPropertyDesc *desc,
+                        PYM_GlobalSnapshotEntry *entry, JSBool *unchanged)
+{
+  uintN attrs;
+  JSPropertyOp getter;
+  JSPropertyOp setter;
+
+  if (!PYM_getPropertyAccessors(cx, obj, desc->id, &attrs, &getter,
+                                &setter))
+    return JS_FALSE;
+
+  *unchanged = (attrs == entry->attrs &&
+                getter == entry->getter &&
+                setter == entry->setter &&
+                ((attrs & (JSPROP_GETTER | JSPROP_SETTER)) ||
+                 desc->value == entry->value));
+  return JS_TRUE;
+}
+
+int
+PYM_resetGlobal(PYM_JSContextObject *context, JSObject *obj,
+                JSObject *snapshotObj)
+{
+  JSContext *cx = context->cx;
+  PYM_GlobalSnapshot *snapshot = (PYM_GlobalSnapshot *)
+    JS_GetPrivate(cx, snapshotObj);
+
+  if (snapshot->target != obj) {
+    PyErr_SetString(PyExc_ValueError,
+                    "Snapshot was taken of a different object.");
+    return -1;
+  }
+
+  JSPropertyDescArray pda;
+  if (!JS_GetPropertyDescArray(cx, obj, &pda)) {
+    PYM_jsExceptionToPython(context);
+    return -1;
+  }
+
+  // Each snapshot entry that's found unchanged is marked with this
+  // reset's generation, so that the rest can be restored afterwards
+  // without any extra bookkeeping.
+  unsigned long generation = ++snapshot->generation;
+  JSBool ok = JS_TRUE;
+
+  for (uint32 i = 0; ok && i < pda.length; i++) {
+    JSPropertyDesc *desc = &pda.array[i];
+    PYM_HashEntry *hashEntry = (PYM_HashEntry *)
+      JS_DHashTableOperate(&snapshot->ids, (void *) desc->id,
+                           JS_DHASH_LOOKUP);
+
+    if (JS_DHASH_ENTRY_IS_BUSY((JSDHashEntryHdr *) hashEntry)) {
+      PYM_GlobalSnapshotEntry *entry = (PYM_GlobalSnapshotEntry *)
+        hashEntry->value;
+      JSBool unchanged;
+      ok = PYM_isPropertyUnchanged(cx, obj, desc, entry, &unchanged);
+      if (!ok)
+        break;
+      if (unchanged) {
+        entry->seen = generation;
+        continue;
+      }
+    }
+
+    // The property was either added or changed since the snapshot was
+    // taken; if it was changed, it's restored below.
+    ok = PYM_removeProperty(cx, obj, desc->id);
+  }
+
+  for (uint32 i = 0; ok && i < snapshot->length; i++)
+    if (snapshot->entries[i].seen != generation)
+      ok = PYM_restoreProperty(cx, obj, &snapshot->entries[i]);
+
+  JS_PutPropertyDescArray(cx, &pda);
+
+  if (!ok) {
+    PYM_jsExceptionToPython(context);
+    return -1;
+  }
+
+  return 0;
+}
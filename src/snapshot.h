@@ -0,0 +1,84 @@
+/* ***** BEGIN LICENSE BLOCK *****
+ * Version: MPL 1.1/GPL 2.0/LGPL 2.1
+ *
+ * The contents of this file are subject to the Mozilla Public License Version
+ * 1.1 (the "License"); you may not use this file except in compliance with
+ * the License. You may obtain a copy of the License at
+ * http://www.mozilla.org/MPL/
+ *
+ * Software distributed under the License is distributed on an "AS IS" basis,
+ * WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+ * for the specific language governing rights and limitations under the
+ * License.
+ *
+ * The Original Code is Pydermonkey.
+ *
+ * The Initial Developer of the Original Code is Mozilla.
+ * Portions created by the Initial Developer are Copyright (C) 2007
+ * the Initial Developer. All Rights Reserved.
+ *
+ * Contributor(s):
+ *   Atul Varma <atul@mozilla.com>
+ *
+ * Alternatively, the contents of this file may be used under the terms of
+ * either the GNU General Public License Version 2 or later (the "GPL"), or
+ * the GNU Lesser General Public License Version 2.1 or later (the "LGPL"),
+ * in which case the provisions of the GPL or the LGPL are applicable instead
+ * of those above. If you wish to allow use of your version of this file only
+ * under the terms of either the GPL or the LGPL, and not to allow others to
+ * use your version of this file under the terms of the MPL, indicate your
+ * decision by deleting the provisions above and replace them with the notice
+ * and other provisions required by the GPL or the LGPL. If you do not delete
+ * the provisions above, a recipient may use your version of this file under
+ * the terms of any one of the MPL, the GPL or the LGPL.
+ *
+ * ***** END LICENSE BLOCK ***** */
+
+
+#ifndef PYM_SNAPSHOT_H
+#define PYM_SNAPSHOT_H
+
+#include "context.h"
+
+#include <jsapi.h>
+#include <jsdhash.h>
+#include <Python.h>
+
+// One own property of an object at the time it was snapshotted. If
+// attrs has JSPROP_GETTER or JSPROP_SETTER set, the corresponding
+// getter or setter is really a JSObject *.
+typedef struct {
+  jsval id;
+  jsval value;
+  uintN attrs;
+  JSPropertyOp getter;
+  JSPropertyOp setter;
+  unsigned long seen;
+} PYM_GlobalSnapshotEntry;
+
+// The private data of a global snapshot: the object it was taken of,
+// and that object's own properties, indexed by id. Everything in here
+// is traced by the snapshot's JS object, so it stays alive for as long
+// as the snapshot does.
+typedef struct {
+  JSObject *target;
+  uint32 length;
+  PYM_GlobalSnapshotEntry *entries;
+  JSDHashTable ids;
+  unsigned long generation;
+} PYM_GlobalSnapshot;
+
+extern JSClass PYM_JS_GlobalSnapshotClass;
+
+// Creates a JS object holding a snapshot of the given object's own
+// properties. Returns NULL and sets a Python exception on failure.
+extern JSObject *
+PYM_snapshotGlobal(PYM_JSContextObject *context, JSObject *obj);
+
+// Restores the given object's own properties to those in the given
+// snapshot. Returns -1 and sets a Python exception on failure.
+extern int
+PYM_resetGlobal(PYM_JSContextObject *context, JSObject *obj,
+                JSObject *snapshotObj);
+
+#endif
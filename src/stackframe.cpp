@@ -0,0 +1,296 @@
+/* ***** BEGIN LICENSE BLOCK *****
+ * Version: MPL 1.1/GPL 2.0/LGPL 2.1
+ *
+ * The contents of this file are subject to the Mozilla Public License Version
+ * 1.1 (the "License"); you may not use this file except in compliance with
+ * the License. You may obtain a copy of the License at
+ * http://www.mozilla.org/MPL/
+ *
+ * Software distributed under the License is distributed on an "AS IS" basis,
+ * WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+ * for the specific language governing rights and limitations under the
+ * License.
+ *
+ * The Original Code is Pydermonkey.
+ *
+ * The Initial Developer of the Original Code is Mozilla.
+ * Portions created by the Initial Developer are Copyright (C) 2007
+ * the Initial Developer. All Rights Reserved.
+ *
+ * Contributor(s):
+ *   Atul Varma <atul@mozilla.com>
+ *
+ * Alternatively, the contents of this file may be used under the terms of
+ * either the GNU General Public License Version 2 or later (the "GPL"), or
+ * the GNU Lesser General Public License Version 2.1 or later (the "LGPL"),
+ * in which case the provisions of the GPL or the LGPL are applicable instead
+ * of those above. If you wish to allow use of your version of this file only
+ * under the terms of either the GPL or the LGPL, and not to allow others to
+ * use your version of this file under the terms of the MPL, indicate your
+ * decision by deleting the provisions above and replace them with the notice
+ * and other provisions required by the GPL or the LGPL. If you do not delete
+ * the provisions above, a recipient may use your version of this file under
+ * the terms of any one of the MPL, the GPL or the LGPL.
+ *
+ * ***** END LICENSE BLOCK ***** */
+
+
+#include "stackframe.h"
+#include "script.h"
+#include "utils.h"
+
+#include "structmember.h"
+#include "jsdbgapi.h"
+#include "jsscript.h"
+
+static PyObject *
+PYM_getLineno(PYM_StackFrameObject *self, void *closure)
+{
+  if (self->lineno == NULL) {
+    if (self->script == NULL) {
+      self->lineno = Py_None;
+      Py_INCREF(self->lineno);
+    } else {
+      if (self->context == NULL || self->context->cx == NULL) {
+        PyErr_SetString(PYM_error, "Frame's context has been destroyed.");
+        return NULL;
+      }
+      PYM_SANITY_CHECK(self->context->runtime);
+      self->lineno = PyInt_FromLong(
+        JS_PCToLineNumber(self->context->cx, self->script, self->pc)
+        );
+      if (self->lineno == NULL)
+        return NULL;
+    }
+  }
+
+  Py_INCREF(self->lineno);
+  return self->lineno;
+}
+
+static PyObject *
+PYM_getScript(PYM_StackFrameObject *self, void *closure)
+{
+  if (self->pyScript == NULL) {
+    PyObject *pyScript = Py_None;
+
+    if (self->holder && !self->holderIsFunction)
+      pyScript = (PyObject *) self->holder;
+    else if (self->script && JS_GetScriptObject(self->script)) {
+      // See the comment in PYM_getStack() for why only scripts that
+      // already have an object are exposed.
+      if (self->context == NULL || self->context->cx == NULL) {
+        PyErr_SetString(PYM_error, "Frame's context has been destroyed.");
+        return NULL;
+      }
+      PYM_SANITY_CHECK(self->context->runtime);
+      pyScript = (PyObject *) PYM_newJSScript(self->context, self->script);
+      if (pyScript == NULL)
+        return NULL;
+      self->pyScript = pyScript;
+    }
+
+    if (self->pyScript == NULL) {
+      Py_INCREF(pyScript);
+      self->pyScript = pyScript;
+    }
+  }
+
+  Py_INCREF(self->pyScript);
+  return self->pyScript;
+}
+
+static PyObject *
+PYM_getFunction(PYM_StackFrameObject *self, void *closure)
+{
+  PyObject *function = Py_None;
+  if (self->holder && self->holderIsFunction)
+    function = (PyObject *) self->holder;
+  Py_INCREF(function);
+  return function;
+}
+
+static PyMemberDef PYM_members[] = {
+  {(char *) "filename", T_OBJECT, offsetof(PYM_StackFrameObject, filename),
+   READONLY, (char *) "Filename of the frame's script."},
+  {(char *) "function_name", T_OBJECT,
+   offsetof(PYM_StackFrameObject, functionName), READONLY,
+   (char *) "Name of the frame's function."},
+  {(char *) "pc", T_UINT, offsetof(PYM_StackFrameObject, pcOffset),
+   READONLY, (char *) "Bytecode offset into the frame's script."},
+  {NULL, 0, 0, 0, NULL}
+};
+
+static PyGetSetDef PYM_getSets[] = {
+  {(char *) "lineno", (getter) PYM_getLineno, NULL,
+   (char *) "Line number of the frame, computed on first access.", NULL},
+  {(char *) "script", (getter) PYM_getScript, NULL,
+   (char *) "Script of the frame, computed on first access.", NULL},
+  {(char *) "function", (getter) PYM_getFunction, NULL,
+   (char *) "Function in which the frame is executing.", NULL},
+  {NULL, NULL, NULL, NULL, NULL}
+};
+
+static int
+PYM_traverse(PYM_StackFrameObject *self, visitproc visit, void *arg)
+{
+  Py_VISIT(self->context);
+  Py_VISIT(self->holder);
+  Py_VISIT(self->pyScript);
+  return 0;
+}
+
+static int
+PYM_clear(PYM_StackFrameObject *self)
+{
+  Py_CLEAR(self->context);
+  return 0;
+}
+
+static void
+PYM_dealloc(PYM_StackFrameObject *self)
+{
+  PyObject_GC_UnTrack((PyObject *) self);
+  Py_CLEAR(self->context);
+  Py_CLEAR(self->holder);
+  Py_CLEAR(self->filename);
+  Py_CLEAR(self->functionName);
+  Py_CLEAR(self->lineno);
+  Py_CLEAR(self->pyScript);
+  PyObject_GC_Del(self);
+}
+
+PyTypeObject PYM_StackFrameType = {
+  PyObject_HEAD_INIT(NULL)
+  0,                           /*ob_size*/
+  "pydermonkey.StackFrame",    /*tp_name*/
+  sizeof(PYM_StackFrameObject), /*tp_basicsize*/
+  0,                           /*tp_itemsize*/
+  (destructor) PYM_dealloc,    /*tp_dealloc*/
+  0,                           /*tp_print*/
+  0,                           /*tp_getattr*/
+  0,                           /*tp_setattr*/
+  0,                           /*tp_compare*/
+  0,                           /*tp_repr*/
+  0,                           /*tp_as_number*/
+  0,                           /*tp_as_sequence*/
+  0,                           /*tp_as_mapping*/
+  0,                           /*tp_hash */
+  0,                           /*tp_call*/
+  0,                           /*tp_str*/
+  0,                           /*tp_getattro*/
+  0,                           /*tp_setattro*/
+  0,                           /*tp_as_buffer*/
+                               /*tp_flags*/
+  Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,
+                               /* tp_doc */
+  "A frame of a JavaScript stack.",
+  (traverseproc) PYM_traverse, /* tp_traverse */
+  (inquiry) PYM_clear,         /* tp_clear */
+  0,                           /* tp_richcompare */
+  0,                           /* tp_weaklistoffset */
+  0,                           /* tp_iter */
+  0,                           /* tp_iternext */
+  0,                           /* tp_methods */
+  PYM_members,                 /* tp_members */
+  PYM_getSets,                 /* tp_getset */
+  0,                           /* tp_base */
+  0,                           /* tp_dict */
+  0,                           /* tp_descr_get */
+  0,                           /* tp_descr_set */
+  0,                           /* tp_dictoffset */
+  0,                           /* tp_init */
+  0,                           /* tp_alloc */
+  0,                           /* tp_new */
+};
+
+PyObject *
+PYM_newStackFrame(PYM_JSContextObject *context, JSStackFrame *frame,
+                  bool resolve)
+{
+  JSContext *cx = context->cx;
+  JSScript *script = JS_GetFrameScript(cx, frame);
+  JSFunction *fun = JS_GetFrameFunction(cx, frame);
+  JSObject *funObj = JS_GetFrameFunctionObject(cx, frame);
+  const char *filename = NULL;
+  const char *name = NULL;
+
+  PYM_StackFrameObject *self = PyObject_GC_New(PYM_StackFrameObject,
+                                               &PYM_StackFrameType);
+  if (self == NULL)
+    return NULL;
+
+  Py_INCREF(context);
+  self->context = context;
+  self->holder = NULL;
+  self->holderIsFunction = 0;
+  self->script = NULL;
+  self->pc = NULL;
+  self->pcOffset = 0;
+  self->filename = NULL;
+  self->functionName = NULL;
+  self->lineno = NULL;
+  self->pyScript = NULL;
+  PyObject_GC_Track((PyObject *) self);
+
+  if (script) {
+    filename = JS_GetScriptFilename(cx, script);
+    self->pc = JS_GetFramePC(cx, frame);
+    self->pcOffset = self->pc - script->code;
+  }
+
+  if (fun) {
+    JSString *id = JS_GetFunctionId(fun);
+    if (id)
+      name = JS_GetStringBytes(id);
+  }
+
+  self->filename = Py_BuildValue("z", filename);
+  self->functionName = Py_BuildValue("z", name);
+  if (self->filename == NULL || self->functionName == NULL) {
+    Py_DECREF(self);
+    return NULL;
+  }
+
+  // The frame's script lives as long as its function object, or its
+  // script object if it has one, so a wrapper for either keeps it
+  // around until the line number is asked for.
+  if (funObj) {
+    self->holder = PYM_newJSObject(context, funObj, NULL);
+    self->holderIsFunction = 1;
+  } else if (script && JS_GetScriptObject(script))
+    self->holder = (PYM_JSObject *) PYM_newJSScript(context, script);
+
+  if ((funObj || (script && JS_GetScriptObject(script))) &&
+      self->holder == NULL) {
+    Py_DECREF(self);
+    return NULL;
+  }
+
+  self->script = script;
+
+  // Scripts that nothing can keep alive, such as the ones compiled by
+  // Context.evaluate_script(), have their line number computed now.
+  if (resolve || (script && self->holder == NULL)) {
+    PyObject *lineno = PYM_getLineno(self, NULL);
+    if (lineno == NULL) {
+      Py_DECREF(self);
+      return NULL;
+    }
+    Py_DECREF(lineno);
+  }
+
+  if (script && self->holder == NULL)
+    self->script = NULL;
+
+  if (resolve) {
+    PyObject *pyScript = PYM_getScript(self, NULL);
+    if (pyScript == NULL) {
+      Py_DECREF(self);
+      return NULL;
+    }
+    Py_DECREF(pyScript);
+  }
+
+  return (PyObject *) self;
+}
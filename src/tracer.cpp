@@ -0,0 +1,261 @@
+/* ***** BEGIN LICENSE BLOCK *****
+ * Version: MPL 1.1/GPL 2.0/LGPL 2.1
+ *
+ * The contents of this file are subject to the Mozilla Public License Version
+ * 1.1 (the "License"); you may not use this file except in compliance with
+ * the License. You may obtain a copy of the License at
+ * http://www.mozilla.org/MPL/
+ *
+ * Software distributed under the License is distributed on an "AS IS" basis,
+ * WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+ * for the specific language governing rights and limitations under the
+ * License.
+ *
+ * The Original Code is Pydermonkey.
+ *
+ * The Initial Developer of the Original Code is Mozilla.
+ * Portions created by the Initial Developer are Copyright (C) 2007
+ * the Initial Developer. All Rights Reserved.
+ *
+ * Contributor(s):
+ *   Atul Varma <atul@mozilla.com>
+ *
+ * Alternatively, the contents of this file may be used under the terms of
+ * either the GNU General Public License Version 2 or later (the "GPL"), or
+ * the GNU Lesser General Public License Version 2.1 or later (the "LGPL"),
+ * in which case the provisions of the GPL or the LGPL are applicable instead
+ * of those above. If you wish to allow use of your version of this file only
+ * under the terms of either the GPL or the LGPL, and not to allow others to
+ * use your version of this file under the terms of the MPL, indicate your
+ * decision by deleting the provisions above and replace them with the notice
+ * and other provisions required by the GPL or the LGPL. If you do not delete
+ * the provisions above, a recipient may use your version of this file under
+ * the terms of any one of the MPL, the GPL or the LGPL.
+ *
+ * ***** END LICENSE BLOCK ***** */
+
+
+#include "tracer.h"
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#ifdef XP_WIN
+#include <windows.h>
+#else
+#include <unistd.h>
+#endif
+
+PYM_Tracer *
+PYM_newTracer(unsigned int capacity)
+{
+  if (capacity == 0) {
+    PyErr_SetString(PyExc_ValueError, "Capacity must be at least 1.");
+    return NULL;
+  }
+
+  PYM_Tracer *tracer = (PYM_Tracer *) calloc(1, sizeof(PYM_Tracer));
+  if (tracer == NULL) {
+    PyErr_NoMemory();
+    return NULL;
+  }
+
+  tracer->events = (PYM_TraceEvent *) malloc(sizeof(PYM_TraceEvent) *
+                                             capacity);
+  if (tracer->events == NULL) {
+    free(tracer);
+    PyErr_NoMemory();
+    return NULL;
+  }
+
+  tracer->capacity = capacity;
+  tracer->startTime = PYM_getWallTime();
+  return tracer;
+}
+
+void
+PYM_freeTracer(PYM_Tracer *tracer)
+{
+  free(tracer->events);
+  free(tracer);
+}
+
+void
+PYM_recordTraceEvent(PYM_Tracer *tracer, const char *category,
+                     const char *name, const char *detail,
+                     double startTime, double duration)
+{
+  PYM_TraceEvent *event = &tracer->events[tracer->next];
+
+  event->category = category;
+  if (detail)
+    snprintf(event->name, PYM_TRACE_NAME_SIZE, "%s %s", name, detail);
+  else
+    snprintf(event->name, PYM_TRACE_NAME_SIZE, "%s", name);
+  event->startTime = startTime;
+  event->duration = duration;
+
+  tracer->recorded++;
+  if (++tracer->next == tracer->capacity)
+    tracer->next = 0;
+}
+
+void
+PYM_copyTraceDetail(char *buffer, size_t size, const jschar *chars,
+                    size_t length)
+{
+  size_t pos = 0;
+
+  for (size_t i = 0; i < length; i++) {
+    unsigned long c = chars[i];
+    if (c >= 0xD800 && c <= 0xDBFF && i + 1 < length &&
+        chars[i + 1] >= 0xDC00 && chars[i + 1] <= 0xDFFF) {
+      c = 0x10000 + ((c - 0xD800) << 10) + (chars[i + 1] - 0xDC00);
+      i++;
+    } else if (c >= 0xD800 && c <= 0xDFFF)
+      c = '?';
+
+    char encoded[4];
+    size_t encodedLength;
+    if (c < 0x80) {
+      encoded[0] = (char) c;
+      encodedLength = 1;
+    } else if (c < 0x800) {
+      encoded[0] = (char) (0xC0 | (c >> 6));
+      encoded[1] = (char) (0x80 | (c & 0x3F));
+      encodedLength = 2;
+    } else if (c < 0x10000) {
+      encoded[0] = (char) (0xE0 | (c >> 12));
+      encoded[1] = (char) (0x80 | ((c >> 6) & 0x3F));
+      encoded[2] = (char) (0x80 | (c & 0x3F));
+      encodedLength = 3;
+    } else {
+      encoded[0] = (char) (0xF0 | (c >> 18));
+      encoded[1] = (char) (0x80 | ((c >> 12) & 0x3F));
+      encoded[2] = (char) (0x80 | ((c >> 6) & 0x3F));
+      encoded[3] = (char) (0x80 | (c & 0x3F));
+      encodedLength = 4;
+    }
+
+    if (pos + encodedLength >= size)
+      break;
+    memcpy(buffer + pos, encoded, encodedLength);
+    pos += encodedLength;
+  }
+
+  buffer[pos] = '\0';
+}
+
+static long
+PYM_getProcessId()
+{
+#ifdef XP_WIN
+  return (long) GetCurrentProcessId();
+#else
+  return (long) getpid();
+#endif
+}
+
+PyObject *
+PYM_getTraceEvents(PYM_Tracer *tracer, long thread)
+{
+  unsigned int count = tracer->capacity;
+  unsigned int first = tracer->next;
+  if (tracer->recorded < tracer->capacity) {
+    count = tracer->next;
+    first = 0;
+  }
+
+  PyObject *events = PyList_New(count);
+  if (events == NULL)
+    return NULL;
+
+  long pid = PYM_getProcessId();
+
+  for (unsigned int i = 0; i < count; i++) {
+    PYM_TraceEvent *event = &tracer->events[(first + i) % tracer->capacity];
+
+    // Names may contain anything from script filenames to JS function
+    // names, so they're decoded leniently.
+    PyObject *name = PyUnicode_DecodeUTF8(event->name, strlen(event->name),
+                                          "replace");
+    if (name == NULL) {
+      Py_DECREF(events);
+      return NULL;
+    }
+
+    // Timestamps and durations are in microseconds, relative to when
+    // tracing started.
+    PyObject *item = Py_BuildValue(
+      "{sNsssssdsdslsl}",
+      "name", name,
+      "cat", event->category,
+      "ph", "X",
+      "ts", (event->startTime - tracer->startTime) * 1e6,
+      "dur", event->duration * 1e6,
+      "pid", pid,
+      "tid", thread
+      );
+    if (item == NULL) {
+      Py_DECREF(events);
+      return NULL;
+    }
+    PyList_SET_ITEM(events, i, item);
+  }
+
+  return events;
+}
+
+int
+PYM_dumpTrace(PYM_Tracer *tracer, long thread, const char *path)
+{
+  PyObject *events = PYM_getTraceEvents(tracer, thread);
+  if (events == NULL)
+    return -1;
+
+  PyObject *trace = Py_BuildValue("{sNss}",
+                                  "traceEvents", events,
+                                  "displayTimeUnit", "ms");
+  if (trace == NULL)
+    return -1;
+
+  PyObject *jsonModule = PyImport_ImportModule("json");
+  if (jsonModule == NULL) {
+    Py_DECREF(trace);
+    return -1;
+  }
+
+  PyObject *file = PyFile_FromString((char *) path, "w");
+  if (file == NULL) {
+    Py_DECREF(jsonModule);
+    Py_DECREF(trace);
+    return -1;
+  }
+
+  PyObject *result = PyObject_CallMethod(jsonModule, "dump", "OO",
+                                         trace, file);
+  Py_DECREF(jsonModule);
+  Py_DECREF(trace);
+
+  // The file is closed even if writing failed, without clobbering
+  // the exception that caused the failure.
+  if (result == NULL) {
+    PyObject *type;
+    PyObject *value;
+    PyObject *traceback;
+    PyErr_Fetch(&type, &value, &traceback);
+    Py_XDECREF(PyObject_CallMethod(file, "close", NULL));
+    PyErr_Restore(type, value, traceback);
+    Py_DECREF(file);
+    return -1;
+  }
+  Py_DECREF(result);
+
+  PyObject *closed = PyObject_CallMethod(file, "close", NULL);
+  Py_DECREF(file);
+  if (closed == NULL)
+    return -1;
+  Py_DECREF(closed);
+  return 0;
+}
@@ -0,0 +1,173 @@
+/* ***** BEGIN LICENSE BLOCK *****
+ * Version: MPL 1.1/GPL 2.0/LGPL 2.1
+ *
+ * The contents of this file are subject to the Mozilla Public License Version
+ * 1.1 (the "License"); you may not use this file except in compliance with
+ * the License. You may obtain a copy of the License at
+ * http://www.mozilla.org/MPL/
+ *
+ * Software distributed under the License is distributed on an "AS IS" basis,
+ * WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+ * for the specific language governing rights and limitations under the
+ * License.
+ *
+ * The Original Code is Pydermonkey.
+ *
+ * The Initial Developer of the Original Code is Mozilla.
+ * Portions created by the Initial Developer are Copyright (C) 2007
+ * the Initial Developer. All Rights Reserved.
+ *
+ * Contributor(s):
+ *   Atul Varma <atul@mozilla.com>
+ *
+ * Alternatively, the contents of this file may be used under the terms of
+ * either the GNU General Public License Version 2 or later (the "GPL"), or
+ * the GNU Lesser General Public License Version 2.1 or later (the "LGPL"),
+ * in which case the provisions of the GPL or the LGPL are applicable instead
+ * of those above. If you wish to allow use of your version of this file only
+ * under the terms of either the GPL or the LGPL, and not to allow others to
+ * use your version of this file under the terms of the MPL, indicate your
+ * decision by deleting the provisions above and replace them with the notice
+ * and other provisions required by the GPL or the LGPL. If you do not delete
+ * the provisions above, a recipient may use your version of this file under
+ * the terms of any one of the MPL, the GPL or the LGPL.
+ *
+ * ***** END LICENSE BLOCK ***** */
+
+
+#ifndef PYM_TRACER_H
+#define PYM_TRACER_H
+
+#include "runtime.h"
+#include "utils.h"
+
+#include <jsapi.h>
+#include <Python.h>
+#include <string.h>
+
+// Maximum length of an event's name, including its detail, in bytes.
+#define PYM_TRACE_NAME_SIZE 96
+
+// Number of events a tracer holds if no other capacity is given.
+#define PYM_DEFAULT_TRACE_CAPACITY 65536
+
+// One completed span of time, such as a call from Python into JS or
+// a garbage collection.
+typedef struct {
+  const char *category;
+  char name[PYM_TRACE_NAME_SIZE];
+  double startTime;
+  double duration;
+} PYM_TraceEvent;
+
+// A fixed-size ring buffer of events for a single runtime. Once it's
+// full, each new event overwrites the oldest one. Events are recorded
+// while JS code may be running, and therefore without the GIL, so
+// nothing in here may be touched through the Python C API; since a
+// runtime is only ever used from one thread, no locking is needed.
+typedef struct PYM_Tracer {
+  PYM_TraceEvent *events;
+  unsigned int capacity;
+  unsigned int next;
+  unsigned long recorded;
+  double startTime;
+} PYM_Tracer;
+
+// Creates a tracer that holds up to the given number of events.
+// Returns NULL and sets a Python exception on failure.
+extern PYM_Tracer *
+PYM_newTracer(unsigned int capacity);
+
+extern void
+PYM_freeTracer(PYM_Tracer *tracer);
+
+// Records a completed event. If detail isn't NULL, it's appended to
+// the event's name, which is truncated if necessary.
+extern void
+PYM_recordTraceEvent(PYM_Tracer *tracer, const char *category,
+                     const char *name, const char *detail,
+                     double startTime, double duration);
+
+// Returns a new list of the recorded events, oldest first, as
+// dictionaries in the Chrome trace event format.
+extern PyObject *
+PYM_getTraceEvents(PYM_Tracer *tracer, long thread);
+
+// Writes the recorded events to the given path as a Chrome trace
+// event JSON file. Returns -1 and sets a Python exception on failure.
+extern int
+PYM_dumpTrace(PYM_Tracer *tracer, long thread, const char *path);
+
+// Copies the given UTF-16 string into buffer as a NUL-terminated UTF-8
+// string, truncating it on a character boundary if necessary. This
+// doesn't allocate, so it's safe to call without the GIL.
+extern void
+PYM_copyTraceDetail(char *buffer, size_t size, const jschar *chars,
+                    size_t length);
+
+// Simple class that records an event covering the time it's in scope,
+// if the runtime is being traced. The tracer is looked up again when
+// the event ends, since it may have been stopped in the meantime. The
+// event's detail is copied as soon as it's set, since whatever it came
+// from, such as a JS string, may be collected before the event ends.
+class PYM_AutoTraceEvent {
+public:
+  PYM_AutoTraceEvent(PYM_JSRuntimeObject *runtime, const char *category,
+                     const char *name) :
+    runtime(runtime), category(category), name(name), startTime(0.0) {
+    detail[0] = '\0';
+    if (runtime->tracer)
+      startTime = PYM_getWallTime();
+  }
+
+  ~PYM_AutoTraceEvent() {
+    if (startTime != 0.0 && runtime->tracer)
+      PYM_recordTraceEvent(runtime->tracer, category, name,
+                           detail[0] ? detail : NULL,
+                           startTime, PYM_getWallTime() - startTime);
+  }
+
+  // Whether the event will be recorded, so that callers can avoid
+  // working out its detail otherwise.
+  bool isRecording() {
+    return startTime != 0.0;
+  }
+
+  // Sets a detail, such as a filename, to append to the event's name.
+  void setDetail(const char *newDetail) {
+    if (isRecording() && newDetail) {
+      strncpy(detail, newDetail, PYM_TRACE_NAME_SIZE - 1);
+      detail[PYM_TRACE_NAME_SIZE - 1] = '\0';
+    }
+  }
+
+  // Sets the detail to the name of the given JS function, if it has
+  // one.
+  void setFunctionDetail(JSFunction *fun) {
+    if (isRecording()) {
+      JSString *id = JS_GetFunctionId(fun);
+      if (id)
+        setStringDetail(id);
+    }
+  }
+
+  // Sets the detail to the given property name, if it's a string.
+  void setPropertyDetail(jsval property) {
+    if (isRecording() && JSVAL_IS_STRING(property))
+      setStringDetail(JSVAL_TO_STRING(property));
+  }
+
+protected:
+  void setStringDetail(JSString *str) {
+    PYM_copyTraceDetail(detail, PYM_TRACE_NAME_SIZE, JS_GetStringChars(str),
+                        JS_GetStringLength(str));
+  }
+
+  PYM_JSRuntimeObject *runtime;
+  const char *category;
+  const char *name;
+  char detail[PYM_TRACE_NAME_SIZE];
+  double startTime;
+};
+
+#endif
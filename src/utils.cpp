@@ -37,9 +37,97 @@
 #include "utils.h"
 #include "undefined.h"
 #include "object.h"
+#include "scripterror.h"
+
+#ifdef XP_WIN
+#include <windows.h>
+#else
+#include <time.h>
+#include <sys/time.h>
+#include <sys/resource.h>
+#include <unistd.h>
+#endif
 
 PyObject *PYM_error;
 PyObject *PYM_scriptError;
+PyObject *PYM_budgetExceededError;
+PyObject *PYM_memoryLimitError;
+
+double
+PYM_getWallTime()
+{
+#ifdef XP_WIN
+  LARGE_INTEGER frequency;
+  LARGE_INTEGER counter;
+  QueryPerformanceFrequency(&frequency);
+  QueryPerformanceCounter(&counter);
+  return (double) counter.QuadPart / (double) frequency.QuadPart;
+#elif defined(CLOCK_MONOTONIC)
+  struct timespec ts;
+  clock_gettime(CLOCK_MONOTONIC, &ts);
+  return ts.tv_sec + ts.tv_nsec / 1e9;
+#else
+  struct timeval tv;
+  gettimeofday(&tv, NULL);
+  return tv.tv_sec + tv.tv_usec / 1e6;
+#endif
+}
+
+double
+PYM_getEpochTime()
+{
+#ifdef XP_WIN
+  FILETIME now;
+  GetSystemTimeAsFileTime(&now);
+  ULARGE_INTEGER t;
+  t.LowPart = now.dwLowDateTime;
+  t.HighPart = now.dwHighDateTime;
+  // FILETIME values are in 100-nanosecond units since 1601.
+  return t.QuadPart / 1e7 - 11644473600.0;
+#else
+  struct timeval tv;
+  gettimeofday(&tv, NULL);
+  return tv.tv_sec + tv.tv_usec / 1e6;
+#endif
+}
+
+void
+PYM_sleepMilliseconds(unsigned int interval)
+{
+#ifdef XP_WIN
+  Sleep(interval);
+#else
+  usleep(interval * 1000);
+#endif
+}
+
+double
+PYM_getThreadCPUTime()
+{
+#ifdef XP_WIN
+  FILETIME creation, exit, kernel, user;
+  if (!GetThreadTimes(GetCurrentThread(), &creation, &exit, &kernel, &user))
+    return 0.0;
+  ULARGE_INTEGER k, u;
+  k.LowPart = kernel.dwLowDateTime;
+  k.HighPart = kernel.dwHighDateTime;
+  u.LowPart = user.dwLowDateTime;
+  u.HighPart = user.dwHighDateTime;
+  // FILETIME values are in 100-nanosecond units.
+  return (k.QuadPart + u.QuadPart) / 1e7;
+#elif defined(CLOCK_THREAD_CPUTIME_ID)
+  struct timespec ts;
+  clock_gettime(CLOCK_THREAD_CPUTIME_ID, &ts);
+  return ts.tv_sec + ts.tv_nsec / 1e9;
+#else
+  // No per-thread clock on this platform, so fall back to the CPU
+  // time of the whole process.
+  struct rusage usage;
+  getrusage(RUSAGE_SELF, &usage);
+  return (usage.ru_utime.tv_sec + usage.ru_stime.tv_sec +
+          (usage.ru_utime.tv_usec + usage.ru_stime.tv_usec) / 1e6);
+#endif
+}
 
 static int
 PYM_doubleToJsval(PYM_JSContextObject *context,
@@ -60,6 +148,8 @@ PYM_pyObjectToJsval(PYM_JSContextObject *context,
                     PyObject *object,
                     jsval *rval)
 {
+  PYM_RuntimeStats *stats = &context->runtime->stats;
+
   if (PyString_Check(object) || PyUnicode_Check(object)) {
     PyObject *unicode;
     if (PyString_Check(object)) {
@@ -91,11 +181,15 @@ PYM_pyObjectToJsval(PYM_JSContextObject *context,
     }
 
     *rval = STRING_TO_JSVAL(jsString);
+    stats->valuesToJs[PYM_VALUE_STRING]++;
+    stats->stringsTranscoded++;
+    stats->bytesTranscoded += size - 2;
     return 0;
   }
 
   if (PyInt_Check(object)) {
     long number = PyInt_AS_LONG(object);
+    stats->valuesToJs[PYM_VALUE_INT]++;
     if (INT_FITS_IN_JSVAL(number)) {
       *rval = INT_TO_JSVAL(number);
       return 0;
@@ -103,8 +197,10 @@ PYM_pyObjectToJsval(PYM_JSContextObject *context,
       return PYM_doubleToJsval(context, number, rval);
   }
 
-  if (PyFloat_Check(object))
+  if (PyFloat_Check(object)) {
+    stats->valuesToJs[PYM_VALUE_DOUBLE]++;
     return PYM_doubleToJsval(context, PyFloat_AS_DOUBLE(object), rval);
+  }
 
   if (PyObject_TypeCheck(object, &PYM_JSObjectType)) {
     PYM_JSObject *jsObject = (PYM_JSObject *) object;
@@ -116,26 +212,31 @@ PYM_pyObjectToJsval(PYM_JSContextObject *context,
       return -1;
     }
     *rval = OBJECT_TO_JSVAL(jsObject->obj);
+    stats->valuesToJs[PYM_VALUE_OBJECT]++;
     return 0;
   }
 
   if (object == Py_True) {
     *rval = JSVAL_TRUE;
+    stats->valuesToJs[PYM_VALUE_BOOLEAN]++;
     return 0;
   }
 
   if (object == Py_False) {
     *rval = JSVAL_FALSE;
+    stats->valuesToJs[PYM_VALUE_BOOLEAN]++;
     return 0;
   }
 
   if (object == Py_None) {
     *rval = JSVAL_NULL;
+    stats->valuesToJs[PYM_VALUE_NULL]++;
     return 0;
   }
 
   if (object == (PyObject *) PYM_undefined) {
     *rval = JSVAL_VOID;
+    stats->valuesToJs[PYM_VALUE_UNDEFINED]++;
     return 0;
   }
 
@@ -151,48 +252,69 @@ PYM_pyObjectToJsval(PYM_JSContextObject *context,
   return -1;
 }
 
+PyObject *
+PYM_jsStringToPyObject(JSString *str)
+{
+  // Strings in JS are funky: think of them as 16-bit versions of
+  // Python 2.x's 'str' type.  Whether or not they're valid UTF-16
+  // is entirely up to the client code.
+
+  // TODO: Instead of ignoring errors, consider actually treating
+  // the string as a raw character buffer.
+  const char *chars = (const char *) JS_GetStringChars(str);
+  size_t length = JS_GetStringLength(str);
+
+  // We're multiplying length by two since Python wants the number
+  // of bytes, not the number of 16-bit characters.
+  return PyUnicode_DecodeUTF16(chars, length * 2, "ignore", NULL);
+}
+
 PyObject *
 PYM_jsvalToPyObject(PYM_JSContextObject *context,
                     jsval value) {
-  if (JSVAL_IS_INT(value))
+  PYM_RuntimeStats *stats = &context->runtime->stats;
+
+  if (JSVAL_IS_INT(value)) {
+    stats->valuesToPython[PYM_VALUE_INT]++;
     return PyInt_FromLong(JSVAL_TO_INT(value));
+  }
 
   if (JSVAL_IS_DOUBLE(value)) {
+    stats->valuesToPython[PYM_VALUE_DOUBLE]++;
     jsdouble *doubleRef = JSVAL_TO_DOUBLE(value);
     return PyFloat_FromDouble(*doubleRef);
   }
 
-  if (value == JSVAL_FALSE)
+  if (value == JSVAL_FALSE || value == JSVAL_TRUE) {
+    stats->valuesToPython[PYM_VALUE_BOOLEAN]++;
+    if (value == JSVAL_TRUE)
+      Py_RETURN_TRUE;
     Py_RETURN_FALSE;
+  }
 
-  if (value == JSVAL_TRUE)
-    Py_RETURN_TRUE;
-
-  if (JSVAL_IS_NULL(value))
+  if (JSVAL_IS_NULL(value)) {
+    stats->valuesToPython[PYM_VALUE_NULL]++;
     Py_RETURN_NONE;
+  }
 
-  if (JSVAL_IS_VOID(value))
+  if (JSVAL_IS_VOID(value)) {
+    stats->valuesToPython[PYM_VALUE_UNDEFINED]++;
     Py_RETURN_UNDEFINED;
+  }
 
   if (JSVAL_IS_STRING(value)) {
-    // Strings in JS are funky: think of them as 16-bit versions of
-    // Python 2.x's 'str' type.  Whether or not they're valid UTF-16
-    // is entirely up to the client code.
-
-    // TODO: Instead of ignoring errors, consider actually treating
-    // the string as a raw character buffer.
     JSString *str = JSVAL_TO_STRING(value);
-    const char *chars = (const char *) JS_GetStringChars(str);
-    size_t length = JS_GetStringLength(str);
-
-    // We're multiplying length by two since Python wants the number
-    // of bytes, not the number of 16-bit characters.
-    return PyUnicode_DecodeUTF16(chars, length * 2, "ignore", NULL);
+    stats->valuesToPython[PYM_VALUE_STRING]++;
+    stats->stringsTranscoded++;
+    stats->bytesTranscoded += JS_GetStringLength(str) * sizeof(jschar);
+    return PYM_jsStringToPyObject(str);
   }
 
-  if (JSVAL_IS_OBJECT(value))
+  if (JSVAL_IS_OBJECT(value)) {
+    stats->valuesToPython[PYM_VALUE_OBJECT]++;
     return (PyObject *) PYM_newJSObject(context, JSVAL_TO_OBJECT(value),
                                         NULL);
+  }
 
   PyErr_SetString(PyExc_SystemError, "Unknown jsval type.");
   return NULL;
@@ -222,6 +344,11 @@ PYM_pythonExceptionToJs(PYM_JSContextObject *context)
     if (PyTuple_Check(value)) {
       args = value;
       Py_INCREF(args);
+    } else if (PyObject_TypeCheck(value, &PYM_ScriptErrorType)) {
+      // Avoid resolving the message of a lazy ScriptError, since only
+      // the thrown value is needed.
+      args = ((PyBaseExceptionObject *) value)->args;
+      Py_INCREF(args);
     } else {
       // This reference is new.
 
@@ -236,6 +363,7 @@ PYM_pythonExceptionToJs(PYM_JSContextObject *context)
       jsval val;
       if (message && PYM_pyObjectToJsval(context, message, &val) == 0) {
         JS_SetPendingException(context->cx, val);
+        context->runtime->stats.exceptionsToJs++;
         success = true;
       }
     }
@@ -263,37 +391,13 @@ PYM_jsExceptionToPython(PYM_JSContextObject *context)
   jsval val;
   if (JS_GetPendingException(context->cx, &val)) {
     JS_ClearPendingException(context->cx);
+    context->runtime->stats.exceptionsToPython++;
 
-    PyObject *pyStr = NULL;
-    PyObject *tuple = NULL;
-    PyObject *obj = PYM_jsvalToPyObject(context, val);
-    if (obj == NULL) {
-      PyErr_Clear();
-      obj = Py_None;
-      Py_INCREF(obj);
-    }
-
-    JSString *str = NULL;
-
-    Py_BEGIN_ALLOW_THREADS;
-    str = JS_ValueToString(context->cx, val);
-    Py_END_ALLOW_THREADS;
-
-    if (str != NULL)
-      pyStr = PYM_jsvalToPyObject(context, STRING_TO_JSVAL(str));
-    else {
-      JS_ClearPendingException(context->cx);
-      pyStr = PyString_FromString("<string conversion failed>");
-    }
-
-    if (pyStr) {
-      tuple = Py_BuildValue("(OO)", obj, pyStr);
-      if (tuple)
-        PyErr_SetObject(PYM_scriptError, tuple);
+    PyObject *error = PYM_newScriptError(context, val);
+    if (error) {
+      PyErr_SetObject(PYM_scriptError, error);
+      Py_DECREF(error);
     }
-    Py_DECREF(obj);
-    Py_XDECREF(pyStr);
-    Py_XDECREF(tuple);
   } else
     PyErr_SetString(PYM_error, "JS_GetPendingException() failed");
 }
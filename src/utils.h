@@ -80,6 +80,66 @@ protected:
   PyGILState_STATE state;
 };
 
+// Returns the current wall-clock time in seconds, taken from a
+// monotonic clock where one is available.
+extern double
+PYM_getWallTime();
+
+// Returns the CPU time consumed so far by the calling thread, in
+// seconds.
+extern double
+PYM_getThreadCPUTime();
+
+// Returns the current time in seconds since the epoch, as Python's
+// time.time() does.
+extern double
+PYM_getEpochTime();
+
+// Suspends the calling thread for the given number of milliseconds.
+extern void
+PYM_sleepMilliseconds(unsigned int interval);
+
+// Simple class that charges the wall and CPU time spent while it's in
+// scope to the given usage counter.
+class PYM_AutoUsageTimer {
+public:
+  PYM_AutoUsageTimer(PYM_UsageCounter *counter) : counter(counter) {
+    counter->calls++;
+    if (counter->depth++ == 0) {
+      counter->startWallTime = PYM_getWallTime();
+      counter->startCPUTime = PYM_getThreadCPUTime();
+    }
+  }
+
+  ~PYM_AutoUsageTimer() {
+    if (--counter->depth == 0) {
+      counter->wallTime += PYM_getWallTime() - counter->startWallTime;
+      counter->cpuTime += PYM_getThreadCPUTime() - counter->startCPUTime;
+    }
+  }
+
+protected:
+  PYM_UsageCounter *counter;
+};
+
+// Simple class that counts a call to an API and charges the wall time
+// spent while it's in scope to it.
+class PYM_AutoAPITimer {
+public:
+  PYM_AutoAPITimer(PYM_APIStats *stats) : stats(stats) {
+    stats->calls++;
+    startTime = PYM_getWallTime();
+  }
+
+  ~PYM_AutoAPITimer() {
+    stats->time += PYM_getWallTime() - startTime;
+  }
+
+protected:
+  PYM_APIStats *stats;
+  double startTime;
+};
+
 typedef struct {
   JSDHashEntryStub base;
   void *value;
@@ -87,6 +147,8 @@ typedef struct {
 
 extern PyObject *PYM_error;
 extern PyObject *PYM_scriptError;
+extern PyObject *PYM_budgetExceededError;
+extern PyObject *PYM_memoryLimitError;
 
 // Convert a PyObject to a jsval. Returns 0 on success,
 // -1 on error. If an error occurs, a Python exception is
@@ -98,6 +160,12 @@ PYM_pyObjectToJsval(PYM_JSContextObject *context,
                     PyObject *object,
                     jsval *rval);
 
+// Convert a JS string to a Python unicode object, returning a new
+// reference. If this function fails, it sets a Python exception and
+// returns NULL.
+extern PyObject *
+PYM_jsStringToPyObject(JSString *str);
+
 // Convert a jsval to a PyObject, returning a new reference.
 // If this function fails, it sets a Python exception and
 // returns NULL.
@@ -0,0 +1,111 @@
+/* ***** BEGIN LICENSE BLOCK *****
+ * Version: MPL 1.1/GPL 2.0/LGPL 2.1
+ *
+ * The contents of this file are subject to the Mozilla Public License Version
+ * 1.1 (the "License"); you may not use this file except in compliance with
+ * the License. You may obtain a copy of the License at
+ * http://www.mozilla.org/MPL/
+ *
+ * Software distributed under the License is distributed on an "AS IS" basis,
+ * WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+ * for the specific language governing rights and limitations under the
+ * License.
+ *
+ * The Original Code is Pydermonkey.
+ *
+ * The Initial Developer of the Original Code is Mozilla.
+ * Portions created by the Initial Developer are Copyright (C) 2007
+ * the Initial Developer. All Rights Reserved.
+ *
+ * Contributor(s):
+ *   Atul Varma <atul@mozilla.com>
+ *
+ * Alternatively, the contents of this file may be used under the terms of
+ * either the GNU General Public License Version 2 or later (the "GPL"), or
+ * the GNU Lesser General Public License Version 2.1 or later (the "LGPL"),
+ * in which case the provisions of the GPL or the LGPL are applicable instead
+ * of those above. If you wish to allow use of your version of this file only
+ * under the terms of either the GPL or the LGPL, and not to allow others to
+ * use your version of this file under the terms of the MPL, indicate your
+ * decision by deleting the provisions above and replace them with the notice
+ * and other provisions required by the GPL or the LGPL. If you do not delete
+ * the provisions above, a recipient may use your version of this file under
+ * the terms of any one of the MPL, the GPL or the LGPL.
+ *
+ * ***** END LICENSE BLOCK ***** */
+
+
+#include "watchdog.h"
+#include "utils.h"
+
+// This is the body of the watchdog's timer thread. Note that it never
+// touches the Python interpreter, so it doesn't need the GIL.
+static void
+PYM_watchdogThread(void *arg)
+{
+  PYM_Watchdog *watchdog = (PYM_Watchdog *) arg;
+
+  while (watchdog->running) {
+    PYM_sleepMilliseconds(watchdog->interval);
+    if (watchdog->running)
+      JS_TriggerOperationCallback(watchdog->cx);
+  }
+
+  PyThread_release_lock(watchdog->threadDone);
+}
+
+static void
+PYM_destroyWatchdog(PYM_Watchdog *watchdog)
+{
+  if (watchdog->threadDone)
+    PyThread_free_lock(watchdog->threadDone);
+  PyMem_Free(watchdog);
+}
+
+PYM_Watchdog *
+PYM_startWatchdog(JSContext *cx, unsigned int interval)
+{
+  PYM_Watchdog *watchdog = (PYM_Watchdog *) PyMem_Malloc(
+    sizeof(PYM_Watchdog)
+    );
+  if (watchdog == NULL) {
+    PyErr_NoMemory();
+    return NULL;
+  }
+
+  watchdog->cx = cx;
+  watchdog->interval = interval;
+  watchdog->running = 1;
+  watchdog->threadDone = PyThread_allocate_lock();
+
+  if (watchdog->threadDone == NULL) {
+    PYM_destroyWatchdog(watchdog);
+    PyErr_NoMemory();
+    return NULL;
+  }
+
+  // The lock is held for as long as the timer thread is running.
+  PyThread_acquire_lock(watchdog->threadDone, 1);
+
+  if (PyThread_start_new_thread(PYM_watchdogThread, watchdog) == -1) {
+    PyThread_release_lock(watchdog->threadDone);
+    PYM_destroyWatchdog(watchdog);
+    PyErr_SetString(PYM_error, "Couldn't start watchdog thread");
+    return NULL;
+  }
+
+  return watchdog;
+}
+
+void
+PYM_stopWatchdog(PYM_Watchdog *watchdog)
+{
+  watchdog->running = 0;
+
+  Py_BEGIN_ALLOW_THREADS;
+  PyThread_acquire_lock(watchdog->threadDone, 1);
+  Py_END_ALLOW_THREADS;
+  PyThread_release_lock(watchdog->threadDone);
+
+  PYM_destroyWatchdog(watchdog);
+}
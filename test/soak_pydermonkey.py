@@ -0,0 +1,270 @@
+"""
+Soak tests that run each part of the public API many times over and
+fail if memory use keeps growing. Unlike the unit tests, these take a
+long time, so they're run separately:
+
+  python test/soak_pydermonkey.py [SoakTests.testNewObject ...]
+
+Set PYM_SOAK_ITERATIONS to change the number of iterations per test
+(1,000,000 by default; tests of expensive operations run fewer).
+
+After a warm-up round, the following are tracked across the remaining
+rounds of each test:
+
+  * the process's resident set size (RSS),
+  * Python's total reference count, on debug builds of Python,
+  * the number of live runtimes and Python wrappers of JS objects,
+  * the number of JS objects holding Python objects, and
+  * the number of bytes allocated by the JS garbage collector.
+"""
+
+import gc
+import os
+import sys
+import mmap
+import unittest
+
+import pydermonkey
+
+ITERATIONS = int(os.environ.get('PYM_SOAK_ITERATIONS', 1000000))
+ROUNDS = 10
+
+MAX_GROWTH = {
+    'rss': 8 * 1024 * 1024,
+    'refcount': 1000,
+    'runtimes': 0,
+    'wrappers': 0,
+    'private_holders': 0,
+    'js_bytes': 64 * 1024,
+    }
+
+def get_rss():
+    try:
+        statm = open('/proc/self/statm').read().split()
+        return int(statm[1]) * mmap.PAGESIZE
+    except IOError:
+        # No procfs, so fall back to the peak RSS, which still grows
+        # along with a leak.
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        if sys.platform == 'darwin':
+            return usage.ru_maxrss
+        return usage.ru_maxrss * 1024
+
+def get_snapshot(cx):
+    gc.collect()
+    cx.gc()
+
+    info = pydermonkey.get_debug_info()
+    wrappers = 0
+    private_holders = 0
+    for runtime in info['runtimes']:
+        wrappers += (runtime['object_count'] + runtime['function_count'] +
+                     runtime['script_count'])
+        private_holders += runtime['private_holder_count']
+
+    snapshot = {
+        'rss': get_rss(),
+        'runtimes': info['runtime_count'],
+        'wrappers': wrappers,
+        'private_holders': private_holders,
+        'js_bytes': cx.get_runtime().get_memory_usage()['bytes'],
+        }
+    if hasattr(sys, 'gettotalrefcount'):
+        snapshot['refcount'] = sys.gettotalrefcount()
+    return snapshot
+
+class SoakTests(unittest.TestCase):
+    def soak(self, setup, cost=1):
+        """
+        Calls setup() with a new context and global object, and calls
+        the operation it returns ITERATIONS / cost times, failing if
+        any tracked measurement grows by more than its limit.
+        """
+
+        iterations = max(ITERATIONS // cost, ROUNDS)
+        per_round = range(iterations // ROUNDS)
+
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_global()
+        op = setup(cx, obj)
+
+        for i in per_round:
+            op()
+        before = get_snapshot(cx)
+
+        for round in range(ROUNDS - 1):
+            for i in per_round:
+                op()
+        after = get_snapshot(cx)
+
+        growth = dict((name, after[name] - before[name]) for name in after)
+        excessive = ['%s grew by %d' % (name, growth[name])
+                     for name in sorted(growth)
+                     if growth[name] > MAX_GROWTH[name]]
+        if excessive:
+            self.fail(', '.join(excessive))
+
+    def testNewObject(self):
+        self.soak(lambda cx, obj: cx.new_object)
+
+    def testNewObjectWithPrivate(self):
+        self.soak(lambda cx, obj: lambda: cx.new_object(object()))
+
+    def testNewRuntimeAndContext(self):
+        def op():
+            cx = pydermonkey.Runtime().new_context()
+            cx.new_global()
+        self.soak(lambda cx, obj: op, cost=100)
+
+    def testEvaluateScript(self):
+        def setup(cx, obj):
+            return lambda: cx.evaluate_script(obj, '({a: [1, "b"]})',
+                                              '<soak>', 1)
+        self.soak(setup, cost=10)
+
+    def testCompileAndExecuteScript(self):
+        def setup(cx, obj):
+            def op():
+                script = cx.compile_script('[1, 2, 3]', '<soak>', 1)
+                cx.execute_script(obj, script)
+            return op
+        self.soak(setup, cost=10)
+
+    def testCompileAndCallFunction(self):
+        def setup(cx, obj):
+            def op():
+                func = cx.compile_function(None, ['a', 'b'],
+                                           'return {sum: a + b};',
+                                           '<soak>', 1)
+                cx.call_function(obj, func, (1, u'x'))
+            return op
+        self.soak(setup, cost=10)
+
+    def testPythonFunctionCalledFromJs(self):
+        def setup(cx, obj):
+            def func(cx, this, args):
+                return args[0]
+            cx.define_property(obj, 'func', cx.new_function(func, 'func'))
+            script = cx.compile_script('func({})', '<soak>', 1)
+            return lambda: cx.execute_script(obj, script)
+        self.soak(setup, cost=10)
+
+    def testNewFunction(self):
+        def setup(cx, obj):
+            def func(cx, this, args):
+                pass
+            def op():
+                jsfunc = cx.new_function(func, 'func')
+                cx.define_property(obj, 'func', jsfunc)
+            return op
+        self.soak(setup, cost=10)
+
+    def testPythonExceptionsThrownThroughJs(self):
+        def setup(cx, obj):
+            def func(cx, this, args):
+                raise pydermonkey.ScriptError(u'oops')
+            cx.define_property(obj, 'func', cx.new_function(func, 'func'))
+            script = cx.compile_script('func()', '<soak>', 1)
+            def op():
+                try:
+                    cx.execute_script(obj, script)
+                except pydermonkey.ScriptError, e:
+                    str(e)
+            return op
+        self.soak(setup, cost=10)
+
+    def testJsExceptions(self):
+        def setup(cx, obj):
+            script = cx.compile_script('throw new Error("oops")', '<soak>', 1)
+            def op():
+                try:
+                    cx.execute_script(obj, script)
+                except pydermonkey.ScriptError, e:
+                    str(e), e.filename, e.lineno
+            return op
+        self.soak(setup, cost=10)
+
+    def testPropertyAccess(self):
+        def setup(cx, obj):
+            target = cx.new_object()
+            def op():
+                cx.define_property(target, 'a', u'foo')
+                cx.set_property(target, 'b', cx.new_object())
+                cx.get_property(target, 'a')
+                cx.get_property(target, 'b')
+                cx.has_property(target, 'a')
+                cx.delete_property(target, 'b')
+            return op
+        self.soak(setup)
+
+    def testEnumerate(self):
+        def setup(cx, obj):
+            target = cx.evaluate_script(obj, '({a: 1, b: 2, 3: 4})',
+                                        '<soak>', 1)
+            return lambda: cx.enumerate(target)
+        self.soak(setup)
+
+    def testStringConversion(self):
+        def setup(cx, obj):
+            string = u'\u2603' * 1000
+            def op():
+                cx.set_property(obj, 'foo', string)
+                cx.get_property(obj, 'foo')
+            return op
+        self.soak(setup, cost=10)
+
+    def testTransientWrappers(self):
+        def setup(cx, obj):
+            cx.set_identity_preserving(False)
+            target = cx.new_object()
+            cx.define_property(obj, 'target', target)
+            def op():
+                cx.promote_object(cx.get_property(obj, 'target'))
+            return op
+        self.soak(setup)
+
+    def testHostObjects(self):
+        def setup(cx, obj):
+            data = {'a': [1, 2, {'b': u'c'}]}
+            script = cx.compile_script('host.a[2].b; host.x = host.a[0];',
+                                       '<soak>', 1)
+            def op():
+                cx.define_property(obj, 'host', cx.new_host_object(data))
+                cx.execute_script(obj, script)
+            return op
+        self.soak(setup, cost=10)
+
+    def testBufferViews(self):
+        def setup(cx, obj):
+            data = bytearray(64)
+            script = cx.compile_script('buf[0] = buf[1] + buf.length',
+                                       '<soak>', 1)
+            def op():
+                cx.define_property(obj, 'buf',
+                                   cx.new_buffer_view(data, False))
+                cx.execute_script(obj, script)
+            return op
+        self.soak(setup, cost=10)
+
+    def testNewGlobal(self):
+        def setup(cx, obj):
+            def op():
+                sandbox = cx.new_global()
+                cx.evaluate_script(sandbox, 'Math.max(1, 2)', '<soak>', 1)
+            return op
+        self.soak(setup, cost=100)
+
+    def testStack(self):
+        def setup(cx, obj):
+            def func(cx, this, args):
+                cx.get_stack()
+                cx.get_stack_compact(64, True)
+            cx.define_property(obj, 'func', cx.new_function(func, 'func'))
+            script = cx.compile_script('(function() { func(); })()',
+                                       '<soak>', 1)
+            return lambda: cx.execute_script(obj, script)
+        self.soak(setup, cost=10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import gc
 import sys
+import mmap
 import unittest
 import weakref
 import time
@@ -52,6 +53,12 @@ class PydermonkeyTests(unittest.TestCase):
         cx.define_property(obj, func.__name__, jsfunc)
         return cx.evaluate_script(obj, code, '<string>', 1)
 
+    def _getRuntimeDebugInfo(self, rt):
+        runtimes = [info for info in pydermonkey.get_debug_info()['runtimes']
+                    if info['runtime'] is rt]
+        self.assertEqual(len(runtimes), 1)
+        return runtimes[0]
+
     def assertRaises(self, exctype, func, *args):
         was_raised = False
         try:
@@ -140,6 +147,69 @@ class PydermonkeyTests(unittest.TestCase):
                 u'SyntaxError: missing ; before statement'
                 )
 
+    def testScriptErrorMessageIsComputedLazily(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        try:
+            cx.evaluate_script(
+                obj,
+                ('var calls = 0;\n'
+                 'throw {toString: function() { calls++; return "boom"; }};'),
+                '<string>', 1
+                )
+        except pydermonkey.ScriptError, e:
+            exc = e
+        self.assertEqual(cx.get_property(obj, 'calls'), 0)
+        self.assertEqual(exc.args[1], u'boom')
+        self.assertEqual(exc.args[1], u'boom')
+        self.assertEqual(cx.get_property(obj, 'calls'), 1)
+        self.assertEqual(exc.filename, None)
+
+    def testLazyScriptErrorSupportsIndexingPicklingAndMessage(self):
+        import pickle
+
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+
+        def throw():
+            try:
+                cx.evaluate_script(
+                    obj, 'throw {toString: function() { return "boom"; }};',
+                    '<string>', 1
+                    )
+            except pydermonkey.ScriptError, e:
+                return e
+
+        self.assertEqual(throw()[1], u'boom')
+        self.assertEqual(throw().message, '')
+        unpickled = pickle.loads(pickle.dumps(throw()))
+        self.assertTrue(isinstance(unpickled, pydermonkey.ScriptError))
+        self.assertEqual(unpickled.args, (None, u'boom'))
+        self.assertEqual(pickle.loads(pickle.dumps(throw(), 2)).args,
+                         (None, u'boom'))
+
+    def testScriptErrorExposesErrorReport(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        cx.init_standard_classes(obj)
+        try:
+            cx.evaluate_script(obj, '\nthrow new Error("oops");',
+                               'test.js', 1)
+        except pydermonkey.ScriptError, e:
+            exc = e
+        self.assertEqual(exc.filename, 'test.js')
+        self.assertEqual(exc.lineno, 2)
+        self.assertTrue('test.js:2' in exc.stack)
+        self.assertEqual(str(exc), str(exc.args))
+        self.assertEqual(exc.args[1], u'Error: oops')
+
+    def testScriptErrorForPrimitiveHasNoErrorReport(self):
+        self.assertRaises(pydermonkey.ScriptError, self._evaljs, 'throw 5')
+        exc = self.last_exception
+        self.assertEqual(exc.args, (5, u'5'))
+        self.assertEqual(exc.lineno, None)
+        self.assertEqual(exc.stack, None)
+
     def testGetStackOnEmptyStackReturnsNone(self):
         cx = pydermonkey.Runtime().new_context()
         self.assertEqual(cx.get_stack(), None)
@@ -388,6 +458,647 @@ class PydermonkeyTests(unittest.TestCase):
         self.assertEqual(self.last_exception.args[0],
                          'stop eet!')
 
+    def testGetUsageWorks(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+
+        def func(cx, this, args):
+            return 1
+
+        cx.define_property(obj, 'func', cx.new_function(func, 'func'))
+        cx.evaluate_script(obj, 'func(); func();', '<string>', 1)
+        usage = cx.get_usage()
+        self.assertEqual(usage['calls'], 1)
+        self.assertEqual(usage['callback_calls'], 2)
+        self.assertTrue(usage['wall_time'] >= usage['callback_wall_time'])
+        self.assertTrue(usage['cpu_time'] >= 0)
+        self.assertEqual(usage['operation_callbacks'], 0)
+        self.assertEqual(cx.get_usage(True)['calls'], 1)
+        usage = cx.get_usage()
+        self.assertEqual(usage['calls'], 0)
+        self.assertEqual(usage['wall_time'], 0)
+
+    def testOperationCallbackTicksAreCounted(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+
+        def func(cx, this, args):
+            cx.trigger_operation_callback()
+
+        cx.define_property(obj, 'func', cx.new_function(func, 'func'))
+        cx.evaluate_script(obj, 'func(); for (i = 0; i < 10; i++) {}',
+                           '<string>', 1)
+        self.assertEqual(cx.get_usage()['operation_callbacks'], 1)
+
+    def testExhaustedBudgetRaisesBudgetExceededError(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        cx.set_budget(1e-9)
+        cx.evaluate_script(obj, 'for (i = 0; i < 100; i++) {}',
+                           '<string>', 1)
+        self.assertRaises(pydermonkey.BudgetExceededError,
+                          cx.evaluate_script,
+                          obj, '1', '<string>', 1)
+        cx.get_usage(True)
+        self.assertEqual(cx.evaluate_script(obj, '1', '<string>', 1), 1)
+
+    def testBudgetExceededErrorCannotBeCaughtByJs(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+
+        def func(cx, this, args):
+            time.sleep(0.001)
+
+        cx.define_property(obj, 'func', cx.new_function(func, 'func'))
+        cx.set_budget(0.01)
+        self.assertRaises(pydermonkey.BudgetExceededError,
+                          cx.evaluate_script,
+                          obj, 'while (1) { try { func(); } catch (e) {} }',
+                          '<string>', 1)
+        self.assertTrue(isinstance(self.last_exception,
+                                   pydermonkey.InterpreterError))
+
+    def testBudgetStopsInfiniteLoop(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        cx.set_budget(0.05)
+        self.assertRaises(pydermonkey.BudgetExceededError,
+                          cx.evaluate_script,
+                          obj, 'while (1) {}', '<string>', 1)
+        cx.set_budget()
+        cx.get_usage(True)
+        self.assertEqual(cx.evaluate_script(obj, '1', '<string>', 1), 1)
+
+    def testSetBudgetRejectsNegativeValues(self):
+        cx = pydermonkey.Runtime().new_context()
+        self.assertRaises(ValueError, cx.set_budget, -1.0)
+
+    def testGetMemoryUsageWorks(self):
+        rt = pydermonkey.Runtime()
+        cx = rt.new_context()
+        obj = cx.new_object()
+        cx.init_standard_classes(obj)
+        usage = rt.get_memory_usage()
+        self.assertTrue(usage['bytes'] > 0)
+        self.assertTrue(usage['peak_bytes'] >= usage['bytes'])
+        self.assertEqual(usage['soft_limit'], 0)
+        self.assertEqual(usage['hard_limit'], 8 * 1024 * 1024)
+
+    def testSetMemoryLimitsRejectsSoftLimitAboveHardLimit(self):
+        rt = pydermonkey.Runtime()
+        self.assertRaises(ValueError, rt.set_memory_limits, 2048, 1024)
+
+    def testHardMemoryLimitRaisesMemoryLimitError(self):
+        rt = pydermonkey.Runtime()
+        rt.set_memory_limits(0, 512 * 1024)
+        cx = rt.new_context()
+        cx.set_gc_zeal(0)
+        obj = cx.new_object()
+        cx.init_standard_classes(obj)
+        self.assertRaises(pydermonkey.MemoryLimitError,
+                          cx.evaluate_script,
+                          obj, 'a = []; while (1) { a.push({}); }',
+                          '<string>', 1)
+        self.assertTrue(isinstance(self.last_exception,
+                                   pydermonkey.InterpreterError))
+        cx.delete_property(obj, 'a')
+        cx.gc()
+        self.assertEqual(cx.evaluate_script(obj, '1', '<string>', 1), 1)
+        self.assertTrue(rt.get_memory_usage()['peak_bytes'] >= 256 * 1024)
+
+    def testSoftMemoryLimitTriggersGC(self):
+        rt = pydermonkey.Runtime()
+        cx = rt.new_context()
+        cx.set_gc_zeal(0)
+        obj = cx.new_object()
+        cx.init_standard_classes(obj)
+        rt.set_memory_limits(rt.get_memory_usage()['bytes'] + 64 * 1024)
+
+        def func(cx, this, args):
+            pass
+
+        cx.define_property(obj, 'func', cx.new_function(func, 'func'))
+        cx.evaluate_script(obj,
+                           'for (i = 0; i < 20000; i++) { [{}, {}]; func(); }',
+                           '<string>', 1)
+        self.assertTrue(rt.get_memory_usage()['soft_limit_gcs'] > 0)
+
+    def testGetGCStatsWorks(self):
+        rt = pydermonkey.Runtime()
+        cx = rt.new_context()
+        count = rt.get_gc_stats()['count']
+        cx.gc()
+        stats = rt.get_gc_stats()
+        self.assertEqual(stats['count'], count + 1)
+        self.assertTrue(stats['bytes_before'] >= stats['bytes_after'])
+        self.assertTrue(stats['total_pause'] >= stats['last_pause'])
+        self.assertTrue(stats['max_pause'] >= stats['last_pause'])
+
+    def testGetStatsCountsApiUsage(self):
+        rt = pydermonkey.Runtime()
+        cx = rt.new_context()
+        obj = cx.new_global()
+
+        def func(cx, this, args):
+            return args[0]
+
+        cx.define_property(obj, 'func', cx.new_function(func, 'func'))
+        cx.evaluate_script(obj, 'func("hi")', '<string>', 1)
+        jsfunc = cx.compile_function(None, ['a'], 'return a;', '<string>', 1)
+        cx.call_function(obj, jsfunc, (5.5,))
+        self.assertRaises(pydermonkey.ScriptError, cx.evaluate_script,
+                          obj, 'throw 1', '<string>', 1)
+
+        stats = rt.get_stats()
+        self.assertEqual(stats['scripts_compiled'], 2)
+        self.assertEqual(stats['functions_compiled'], 1)
+        self.assertEqual(stats['executions'], 2)
+        self.assertEqual(stats['js_to_python_calls'], 1)
+        self.assertEqual(stats['python_to_js_calls'], 1)
+        self.assertEqual(stats['exceptions_to_python'], 1)
+        self.assertEqual(stats['values_to_js']['double'], 1)
+        self.assertTrue(stats['values_to_python']['string'] >= 2)
+        self.assertTrue(stats['source_bytes_compiled'] > 0)
+        self.assertEqual(stats['api']['evaluate_script']['calls'], 2)
+        self.assertEqual(stats['api']['call_function']['calls'], 1)
+        self.assertTrue(stats['api']['call_function']['time'] >= 0)
+
+        rt.reset_stats()
+        stats = rt.get_stats()
+        self.assertEqual(stats['scripts_compiled'], 0)
+        self.assertEqual(stats['values_to_python']['string'], 0)
+        self.assertEqual(stats['api']['evaluate_script']['calls'], 0)
+
+    def testGetStatsPrometheusWorks(self):
+        rt = pydermonkey.Runtime()
+        cx = rt.new_context()
+        obj = cx.new_global()
+        cx.evaluate_script(obj, '1', '<string>', 1)
+        text = rt.get_stats_prometheus('pym')
+        self.assertTrue(text.endswith('\n'))
+        lines = text.splitlines()
+        self.assertTrue('# TYPE pym_scripts_compiled_total counter' in lines)
+        self.assertTrue('pym_scripts_compiled_total 1' in lines)
+        self.assertTrue('pym_values_to_python_total{type="int"} 1' in lines)
+        self.assertTrue('pym_api_calls_total{api="evaluate_script"} 1'
+                        in lines)
+        self.assertTrue(rt.get_stats_prometheus().startswith(
+                '# HELP pydermonkey_'))
+
+    def testGetStatsPrometheusRejectsInvalidPrefixes(self):
+        rt = pydermonkey.Runtime()
+        for prefix in ['', '1pym', 'pym-js', 'pym js', 'pym\n']:
+            self.assertRaises(ValueError, rt.get_stats_prometheus, prefix)
+        self.assertRaises(ValueError, rt.get_stats_prometheus, 'p' * 65)
+        self.assertTrue(rt.get_stats_prometheus('_pym:js2').startswith(
+                '# HELP _pym:js2_'))
+
+    def testTraceRecordsBoundaryCrossings(self):
+        rt = pydermonkey.Runtime()
+        cx = rt.new_context()
+        obj = cx.new_global()
+
+        def func(cx, this, args):
+            return cx.get_property(obj, 'foo')
+
+        cx.define_property(obj, 'func', cx.new_function(func, 'func'))
+        cx.define_property(obj, 'foo', 1)
+        self.assertRaises(pydermonkey.error, rt.get_trace)
+        rt.start_trace()
+        self.assertRaises(pydermonkey.error, rt.start_trace)
+        cx.evaluate_script(obj, 'func()', '<string>', 1)
+        cx.gc()
+        events = rt.stop_trace()
+        self.assertEqual([(event['cat'], event['name']) for event in events],
+                         [('api', 'get_property foo'),
+                          ('callback', 'callback func'),
+                          ('api', 'evaluate_script <string>'),
+                          ('gc', 'gc')])
+        outer = events[2]
+        inner = events[0]
+        self.assertEqual(outer['ph'], 'X')
+        self.assertEqual(outer['tid'], inner['tid'])
+        self.assertTrue(outer['ts'] <= inner['ts'])
+        self.assertTrue(outer['ts'] + outer['dur'] >=
+                        inner['ts'] + inner['dur'])
+        self.assertRaises(pydermonkey.error, rt.stop_trace)
+
+    def testTraceIsRingBuffer(self):
+        rt = pydermonkey.Runtime()
+        cx = rt.new_context()
+        obj = cx.new_object()
+        self.assertRaises(ValueError, rt.start_trace, 0)
+        rt.start_trace(2)
+        for name in ['a', 'b', 'c']:
+            cx.define_property(obj, name, 1)
+        self.assertEqual([event['name'] for event in rt.get_trace()],
+                         ['define_property b', 'define_property c'])
+        rt.stop_trace()
+
+    def testTraceCopiesPropertyNamesBeforeTheyAreCollected(self):
+        rt = pydermonkey.Runtime()
+        cx = rt.new_context()
+        obj = cx.new_object()
+
+        def func(cx, this, args):
+            cx.gc()
+
+        cx.define_property(obj, 'func', cx.new_function(func, 'func'))
+        rt.start_trace()
+        cx.call_function(obj, cx.get_property(obj, 'func'), ())
+        cx.get_property(obj, u'\u2603' + u'x' * 200)
+        cx.gc()
+        names = [event['name'] for event in rt.stop_trace()
+                 if event['cat'] == 'api']
+        self.assertEqual(names[1], 'call_function func')
+        self.assertTrue(names[2].startswith(u'get_property \u2603xxx'))
+        self.assertEqual(len(names[2].encode('utf-8')), 95)
+
+    def testDumpTraceWritesChromeTraceJson(self):
+        import os
+        import json
+        import tempfile
+
+        rt = pydermonkey.Runtime()
+        cx = rt.new_context()
+        obj = cx.new_global()
+        rt.start_trace()
+        cx.evaluate_script(obj, '1', '\xe2\x98\x83.js', 1)
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            rt.dump_trace(path)
+            trace = json.load(open(path))
+        finally:
+            os.remove(path)
+        rt.stop_trace()
+        self.assertEqual([event['name'] for event in trace['traceEvents']],
+                         [u'evaluate_script \u2603.js'])
+
+    def testMaybeGCWorks(self):
+        cx = pydermonkey.Runtime().new_context()
+        cx.maybe_gc()
+
+    def testSetGCParameterWorks(self):
+        rt = pydermonkey.Runtime()
+        rt.set_gc_parameter('max_malloc_bytes', 1024 * 1024)
+        rt.set_gc_parameter('trigger_factor', 200)
+        self.assertRaises(ValueError, rt.set_gc_parameter,
+                          'trigger_factor', 50)
+        self.assertRaises(ValueError, rt.set_gc_parameter, 'foo', 1)
+
+    def testGCCallbackIsCalled(self):
+        events = []
+
+        def gccb(rt, event):
+            events.append((rt, event))
+
+        rt = pydermonkey.Runtime()
+        rt.set_gc_callback(gccb)
+        cx = rt.new_context()
+        before = time.time()
+        cx.gc()
+        after = time.time()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0][0], rt)
+        event = events[0][1]
+        self.assertEqual(sorted(event.keys()),
+                         ['bytes_after', 'bytes_before', 'pause', 'time'])
+        self.assertTrue(before <= event['time'] + 0.01)
+        self.assertTrue(event['time'] <= after + 0.01)
+        self.assertTrue(event['pause'] >= 0.0)
+        self.assertTrue(event['bytes_before'] > 0)
+        rt.set_gc_callback(None)
+        cx.gc()
+        self.assertEqual(len(events), 1)
+
+    def testGCCallbackIsCalledAfterCollection(self):
+        events = []
+
+        def gccb(rt, event):
+            stats = rt.get_gc_stats()
+            events.append((stats['count'],
+                           event['pause'] == stats['last_pause']))
+
+        rt = pydermonkey.Runtime()
+        rt.set_gc_callback(gccb)
+        cx = rt.new_context()
+        cx.gc()
+        cx.gc()
+        self.assertEqual(events, [(1, True), (2, True)])
+
+    def testRuntimeSupportsCyclicGc(self):
+        def makert():
+            rt = pydermonkey.Runtime()
+
+            def gccb(other, event):
+                return rt
+
+            rt.set_gc_callback(gccb)
+            return rt
+
+        gc.disable()
+        rt = makert()
+        wrt = weakref.ref(rt)
+        del rt
+        self.assertTrue(wrt())
+        gc.enable()
+        gc.collect()
+        self.assertEqual(wrt(), None)
+
+    def testGetDebugInfoReportsRuntimes(self):
+        rt = pydermonkey.Runtime()
+        cx = rt.new_context()
+        cx2 = rt.new_context()
+        obj = cx.new_object()
+        cx.init_standard_classes(obj)
+        func = cx.evaluate_script(obj, '(function() {})', '<string>', 1)
+        script = cx.compile_script('1', '<string>', 1)
+        info = self._getRuntimeDebugInfo(rt)
+        self.assertEqual(info['context_count'], 2)
+        self.assertEqual(info['object_count'], 1)
+        self.assertEqual(info['function_count'], 1)
+        self.assertEqual(info['script_count'], 1)
+        self.assertEqual(info['table_entries'], 3)
+        self.assertTrue(info['table_capacity'] >= 3)
+        self.assertEqual(info['table_load'],
+                         3.0 / info['table_capacity'])
+        self.assertEqual(info['private_holder_count'], 1)
+        del cx2
+        del func
+        del script
+        info = self._getRuntimeDebugInfo(rt)
+        self.assertEqual(info['context_count'], 1)
+        self.assertEqual(info['function_count'], 0)
+        self.assertEqual(info['script_count'], 0)
+
+    def testFreeListsReuseWrappers(self):
+        def lengths():
+            return pydermonkey.get_debug_info()['free_list_lengths']
+
+        pydermonkey.set_free_list_size(pydermonkey.Object, 0)
+        self.assertEqual(lengths()['object'], 0)
+        pydermonkey.set_free_list_size(pydermonkey.Object, 5)
+        cx = pydermonkey.Runtime().new_context()
+        objs = [cx.new_object() for i in range(10)]
+        del objs
+        self.assertEqual(lengths()['object'], 5)
+        obj = cx.new_object()
+        self.assertEqual(lengths()['object'], 4)
+        self.assertEqual(cx.get_property(obj, 'foo'), pydermonkey.undefined)
+        pydermonkey.set_free_list_size(pydermonkey.Object, 128)
+        self.assertRaises(TypeError, pydermonkey.set_free_list_size,
+                          pydermonkey.Context, 1)
+
+    def testFunctionMetadataIsLazy(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        func = cx.evaluate_script(obj, '\n(function foo() {\n})',
+                                  'test.js', 1)
+        self.assertEqual(func.name, u'foo')
+        self.assertEqual(func.name, u'foo')
+        self.assertEqual(func.filename, 'test.js')
+        self.assertEqual(func.base_lineno, 2)
+        self.assertEqual(func.line_extent, 2)
+        anon = cx.evaluate_script(obj, '(function() {})', 'test.js', 1)
+        self.assertEqual(anon.name, None)
+
+    def testProfilerWorks(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        cx.init_standard_classes(obj)
+        cx.start_profiler(1)
+        self.assertRaises(pydermonkey.InterpreterError,
+                          cx.start_profiler, 1)
+        cx.evaluate_script(
+            obj,
+            ('function foo() {\n'
+             '  var start = Date.now();\n'
+             '  while (Date.now() - start < 100) {}\n'
+             '}\n'
+             'foo();'),
+            'test.js', 1
+            )
+        stacks = cx.stop_profiler()
+        self.assertTrue(stacks)
+        for stack, count in stacks.items():
+            self.assertTrue(stack.startswith('(top level) (test.js:5);'
+                                             'foo (test.js:'))
+            self.assertTrue(count > 0)
+        self.assertRaises(pydermonkey.InterpreterError, cx.stop_profiler)
+
+    def testProfilerIgnoresOtherOperationCallbackTriggers(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        calls = []
+
+        def opcb(cx):
+            calls.append(True)
+
+        def trigger(cx, this, args):
+            cx.trigger_operation_callback()
+
+        cx.set_operation_callback(opcb)
+        cx.define_property(obj, 'trigger',
+                           cx.new_function(trigger, 'trigger'))
+        cx.start_profiler(1000)
+        cx.evaluate_script(
+            obj,
+            'trigger(); for (var i = 0; i < 1000; i++) {}',
+            'test.js', 1
+            )
+        self.assertEqual(cx.stop_profiler(), {})
+        self.assertEqual(calls, [True])
+
+    def testProfilerIsStoppedWhenContextIsDestroyed(self):
+        cx = pydermonkey.Runtime().new_context()
+        cx.start_profiler(1)
+        del cx
+
+    def testFunctionStatsWork(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        self.assertRaises(pydermonkey.InterpreterError,
+                          cx.get_function_stats)
+        cx.enable_function_stats()
+        cx.evaluate_script(
+            obj,
+            ('function foo() { return bar() + bar(); }\n'
+             'function bar() { return 1; }\n'
+             'var baz = function() { return 2; };\n'
+             'foo(); foo(); baz();'),
+            'test.js', 1
+            )
+        stats = cx.get_function_stats(True)
+        self.assertEqual(sorted(stats.keys()),
+                         [('test.js', 1, None),
+                          ('test.js', 1, 'foo'),
+                          ('test.js', 2, 'bar'),
+                          ('test.js', 3, None)])
+        self.assertEqual(stats[('test.js', 1, 'foo')][0], 2)
+        self.assertEqual(stats[('test.js', 2, 'bar')][0], 4)
+        self.assertEqual(stats[('test.js', 3, None)][0], 1)
+        calls, total_time, self_time = stats[('test.js', 1, 'foo')]
+        self.assertTrue(total_time >= self_time >= 0.0)
+        self.assertEqual(cx.get_function_stats(), {})
+        cx.disable_function_stats()
+        self.assertRaises(pydermonkey.InterpreterError,
+                          cx.get_function_stats)
+
+    def testFunctionStatsCountRecursionOnce(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        cx.enable_function_stats()
+        cx.evaluate_script(
+            obj,
+            ('function fact(n) { return n ? n * fact(n - 1) : 1; }\n'
+             'fact(10);'),
+            'test.js', 1
+            )
+        calls, total_time, self_time = \
+            cx.get_function_stats()[('test.js', 1, 'fact')]
+        self.assertEqual(calls, 11)
+        self.assertTrue(total_time >= self_time)
+
+    def testFunctionStatsShareEntriesAcrossRecompiledScripts(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        cx.enable_function_stats()
+        for i in range(100):
+            cx.evaluate_script(obj, 'function foo() {} foo();', 'test.js', 1)
+            cx.gc()
+        stats = cx.get_function_stats()
+        self.assertEqual(sorted(stats.keys()),
+                         [('test.js', 1, None), ('test.js', 1, 'foo')])
+        self.assertEqual(stats[('test.js', 1, None)][0], 100)
+        self.assertEqual(stats[('test.js', 1, 'foo')][0], 100)
+
+    def testCoverageWorks(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        self.assertRaises(pydermonkey.InterpreterError, cx.stop_coverage)
+        cx.start_coverage()
+        self.assertRaises(pydermonkey.InterpreterError, cx.start_coverage)
+        cx.evaluate_script(
+            obj,
+            ('function foo(x) {\n'
+             '  if (x)\n'
+             '    return 1;\n'
+             '  return 2;\n'
+             '}\n'
+             'foo(true);\n'
+             'foo(true);\n'),
+            'test.js', 1
+            )
+        coverage = cx.stop_coverage()
+        self.assertEqual(coverage.keys(), ['test.js'])
+        lines = coverage['test.js']
+        self.assertEqual(lines.typecode, 'L')
+        # Each line is only recorded the first time it runs.
+        self.assertEqual(lines[3], 1)
+        self.assertEqual(lines[4], 0)
+        self.assertEqual(lines[6], 1)
+        self.assertEqual(lines[7], 1)
+
+    def testCoverageIsRemovedWhenStopped(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        script = cx.compile_script('1 + 1;', 'test.js', 1)
+        cx.start_coverage()
+        cx.execute_script(obj, script)
+        self.assertEqual(list(cx.stop_coverage()['test.js']), [0, 1])
+        self.assertEqual(cx.execute_script(obj, script), 2)
+
+    def testCoverageOnlyCountsOwnContext(self):
+        rt = pydermonkey.Runtime()
+        cx = rt.new_context()
+        otherCx = rt.new_context()
+        obj = otherCx.new_object()
+        cx.start_coverage()
+        otherCx.evaluate_script(obj, '1 + 1;', 'other.js', 1)
+        self.assertEqual(cx.stop_coverage(), {})
+
+    def testCoverageKeepsCountsOfCollectedScripts(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        cx.start_coverage()
+        script = cx.compile_script('1 + 1;', 'first.js', 1)
+        cx.execute_script(obj, script)
+        del script
+        cx.gc()
+        script = cx.compile_script('\n1 + 1;', 'second.js', 1)
+        cx.execute_script(obj, script)
+        coverage = cx.stop_coverage()
+        self.assertEqual(list(coverage['first.js']), [0, 1])
+        self.assertEqual(list(coverage['second.js']), [0, 0, 1])
+
+    def testScriptCoverageShowsLinesRunSoFar(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        script = cx.compile_script('var x = 0;\nif (x)\n  x = 1;\nx + 2;',
+                                   'test.js', 1)
+        self.assertEqual(script.coverage, None)
+        cx.start_coverage()
+        cx.execute_script(obj, script)
+        cx.execute_script(obj, script)
+        self.assertEqual(script.coverage.typecode, 'B')
+        self.assertEqual(list(script.coverage), [1, 1, 0, 1])
+        self.assertEqual(list(cx.stop_coverage()['test.js']),
+                         [0, 1, 1, 0, 1])
+        self.assertEqual(script.coverage, None)
+        self.assertEqual(cx.execute_script(obj, script), 2)
+
+    def testGetStackCompactWorks(self):
+        stacks = []
+        def func(cx, this, args):
+            stacks.append(cx.get_stack_compact())
+            frame = cx.get_stack_compact(max_depth=2, resolve=True)[1]
+            stacks.append((frame.lineno, frame.function.name))
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        jsfunc = cx.new_function(func, func.__name__)
+        self._clearOnTeardown(jsfunc)
+        cx.define_property(obj, func.__name__, jsfunc)
+        cx.evaluate_script(obj, '(function foo() {\n  func();\n})();',
+                           'test.js', 1)
+        stack, resolved = stacks
+        self.assertEqual(len(stack), 3)
+        self.assertEqual(stack[0].filename, None)
+        self.assertEqual(stack[0].function_name, 'func')
+        self.assertEqual(stack[1].filename, 'test.js')
+        self.assertEqual(stack[1].function_name, 'foo')
+        self.assertTrue(stack[1].pc > 0)
+        self.assertEqual(stack[2].function_name, None)
+        self.assertEqual(resolved, (2, 'foo'))
+        self.assertEqual(cx.get_stack_compact(), ())
+
+        # Line numbers and functions are resolved after the frames have
+        # returned and the script has been collected.
+        cx.gc()
+        self.assertEqual(stack[1].lineno, 2)
+        self.assertEqual(stack[1].function.name, 'foo')
+        self.assertEqual(stack[1].script, None)
+        self.assertEqual(stack[2].lineno, 3)
+        self.assertEqual(stack[2].function, None)
+
+    def testGetStackCompactResolvesCompiledScriptsLazily(self):
+        frames = []
+        def func(cx, this, args):
+            frames.append(cx.get_stack_compact(max_depth=2)[1])
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        jsfunc = cx.new_function(func, func.__name__)
+        self._clearOnTeardown(jsfunc)
+        cx.define_property(obj, func.__name__, jsfunc)
+        script = cx.compile_script('\n\nfunc();', 'compiled.js', 1)
+        cx.execute_script(obj, script)
+        del script
+        cx.gc()
+        frame, = frames
+        self.assertEqual(frame.filename, 'compiled.js')
+        self.assertEqual(frame.lineno, 3)
+        self.assertEqual(frame.script.filename, 'compiled.js')
+
     def testUndefinedStrIsUndefined(self):
         self.assertEqual(str(pydermonkey.undefined),
                          "pydermonkey.undefined")
@@ -454,6 +1165,74 @@ class PydermonkeyTests(unittest.TestCase):
         self.assertFalse(cx.is_exception_pending())
         self.assertEqual(cx.get_pending_exception(), None)
 
+    def _runThrowHook(self, filters, code, filename='<string>'):
+        exceptions = []
+        def throwhook(cx):
+            exceptions.append(cx.get_pending_exception())
+
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        cx.init_standard_classes(obj)
+        cx.set_throw_hook(throwhook, filters)
+        try:
+            cx.evaluate_script(obj, code, filename, 1)
+        except pydermonkey.ScriptError:
+            pass
+        return exceptions, cx.get_usage()
+
+    def testThrowHookFiltersByClassName(self):
+        exceptions, usage = self._runThrowHook(
+            {'class_names': ['TypeError', 'string']},
+            ('try { throw new Error("a"); } catch (e) {}\n'
+             'try { throw new TypeError("b"); } catch (e) {}\n'
+             'try { throw "c"; } catch (e) {}\n'
+             'try { throw 1; } catch (e) {}')
+            )
+        self.assertEqual(len(exceptions), 2)
+        self.assertEqual(exceptions[1], 'c')
+        self.assertEqual(usage['throw_hook_calls'], 2)
+        self.assertEqual(usage['throw_hook_suppressed'], 2)
+
+    def testThrowHookFiltersByFilenamePrefix(self):
+        code = 'try { throw "a"; } catch (e) {}'
+        exceptions, usage = self._runThrowHook(
+            {'filename_prefix': 'lib/'}, code, 'lib/foo.js'
+            )
+        self.assertEqual(exceptions, ['a'])
+        exceptions, usage = self._runThrowHook(
+            {'filename_prefix': 'lib/'}, code, 'app/foo.js'
+            )
+        self.assertEqual(exceptions, [])
+        self.assertEqual(usage['throw_hook_suppressed'], 1)
+
+    def testThrowHookFiltersBySampleRate(self):
+        exceptions, usage = self._runThrowHook(
+            {'sample_rate': 0.25},
+            'for (i = 0; i < 8; i++) { try { throw i; } catch (e) {} }'
+            )
+        self.assertEqual(exceptions, [3, 7])
+        self.assertEqual(usage['throw_hook_suppressed'], 6)
+
+    def testThrowHookFiltersCaughtExceptions(self):
+        exceptions, usage = self._runThrowHook(
+            {'uncaught_only': True},
+            ('function thrower(x) { throw x; }\n'
+             'try { thrower("caught"); } catch (e) {}\n'
+             'thrower("uncaught");')
+            )
+        self.assertEqual(exceptions, ['uncaught', 'uncaught'])
+        self.assertEqual(usage['throw_hook_suppressed'], 2)
+
+    def testThrowHookRejectsInvalidFilters(self):
+        cx = pydermonkey.Runtime().new_context()
+        hook = lambda cx: None
+        self.assertRaises(ValueError, cx.set_throw_hook, hook,
+                          {'bogus': 1})
+        self.assertRaises(ValueError, cx.set_throw_hook, hook,
+                          {'sample_rate': 2.0})
+        self.assertRaises(TypeError, cx.set_throw_hook, hook,
+                          {'class_names': [1]})
+
     def testJsWrappedPythonFuncHasPrivate(self):
         def foo(cx, this, args):
             pass
@@ -838,6 +1617,353 @@ class PydermonkeyTests(unittest.TestCase):
         self.assertTrue(cx.get_property(obj, u"foo") is
                         cx.get_property(obj, "foo"))
 
+    def testTransientWrappersArePromotable(self):
+        rt = pydermonkey.Runtime()
+        cx = rt.new_context()
+        obj = cx.new_object()
+        cx.init_standard_classes(obj)
+        cx.evaluate_script(obj, 'var foo = {bar: 1}', '<string>', 1)
+        self.assertEqual(cx.set_identity_preserving(False), True)
+        foo1 = cx.get_property(obj, 'foo')
+        foo2 = cx.get_property(obj, 'foo')
+        self.assertTrue(foo1 is not foo2)
+        info = self._getRuntimeDebugInfo(rt)
+        self.assertEqual(info['transient_count'], 2)
+        cx.gc()
+        self.assertEqual(cx.get_property(foo1, 'bar'), 1)
+        self.assertTrue(cx.promote_object(foo1) is foo1)
+        self.assertTrue(cx.promote_object(foo2) is foo1)
+        self.assertEqual(cx.set_identity_preserving(True), False)
+        self.assertTrue(cx.get_property(obj, 'foo') is foo1)
+        del foo2
+        info = self._getRuntimeDebugInfo(rt)
+        self.assertEqual(info['transient_count'], 0)
+
+    def testHostObjectsExposeDictsAndListsLazily(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_global()
+        data = {'a': 1, 'b': {'c': [5, 6, 7]}, 'd': (8, 9)}
+        host = cx.new_host_object(data)
+        cx.define_property(obj, 'data', host)
+        self.assertTrue(cx.get_object_private(host) is data)
+        self.assertEqual(cx.evaluate_script(obj, 'data.b.c[2] + data.d[0]',
+                                            '<string>', 1), 15)
+        self.assertEqual(cx.evaluate_script(obj, 'data.b.c.length',
+                                            '<string>', 1), 3)
+        self.assertEqual(cx.evaluate_script(obj, 'data.missing',
+                                            '<string>', 1),
+                         pydermonkey.undefined)
+        cx.evaluate_script(obj, 'data.a = "x"; data.b.c[0] = 2',
+                           '<string>', 1)
+        self.assertEqual(data['a'], u'x')
+        self.assertEqual(data['b']['c'][0], 2)
+        self.assertEqual(cx.evaluate_script(obj, 'data.a',
+                                            '<string>', 1), u'x')
+        self.assertRaises(TypeError, cx.evaluate_script, obj,
+                          'data.d[0] = 1', '<string>', 1)
+        keys = cx.evaluate_script(obj, '[k for (k in data)].sort()',
+                                  '<string>', 1)
+        self.assertEqual(cx.get_property(keys, 'length'), 3)
+
+    def testHostObjectsSeePythonChangesAndForwardDeletes(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_global()
+        data = {'a': 1, 'b': [1, 2]}
+        cx.define_property(obj, 'data', cx.new_host_object(data))
+
+        def js(code):
+            return cx.evaluate_script(obj, code, '<string>', 1)
+
+        self.assertEqual(js('data.a + data.b.length'), 3)
+        data['a'] = 5
+        data['b'].append(3)
+        self.assertEqual(js('data.a + data.b.length'), 8)
+        self.assertEqual(js('data.b === data.b'), True)
+        data['b'] = [4]
+        self.assertEqual(js('data.b[0]'), 4)
+        js('delete data.a; delete data.b[0]')
+        self.assertEqual(data, {'b': []})
+        self.assertEqual(js('typeof data.a'), u'undefined')
+        del data['b']
+        self.assertEqual(js('typeof data.b'), u'undefined')
+
+    def testHostObjectsCallHooks(self):
+        calls = []
+        def getter(cx, backing, name):
+            calls.append(('get', name))
+            if name == 'gone':
+                raise KeyError(name)
+            return name * 2
+        def setter(cx, backing, name, value):
+            calls.append(('set', name, value))
+        def enumerate(cx, backing):
+            return ['x', 'y']
+        def resolve(cx, backing, name):
+            calls.append(('resolve', name))
+            return name in ['x', 'y']
+
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_global()
+        host = cx.new_host_object(object(), getter, setter, None, None)
+        cx.define_property(obj, 'host', host)
+        self.assertEqual(cx.evaluate_script(obj, 'host.foo + host.foo',
+                                            '<string>', 1), u'foofoofoofoo')
+        # The item is fetched once to resolve it and then on each read.
+        self.assertEqual(calls, [('get', u'foo')] * 3)
+        self.assertEqual(cx.evaluate_script(obj, 'typeof host.gone',
+                                            '<string>', 1), u'undefined')
+        cx.evaluate_script(obj, 'host.bar = 5', '<string>', 1)
+        self.assertEqual(calls[-1], ('set', u'bar', 5))
+
+        del calls[:]
+        host = cx.new_host_object(object(), getter, None, enumerate,
+                                  resolve)
+        cx.define_property(obj, 'host', host)
+        self.assertEqual(cx.evaluate_script(obj, 'typeof host.hidden',
+                                            '<string>', 1), u'undefined')
+        self.assertEqual(calls, [('resolve', u'hidden')])
+        keys = cx.evaluate_script(obj, '[k for (k in host)].join()',
+                                  '<string>', 1)
+        self.assertEqual(keys, u'x,y')
+        self.assertRaises(TypeError, cx.new_host_object, {}, 5)
+
+    def testBufferViewsReadAndWriteMemory(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_global()
+        data = bytearray('\x01\x02\xff')
+        view = cx.new_buffer_view(data, False)
+        cx.define_property(obj, 'data', view)
+        self.assertTrue(cx.get_object_private(view) is data)
+        self.assertEqual(cx.evaluate_script(obj, 'data.length',
+                                            '<string>', 1), 3)
+        self.assertEqual(cx.evaluate_script(obj, 'data[2]',
+                                            '<string>', 1), 255)
+        self.assertEqual(cx.evaluate_script(obj, 'data[3]',
+                                            '<string>', 1),
+                         pydermonkey.undefined)
+        cx.evaluate_script(obj, 'data[0] = 257; data[1] = -1; data[7] = 1',
+                           '<string>', 1)
+        self.assertEqual(data, bytearray('\x01\xff\xff'))
+        self.assertEqual(cx.evaluate_script(obj, 'data[1]',
+                                            '<string>', 1), 255)
+        self.assertRaises(BufferError, data.append, 0)
+
+    def testBufferViewIndicesDoNotAddProperties(self):
+        rt = pydermonkey.Runtime()
+        cx = rt.new_context()
+        obj = cx.new_global()
+        data = bytearray(100000)
+        view = cx.new_buffer_view(data, False)
+        cx.define_property(obj, 'data', view)
+        script = cx.compile_script(
+            'for (var i = 0; i < data.length; i++) data[i] = data[i] + 1;',
+            '<string>', 1
+            )
+        cx.execute_script(obj, script)
+        cx.gc()
+        bytes = rt.get_memory_usage()['bytes']
+        cx.execute_script(obj, script)
+        cx.gc()
+        self.assertTrue(rt.get_memory_usage()['bytes'] - bytes < 4096)
+        self.assertEqual(data, bytearray('\x02' * 100000))
+
+    def testBufferViewsEnumerateIndices(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_global()
+        view = cx.new_buffer_view(bytearray('abc'), False)
+        cx.define_property(obj, 'data', view)
+        cx.define_property(view, 'foo', 1)
+        self.assertEqual(cx.enumerate(view), (0, 1, 2, 'foo'))
+        self.assertEqual(cx.evaluate_script(
+                obj, 'var names = []; for (var i in data) names.push(i); '
+                'names.join()', '<string>', 1), '0,1,2,foo')
+
+    def testReadonlyBufferViewsThrow(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_global()
+        data = bytearray('abc')
+        cx.define_property(obj, 'data', cx.new_buffer_view(data))
+        self.assertEqual(cx.evaluate_script(obj, 'data[1]',
+                                            '<string>', 1), ord('b'))
+        self.assertRaises(pydermonkey.ScriptError, cx.evaluate_script,
+                          obj, 'data[1] = 5', '<string>', 1)
+        self.assertEqual(data, bytearray('abc'))
+        self.assertRaises(BufferError, cx.new_buffer_view, 'abc', False)
+        self.assertRaises(TypeError, cx.new_buffer_view, 5)
+
+    def testBufferViewsSupportOldStyleBuffers(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_global()
+        data = mmap.mmap(-1, 4)
+        cx.define_property(obj, 'data', cx.new_buffer_view(data, False))
+        cx.evaluate_script(obj, 'data[3] = data.length', '<string>', 1)
+        self.assertEqual(data[3], '\x04')
+
+    def testNewGlobalResolvesStandardClassesLazily(self):
+        cx = pydermonkey.Runtime().new_context()
+        for lazy in [True, False]:
+            first = cx.new_global(lazy)
+            second = cx.new_global(lazy)
+            self.assertEqual(cx.evaluate_script(first, '[1, 2].length',
+                                                '<string>', 1), 2)
+            self.assertEqual(cx.evaluate_script(second, 'Math.abs(-3)',
+                                                '<string>', 1), 3)
+            self.assertFalse(cx.evaluate_script(first, 'Array',
+                                                '<string>', 1) is
+                             cx.evaluate_script(second, 'Array',
+                                                '<string>', 1))
+            self.assertEqual(cx.evaluate_script(first, 'Array = 5; Array',
+                                                '<string>', 1), 5)
+
+    def testNewGlobalBecomesContextGlobal(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_global()
+        self.assertRaises(pydermonkey.InterpreterError,
+                          cx.init_standard_classes, obj)
+        func = cx.compile_function(None, [], 'return typeof JSON;',
+                                   '<string>', 1)
+        self.assertEqual(cx.call_function(obj, func, ()), 'object')
+
+    def testResetGlobalRestoresSnapshot(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_global()
+        cx.evaluate_script(obj, 'var kept = {}; var changed = 1; '
+                           'var removed = 2; this[5] = "five";',
+                           '<string>', 1)
+        kept = cx.get_property(obj, 'kept')
+        snapshot = cx.snapshot_global(obj)
+        self.assertEqual(cx.get_object_private(snapshot), None)
+
+        for i in range(2):
+            cx.evaluate_script(obj, 'var added = 1; changed = 3; '
+                               'delete removed; this[5] = "six"; '
+                               'this[6] = "seven"; Object = null; '
+                               'kept.foo = 1;', '<string>', 1)
+            cx.reset_global(obj, snapshot)
+            self.assertFalse(cx.has_property(obj, 'added'))
+            self.assertFalse(cx.has_property(obj, 6))
+            self.assertEqual(cx.get_property(obj, 'changed'), 1)
+            self.assertEqual(cx.get_property(obj, 'removed'), 2)
+            self.assertEqual(cx.get_property(obj, 5), u'five')
+            self.assertTrue(cx.get_property(obj, 'kept') is kept)
+            self.assertEqual(cx.get_property(kept, 'foo'), 1)
+            self.assertEqual(cx.evaluate_script(obj, 'typeof Object',
+                                                '<string>', 1), 'function')
+
+        # Restored properties keep their attributes.
+        self.assertEqual(cx.evaluate_script(obj, 'delete changed',
+                                            '<string>', 1), False)
+
+    def testResetGlobalRestoresAccessors(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_global()
+        cx.evaluate_script(obj, 'var count = 0; '
+                           'this.__defineGetter__("counter", '
+                           'function() { return ++count; });',
+                           '<string>', 1)
+        snapshot = cx.snapshot_global(obj)
+        cx.evaluate_script(obj, 'delete counter; '
+                           'this.__defineGetter__("added", '
+                           'function() { return 1; });',
+                           '<string>', 1)
+        cx.reset_global(obj, snapshot)
+        self.assertFalse(cx.has_property(obj, 'added'))
+        first = cx.get_property(obj, 'counter')
+        self.assertEqual(cx.get_property(obj, 'counter'), first + 1)
+
+    def testResetGlobalRejectsWrongSnapshot(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_global()
+        other = cx.new_global()
+        snapshot = cx.snapshot_global(other)
+        self.assertRaises(ValueError, cx.reset_global, obj, snapshot)
+        self.assertRaises(TypeError, cx.reset_global, obj, other)
+
+    def testPreludeGlobalsShareFrozenPrelude(self):
+        cx = pydermonkey.Runtime().new_context()
+        self.assertRaises(pydermonkey.InterpreterError, cx.new_prelude_global)
+        prelude = cx.new_global()
+        cx.evaluate_script(prelude, 'function double(x) { return x * 2; }',
+                           '<prelude>', 1)
+        cx.freeze_prelude(prelude)
+        self.assertRaises(pydermonkey.InterpreterError,
+                          cx.freeze_prelude, prelude)
+
+        first = cx.new_prelude_global()
+        second = cx.new_prelude_global()
+        self.assertEqual(cx.evaluate_script(first, 'var foo = double(2); '
+                                            '[1, 2].length + foo',
+                                            '<string>', 1), 6)
+        self.assertTrue(cx.has_property(first, 'foo'))
+        self.assertFalse(cx.has_property(second, 'foo'))
+        self.assertFalse(cx.has_property(prelude, 'foo'))
+        self.assertTrue(cx.get_property(first, 'Array') is
+                        cx.get_property(second, 'Array'))
+
+        # Nothing reachable from the prelude can be changed.
+        self.assertRaises(pydermonkey.ScriptError, cx.evaluate_script,
+                          second, 'Math.foo = 1', '<string>', 1)
+        self.assertEqual(cx.evaluate_script(first, 'typeof Math.foo',
+                                            '<string>', 1), 'undefined')
+
+    def testCompileFunctionWorks(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        cx.init_standard_classes(obj)
+        cx.evaluate_script(obj, 'var base = 10;', '<string>', 1)
+        func = cx.compile_function(None, ['a', 'b'],
+                                   'return base + a * b;', 'test.js', 5)
+        self.assertTrue(isinstance(func, pydermonkey.Function))
+        self.assertEqual(func.name, None)
+        self.assertEqual(func.filename, 'test.js')
+        self.assertEqual(func.base_lineno, 5)
+        self.assertEqual(cx.call_function(obj, func, (2, 3)), 16)
+        self.assertEqual(cx.call_function(obj, func, (4, 5)), 30)
+
+    def testCompileFunctionUsesScope(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        cx.init_standard_classes(obj)
+        scope = cx.new_object()
+        cx.define_property(scope, 'x', 7)
+        func = cx.compile_function('foo', [], 'return x;', '<string>', 1,
+                                   scope)
+        self.assertEqual(func.name, 'foo')
+        self.assertTrue(cx.get_property(scope, 'foo') is func)
+        self.assertEqual(cx.call_function(obj, func, ()), 7)
+
+    def testCompileFunctionRaisesSyntaxErrors(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        cx.init_standard_classes(obj)
+        self.assertRaises(pydermonkey.ScriptError, cx.compile_function,
+                          None, [], 'return (;', '<string>', 1)
+        self.assertRaises(TypeError, cx.compile_function,
+                          None, [1], 'return 1;', '<string>', 1)
+
+    def testCompileFunctionRequiresScopeWithoutGlobal(self):
+        cx = pydermonkey.Runtime().new_context()
+        self.assertRaises(pydermonkey.InterpreterError, cx.compile_function,
+                          None, [], 'return 1;', '<string>', 1)
+
+    def testWrappersAreWeakReferenceable(self):
+        cx = pydermonkey.Runtime().new_context()
+        obj = cx.new_object()
+        cx.init_standard_classes(obj)
+        func = cx.evaluate_script(obj, '(function() {})', '<string>', 1)
+        script = cx.compile_script('foo', '<string>', 1)
+        cache = weakref.WeakKeyDictionary()
+        for wrapper in [obj, func, script]:
+            cache[wrapper] = True
+        self.assertEqual(len(cache), 3)
+        ref = weakref.ref(func)
+        del wrapper
+        del func
+        self.assertEqual(ref(), None)
+        self.assertEqual(len(cache), 2)
+        del script
+        self.assertEqual(len(cache), 1)
+
     def testObjectGetattrThrowsException(self):
         cx = pydermonkey.Runtime().new_context()
         obj = cx.new_object()